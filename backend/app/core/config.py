@@ -3,21 +3,155 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     PROJECT_NAME: str = "AutoBid AI"
     # Postgres
-    POSTGRES_USER: str
-    POSTGRES_PASSWORD: str
-    POSTGRES_DB: str
-    POSTGRES_HOST: str
-    POSTGRES_PORT: str
+    POSTGRES_USER: str = ""
+    POSTGRES_PASSWORD: str = ""
+    POSTGRES_DB: str = ""
+    POSTGRES_HOST: str = ""
+    POSTGRES_PORT: str = ""
+    # Override completo de la URL (ej: "sqlite:///./autobid.db" para correr local sin Postgres)
+    SQL_DATABASE_URL: str = ""
 
     # Computed Property para la URL de conexión
     @property
     def DATABASE_URL(self) -> str:
+        if self.SQL_DATABASE_URL:
+            return self.SQL_DATABASE_URL
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
     # AI Keys
     GOOGLE_API_KEY: str = ""
     PINECONE_API_KEY: str = ""
 
+    # Rate limiting compartido (token bucket por API key + modelo, estado en archivo con flock)
+    RATE_LIMIT_STATE_DIR: str = "/tmp/autobid_ratelimit"
+    LLM_RPM: float = 60
+    LLM_CONCURRENCY: int = 4 # Arranque del AIMD
+    LLM_MAX_CONCURRENCY: int = 16
+    EMBEDDING_RPM: float = 1500
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_MAX_CONCURRENCY: int = 32
+    RETRY_MAX_ATTEMPTS: int = 5
+    RETRY_BASE_SECONDS: float = 0.5
+    RETRY_MAX_SECONDS: float = 30.0
+
+    # Dispatcher LLM multi-tenant (prioridades + fair queuing por user_id)
+    LLM_DISPATCH_SLOTS: int = 8 # Llamadas LLM simultáneas por proceso
+    LLM_TENANT_MAX_CONCURRENCY: int = 2
+    LLM_INTERACTIVE_RESERVED_SLOTS: int = 2 # Slots que batch/standard nunca ocupan
+    LLM_DISPATCH_AGING_SECONDS: float = 30.0 # Cada 30s de espera se sube una clase de prioridad
+
+    # Extracción de datos clave: regex/keywords locales primero, LLM solo para lo dudoso
+    KEY_DATA_MIN_CONFIDENCE: float = 0.7
+    KEY_DATA_LOCAL_ONLY: bool = False # True = nunca llamar al LLM (onboarding masivo)
+
+    # Clasificador local de documentos por tenant (antes de detect_category con LLM)
+    DOC_CLASSIFIER_MIN_SAMPLES: int = 10 # Documentos etiquetados necesarios para entrenar
+    DOC_CLASSIFIER_MIN_CONFIDENCE: float = 0.6 # Por debajo se consulta al LLM
+    DOC_CLASSIFIER_MAX_CHARS: int = 3000
+    DOC_CLASSIFIER_REFRESH_SECONDS: float = 60.0 # Cada cuánto se revisa si hay etiquetas nuevas (multi-proceso)
+
+    # Sanitización de PII (Presidio): ventanas con pre-filtro regex + pool de procesos
+    PII_WINDOW_CHARS: int = 4000
+    PII_WINDOW_OVERLAP: int = 200 # Debe superar el largo de cualquier entidad (emails, IBAN...)
+    PII_WORKERS: int = 2 # Procesos (cada uno carga spaCy, ~150MB). 0 = todo en el proceso web
+    PII_PARALLEL_MIN_WINDOWS: int = 4 # Con menos ventanas candidatas no vale la pena el IPC
+    PII_WARMUP_ON_STARTUP: bool = False
+
+    # Arranque: perfil de imports, warmup en background y readiness
+    STARTUP_PROFILE: bool = False # Cronometra cada import (ver /health/startup)
+    STARTUP_WARMUP: bool = False # Precarga pandas/sklearn/shap y los clientes de langchain tras arrancar
+    READY_REQUIRES_WARMUP: bool = False # /health/ready responde 503 hasta que termine el warmup
+    DB_CONNECT_TIMEOUT: int = 5 # Segundos (Postgres): un DB caído no cuelga el arranque ni el probe
+
+    # Autenticación (Clerk): verificación de firma contra el JWKS + cache de tokens verificados
+    AUTH_VERIFY_SIGNATURE: bool = False # False = solo se leen los claims (desarrollo)
+    CLERK_JWKS_URL: str = "" # https://<tu-dominio-clerk>/.well-known/jwks.json (o ruta a un JWKS local)
+    CLERK_ISSUER: str = "" # Si se define, 'iss' tiene que coincidir
+    AUTH_AUDIENCE: str = ""
+    AUTH_LEEWAY_SECONDS: int = 5 # Tolerancia de reloj para exp/nbf
+    AUTH_TOKEN_CACHE_SIZE: int = 10000 # Tokens verificados en el LRU (0 = verificar siempre)
+    JWKS_REFRESH_SECONDS: float = 3600
+    JWKS_MIN_REFETCH_SECONDS: float = 30 # Kid desconocido: como mucho un fetch cada 30s
+
+    # Métricas por etapa (/metrics): el tenant es un label, con tope de cardinalidad
+    METRICS_TENANT_LABELS: bool = True # False = todas las series con tenant "-"
+    METRICS_MAX_TENANTS: int = 200 # Tenants distintos con serie propia; el resto va a "other"
+
+    # Servidor de producción (gunicorn.conf.py: workers uvicorn con preload antes del fork)
+    WEB_PORT: int = 8000
+    WEB_WORKERS: int = 0 # 0 = un worker por CPU
+    WEB_TIMEOUT: int = 120 # Un upload grande puede tardar: no matar al worker antes
+    WEB_GRACEFUL_TIMEOUT: int = 30 # Tiempo para terminar requests y correr los hooks de shutdown
+    WEB_MAX_REQUESTS: int = 0 # >0 recicla workers cada N requests (fugas de memoria)
+    WEB_PRELOAD_ARTIFACTS: bool = True # Importar libs pesadas y modelos en el master (COW)
+
+    # Artefactos de modelos (app/services/model_store.py)
+    MODEL_STORE_DIR: str = "app/models_storage"
+    MODEL_STORE_KEEP_VERSIONS: int = 3 # Versiones por tenant que se conservan (rollback)
+    MODEL_STORE_COMPRESS: int = 3 # zlib para los pickles (~5x menos disco, carga igual de rápida). 0 = sin comprimir + mmap
+    ML_PRELOAD_MAX_TENANTS: int = 200 # Modelos (los de uso más reciente) que el master precarga; el resto, lazy
+    ML_FAST_PREDICT: bool = True # Predicción con el bosque compilado a arrays de numpy (sin pandas/sklearn por request)
+    ML_WHATIF_MAX_POINTS: int = 10000 # Tope de puntos por grilla de /ml/what-if
+
+    # Export por streaming (/export/{dataset}): filas por tanda (cursor del servidor + un chunk del response)
+    EXPORT_BATCH_ROWS: int = 1000
+
+    # Modelo base compartido (opt-in por tenant, POST /ml/pool): cold start con pocos datos
+    ML_POOL_ENABLED: bool = False
+    ML_POOL_MIN_TENANTS: int = 3 # Tenants adheridos necesarios para entrenar el base
+    ML_POOL_MAX_ROWS_PER_TENANT: int = 500 # Licitaciones más recientes que aporta cada tenant
+    ML_POOL_MIN_TENANT_SAMPLES: int = 30 # Por debajo: base + calibración en vez de bosque propio
+    ML_POOL_RETRAIN_SECONDS: int = 21600 # Re-entrenamiento periódico del base (6h)
+    ML_POOL_CALIBRATION_L2: float = 5.0 # Cuánto se resiste la calibración a alejarse del base
+
+    # Perfil de embeddings (app/services/embedding_profile.py). Si cambia, cada namespace se re-indexa en su primer uso
+    EMBEDDING_DIM: int = 3072 # Salida completa de gemini-embedding-001; 1536/768/256 = menos storage y queries más baratas
+    EMBEDDING_REDUCTION: str = "api" # api = outputDimensionality de Gemini | pca = proyección local ajustada sobre vectores completos
+    EMBEDDING_QUANTIZATION: str = "none" # none | float16 | int8 (+ escala por vector) en el cache local de embeddings
+    EMBEDDING_CACHE_SIZE: int = 4096 # Embeddings por hash del texto en el LRU del proceso (0 = sin cache)
+    EMBEDDING_PCA_SAMPLE_SIZE: int = 20000 # Vectores completos que se leen del índice para ajustar la proyección
+
+    # Write-behind de escrituras al índice vectorial (app/services/vector_writer.py)
+    VECTOR_WRITE_BEHIND: bool = True # False = cada ingesta/borrado escribe en el índice antes de volver
+    VECTOR_WRITE_MAX_BATCH: int = 500 # Operaciones pendientes de un namespace que disparan el flush
+    VECTOR_WRITE_MAX_DELAY_MS: int = 250 # Antigüedad máxima de una operación encolada
+    VECTOR_WRITE_MAX_ATTEMPTS: int = 3 # Una tanda que falla se reencola hasta N veces (con backoff)
+    VECTOR_WRITE_WORKERS: int = 4 # Namespaces que se aplican en paralelo (uno lento no bloquea al resto)
+    VECTOR_WRITE_RETRY_SECONDS: float = 300.0 # Cada cuánto se reaplican las tandas descartadas (vector_write_failures)
+
+    # Dedup de chunks casi idénticos (boilerplate legal, headers, footers)
+    DEDUP_ENABLED: bool = True
+    DEDUP_MAX_HAMMING: int = 3 # <= 3 para que las 4 bandas LSH garanticen encontrar el candidato
+
+    # Cola de ingesta en background (tabla ingestion_jobs)
+    JOB_WORKERS: int = 2 # Threads por proceso (0 = no procesar jobs en este proceso)
+    JOB_STAGE_MAX_ATTEMPTS: int = 3
+    JOB_LEASE_SECONDS: int = 900 # Si un worker muere, otro retoma el job al vencer el lease
+    JOB_HEARTBEAT_SECONDS: float = 60.0 # Renovación del lease mientras corre una etapa (< JOB_LEASE_SECONDS)
+    JOB_POLL_SECONDS: float = 1.0
+    UPLOADS_DIR: str = "app/uploads_storage"
+    # Uploads de PDFs (spool a disco, límites y cupo de parseos grandes por worker)
+    UPLOAD_MAX_BYTES: int = 100 * 1024 * 1024 # 413 por encima (0 = sin límite)
+    UPLOAD_MAX_PAGES: int = 1000 # 413 por encima (0 = sin límite)
+    UPLOAD_LARGE_BYTES: int = 10 * 1024 * 1024 # Desde acá el parseo toma un cupo del semáforo
+    UPLOAD_LARGE_PARSE_CONCURRENCY: int = 2 # Parseos grandes simultáneos por worker
+    UPLOAD_PARSE_WAIT_SECONDS: float = 30.0 # Espera máxima por un cupo en requests inline (después 503)
+    UPLOAD_RSS_SAMPLE_MS: int = 20 # Muestreo del RSS durante el parseo (pico reportado por upload)
+
+    # Extracción de texto de PDFs: auto | pypdf | pdfplumber | pdfminer
+    PDF_BACKEND: str = "auto" # auto = pypdf y, si el texto sale pobre, PDF_FALLBACK_BACKEND
+    PDF_FALLBACK_BACKEND: str = "pdfplumber"
+    PDF_MIN_CHARS_PER_PAGE: int = 200 # Por debajo (caracteres visibles por página) el texto se considera pobre
+    PDF_MAX_GARBLED_RATIO: float = 0.05 # Fracción de glifos sin mapear ('(cid:N)', U+FFFD) tolerada
+
+    # Importación masiva de historial
+    BULK_PARSE_WORKERS: int = 0 # Procesos para parsear PDFs (0 = cpu_count)
+    BULK_EXTRACT_WORKERS: int = 4 # Threads para extract_key_data (llamadas LLM)
+    BULK_INGEST_BATCH_DOCS: int = 50 # Documentos por upsert agrupado
+    BULK_MAX_FILES: int = 2000 # PDFs por importación (sueltos + miembros de los ZIPs)
+    BULK_MAX_TOTAL_BYTES: int = 2 * 1024 * 1024 * 1024 # Bytes descomprimidos por importación (0 = sin límite)
+    BULK_MAX_ARCHIVE_BYTES: int = 1024 * 1024 * 1024 # Tamaño de cada ZIP subido (los PDFs sueltos usan UPLOAD_MAX_BYTES)
+
     class Config:
         env_file = ".env"
 
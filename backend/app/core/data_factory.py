@@ -1,4 +1,6 @@
 import random
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from app.db import models
 from sqlalchemy.orm import Session
 
@@ -6,33 +8,45 @@ CLIENTS = ["TechCorp", "Gobierno", "BankOfAmerica", "StartupX", "RetailGiant"]
 INDUSTRIES = ["Fintech", "Health", "Government", "E-commerce", "Logistics"]
 STACKS = ["Python", "Java", "Node.js", ".NET", "PHP"]
 
-def generate_historical_data(db: Session, n=1000):
-    """Genera n licitaciones sintéticas y las guarda en DB"""
+def generate_historical_data(db: Session, n=1000, user_id: str = "demo", rng: Optional[random.Random] = None):
+    """Genera n licitaciones sintéticas de un tenant y las guarda en DB (rng con semilla = reproducible)"""
+    rng = rng or random.Random()
+    now = datetime.now(timezone.utc)
     # Limpiar tabla primero (opcional, para no duplicar)
-    # db.query(models.Bid).delete() 
+    # db.query(models.Bid).filter(models.Bid.user_id == user_id).delete()
     for _ in range(n):
-        client = random.choice(CLIENTS)
-        industry = random.choice(INDUSTRIES)
-        budget = round(random.uniform(5000, 500000), 2)
-        stack = random.choice(STACKS)
+        client = rng.choice(CLIENTS)
+        industry = rng.choice(INDUSTRIES)
+        budget = round(rng.uniform(5000, 500000), 2)
+        stack = rng.choice(STACKS)
+        technical_score = round(rng.uniform(10, 95), 1)
+        created_at = now - timedelta(days=rng.randint(0, 720))
+        days_deadline = rng.randint(1, 90)
         # Lógica Secreta ("Ground Truth"): Define quién gana para que el modelo aprenda patrones
         # Regla: Ganamos más en Python/Java y en Fintech. Perdemos en Gobierno con bajo presupuesto.
+        # Como en seed_advanced.py: bajo match técnico o deadline imposible también pierden.
         score = 0.3 # Base
         if stack in ["Python", "Java"]: score += 0.3
         if industry == "Fintech": score += 0.2
         if industry == "Government" and budget < 20000: score -= 0.4
+        score += (technical_score - 50) / 200
+        if days_deadline < 5: score -= 0.3
         # Ruido aleatorio
-        score += random.uniform(-0.1, 0.1)
+        score += rng.uniform(-0.1, 0.1)
         status = "WON" if score > 0.6 else "LOST"
         # Crear objeto
         bid = models.Bid(
+            user_id=user_id,
             client_name=client,
             project_name=f"Proyecto {industry} con {stack}",
             industry=industry,
             budget=budget,
             status=status,
-            ai_analysis=f"Stack requerido: {stack}. Cliente: {client}" 
+            technical_score=technical_score,
+            content_text=f"Stack requerido: {stack}. Cliente: {client}",
+            created_at=created_at,
+            deadline_date=created_at + timedelta(days=days_deadline)
         )
         db.add(bid)
     db.commit()
-    return {"message": f"{n} registros generados correctamente."}
\ No newline at end of file
+    return {"message": f"{n} registros generados correctamente."}
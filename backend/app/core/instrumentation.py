@@ -0,0 +1,155 @@
+import time
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+# Latencia por etapa (parse, PII, embeddings, Pinecone, LLM, SQL, predict...) con labels
+# stage/tenant, más latencia HTTP por ruta. Todo termina en /metrics (formato Prometheus).
+# Costo por medición: un perf_counter y un observe con lock (~microsegundos).
+
+STAGE_SECONDS = metrics.histogram("stage_duration_seconds", "Duración de cada etapa interna, por tenant")
+STAGE_ERRORS = metrics.counter("stage_errors_total", "Etapas que terminaron con excepción")
+HTTP_SECONDS = metrics.histogram("http_request_duration_seconds", "Latencia de requests HTTP por método, ruta y status")
+SQL_SECONDS = metrics.histogram(
+    "sql_query_seconds", "Duración de queries SQL por operación y etapa en curso",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+_local = threading.local()
+_tenants = set()
+_tenants_lock = threading.Lock()
+
+
+def tenant_label(user_id: Optional[str]) -> str:
+    """user_id como label, con tope de cardinalidad (los excedentes van a 'other')."""
+    if not user_id or not settings.METRICS_TENANT_LABELS:
+        return "-"
+    if user_id in _tenants:
+        return user_id
+    with _tenants_lock:
+        if len(_tenants) < settings.METRICS_MAX_TENANTS:
+            _tenants.add(user_id)
+            return user_id
+    return "other"
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def current_stage() -> str:
+    stack = _stack()
+    return stack[-1][0] if stack else "none"
+
+
+@contextmanager
+def stage(name: str, tenant: Optional[str] = None):
+    """
+    Cronometra una etapa. Sin tenant explícito hereda el de la etapa que la contiene
+    (ej: 'embed' dentro de 'vector.upsert' de un namespace). Pila por thread: en código
+    async usar observe() con tiempos medidos a mano.
+    """
+    stack = _stack()
+    if tenant is None and stack:
+        tenant = stack[-1][1]
+    stack.append((name, tenant))
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name, tenant=tenant_label(tenant))
+        raise
+    finally:
+        stack.pop()
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name, tenant=tenant_label(tenant))
+
+def observe(name: str, seconds: float, tenant: Optional[str] = None):
+    STAGE_SECONDS.observe(seconds, stage=name, tenant=tenant_label(tenant))
+
+def timed(name: str, tenant_arg: Optional[str] = None):
+    """Decorador: @timed("ml.predict", tenant_arg="user_id") toma el tenant de ese argumento."""
+
+    def decorator(fn):
+        signature = inspect.signature(fn)
+        position = list(signature.parameters).index(tenant_arg) if tenant_arg else None
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tenant = None
+            if tenant_arg:
+                tenant = kwargs.get(tenant_arg, args[position] if position < len(args) else None)
+            with stage(name, tenant):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ==========================================
+# SQL (eventos de SQLAlchemy)
+# ==========================================
+
+def instrument_engine(engine):
+    """Mide cada query y la atribuye a la etapa en curso del thread (o 'none')."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        operation = statement.lstrip().split(" ", 1)[0].upper()[:16]
+        SQL_SECONDS.observe(time.perf_counter() - starts.pop(), operation=operation, stage=current_stage())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        # Query fallida: no queda inicio huérfano en la pila de la conexión
+        conn = context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+
+# ==========================================
+# ASGI: LATENCIA POR RUTA
+# ==========================================
+
+class RequestTimingMiddleware:
+    """
+    ASGI puro (sin BaseHTTPMiddleware: no buferea ni rompe el streaming).
+    La ruta es el template de FastAPI ('/jobs/{job_id}'), no el path real: cardinalidad acotada.
+    En streaming (SSE) mide hasta el último byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"], route=route, status=str(status["code"])
+            )
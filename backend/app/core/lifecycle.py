@@ -0,0 +1,65 @@
+import gc
+import time
+import threading
+from typing import Callable, List, Tuple
+
+# Ciclo de vida del proceso:
+# - preload(): en el master de gunicorn ANTES del fork (módulos pesados + artefactos de solo
+#   lectura), así los workers los comparten por copy-on-write.
+# - on_shutdown()/run_shutdown(): registro de hooks para el apagado ordenado de cada worker
+#   (flush de buffers en memoria, parar threads, cerrar pools).
+
+_hooks: List[Tuple[int, str, Callable]] = []
+_hooks_lock = threading.Lock()
+_shutdown_done = False
+
+
+def on_shutdown(name: str, fn: Callable, order: int = 50):
+    """Registra un hook de apagado. Menor `order` corre primero (ej: flush de buffers antes de cerrar pools)."""
+    with _hooks_lock:
+        if not any(existing == name for _, existing, _ in _hooks):
+            _hooks.append((order, name, fn))
+
+def run_shutdown():
+    """Corre cada hook una sola vez; un hook que falla no impide que corran los demás."""
+    global _shutdown_done
+    with _hooks_lock:
+        if _shutdown_done:
+            return
+        _shutdown_done = True
+        hooks = sorted(_hooks, key=lambda h: h[0])
+    for _, name, fn in hooks:
+        start = time.perf_counter()
+        try:
+            fn()
+            print(f"🛑 Shutdown {name}: {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"⚠️ Shutdown {name} falló: {e}")
+
+
+def preload():
+    """
+    Importa lo pesado y carga artefactos de solo lectura en el proceso master.
+    No crea clientes de red ni threads (no sobreviven bien a un fork).
+    """
+    from app.services import ml_service, rag_service
+    start = time.perf_counter()
+    models = 0
+    steps = [
+        ("ml", ml_service.warmup),
+        ("ml_models", ml_service.preload_models),
+        ("rag", lambda: rag_service.warmup(clients=False)),
+    ]
+    for name, fn in steps:
+        # Un preload que falla no tira abajo el master: ese worker lo cargará lazy
+        try:
+            result = fn()
+            if name == "ml_models":
+                models = result
+        except Exception as e:
+            print(f"⚠️ Preload {name} falló: {e}")
+    # Objetos del preload a la generación permanente: el GC de los workers no los toca
+    # (si no, actualizar sus headers ensucia las páginas compartidas y se pierde el COW)
+    gc.collect()
+    gc.freeze()
+    print(f"📦 Preload: {models} modelos ML y librerías en {time.perf_counter() - start:.1f}s (compartidos entre workers)")
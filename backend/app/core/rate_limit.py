@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core import metrics
+
+try:
+    import fcntl  # Lock entre procesos (Linux/macOS)
+except ImportError:  # Windows: el bucket queda por proceso
+    fcntl = None
+
+# --- MÉTRICAS ---
+QUEUE_WAIT = metrics.histogram("ratelimit_queue_wait_seconds", "Tiempo esperando token del bucket + slot de concurrencia")
+THROTTLE_EVENTS = metrics.counter("ratelimit_throttle_events_total", "Respuestas 429/RESOURCE_EXHAUSTED recibidas")
+RETRIES = metrics.counter("ratelimit_retries_total", "Reintentos realizados")
+CONCURRENCY_LIMIT = metrics.gauge("ratelimit_concurrency_limit", "Límite AIMD de concurrencia actual")
+IN_FLIGHT = metrics.gauge("ratelimit_in_flight", "Llamadas en curso")
+
+
+class RateLimitedError(Exception):
+    """El proveedor respondió 429 / cuota agotada. retry_after en segundos si vino en la respuesta."""
+
+    def __init__(self, message: str = "Rate limited", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryableError(Exception):
+    """Error transitorio (5xx, timeout): se reintenta con backoff."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After puede venir en segundos o como fecha HTTP."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except Exception:
+        return None
+
+
+THROTTLE_TYPES = ("ResourceExhausted", "TooManyRequests") # google-api-core (por nombre: dependencia opcional)
+TRANSIENT_TYPES = ("ServiceUnavailable", "InternalServerError", "BadGateway", "GatewayTimeout", "DeadlineExceeded")
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """Código HTTP del error: .code (google-api-core / google-genai), .status_code o .response.status_code."""
+    for value in (getattr(exc, "code", None), getattr(exc, "status_code", None),
+                  getattr(getattr(exc, "response", None), "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+def _chain(exc: Optional[BaseException]):
+    """El error y sus causas: langchain re-lanza el error de google-api-core envuelto."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+def _named(exc: BaseException, names: tuple) -> bool:
+    return any(cls.__name__ in names for cls in type(exc).__mro__)
+
+def is_throttle_error(exc: Exception) -> bool:
+    """
+    429 del proveedor por tipo o código de estado, nunca por texto: un "429" en el mensaje de
+    otro error (un id, un monto) no es throttling.
+    """
+    return any(isinstance(e, RateLimitedError) or _status_code(e) == 429 or _named(e, THROTTLE_TYPES)
+               for e in _chain(exc))
+
+def is_retryable_error(exc: Exception) -> bool:
+    """Transitorio (5xx, timeout, conexión): el camino LLM no lo envuelve en RetryableError como embeddings."""
+    return any(isinstance(e, (RetryableError, TimeoutError, ConnectionError)) or (_status_code(e) or 0) >= 500
+               or _named(e, TRANSIENT_TYPES) for e in _chain(exc))
+
+
+# ==========================================
+# 1. TOKEN BUCKET COMPARTIDO
+# ==========================================
+
+class TokenBucket:
+    """
+    Token bucket cuyo estado vive en un archivo con flock: todos los procesos
+    del host (workers de uvicorn/gunicorn, pools de jobs) comparten la misma cuota.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, capacity: Optional[float] = None):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 6.0)
+        self._local_lock = threading.Lock()
+        self._local_state = {"tokens": self.capacity, "ts": time.time()}
+        self.path = None
+        if fcntl is not None:
+            os.makedirs(settings.RATE_LIMIT_STATE_DIR, exist_ok=True)
+            self.path = os.path.join(settings.RATE_LIMIT_STATE_DIR, f"{name}.bucket")
+
+    def _try_take(self, state: dict, tokens: float) -> float:
+        """Recarga y descuenta. Devuelve 0 si se tomó o los segundos a esperar."""
+        now = time.time()
+        state["tokens"] = min(self.capacity, state["tokens"] + (now - state["ts"]) * self.rate)
+        state["ts"] = now
+        if state["tokens"] >= tokens:
+            state["tokens"] -= tokens
+            return 0.0
+        return (tokens - state["tokens"]) / self.rate
+
+    def _attempt(self, tokens: float) -> float:
+        with self._local_lock:
+            if self.path is None:
+                return self._try_take(self._local_state, tokens)
+            with open(self.path, "a+") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    fh.seek(0)
+                    raw = fh.read()
+                    state = json.loads(raw) if raw else {"tokens": self.capacity, "ts": time.time()}
+                    wait = self._try_take(state, tokens)
+                    fh.seek(0)
+                    fh.truncate()
+                    fh.write(json.dumps(state))
+                    return wait
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._attempt(tokens)
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise TimeoutError(f"Timeout esperando cuota de {self.name}")
+            # Jitter para que los procesos no se despierten todos juntos
+            time.sleep(wait * (1 + random.random() * 0.1))
+
+
+# ==========================================
+# 2. CONCURRENCIA ADAPTATIVA (AIMD)
+# ==========================================
+
+class AdaptiveConcurrency:
+    """
+    Additive-Increase / Multiplicative-Decrease: cada éxito suma 1/limit (≈ +1 por "ventana"),
+    cada 429 divide el límite por 2. Converge a la concurrencia que la cuota realmente soporta.
+    """
+
+    def __init__(self, name: str, initial: int, minimum: int = 1, maximum: int = 64):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        CONCURRENCY_LIMIT.set(self.limit, limiter=name)
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        IN_FLIGHT.inc(limiter=self.name)
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            CONCURRENCY_LIMIT.set(self.limit, limiter=self.name)
+            self._cond.notify_all()
+        IN_FLIGHT.dec(limiter=self.name)
+
+
+# ==========================================
+# 3. LIMITER (BUCKET + AIMD + RETRY)
+# ==========================================
+
+class Limiter:
+
+    def __init__(self, name: str, rate_per_minute: float, initial_concurrency: int, max_concurrency: int):
+        self.name = name
+        self.bucket = TokenBucket(name, rate_per_minute)
+        self.concurrency = AdaptiveConcurrency(name, initial_concurrency, maximum=max_concurrency)
+
+    @contextmanager
+    def slot(self):
+        """Espera token + slot. Si el bloque lanza un 429, el AIMD reduce la concurrencia."""
+        start = time.perf_counter()
+        self.bucket.acquire()
+        self.concurrency.acquire()
+        QUEUE_WAIT.observe(time.perf_counter() - start, limiter=self.name)
+        throttled = False
+        try:
+            yield
+        except Exception as e:
+            throttled = is_throttle_error(e)
+            raise
+        finally:
+            self.concurrency.release(throttled=throttled)
+
+    def call(self, fn: Callable, max_attempts: Optional[int] = None):
+        """
+        Ejecuta fn con rate limit y retry exponencial con jitter ("full jitter"),
+        respetando Retry-After cuando el proveedor lo manda.
+        """
+        max_attempts = max_attempts or settings.RETRY_MAX_ATTEMPTS
+        for attempt in range(1, max_attempts + 1):
+            try:
+                with self.slot():
+                    return fn()
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                if throttled:
+                    THROTTLE_EVENTS.inc(limiter=self.name)
+                elif not is_retryable_error(e):
+                    raise
+                if attempt >= max_attempts:
+                    raise
+                backoff = random.uniform(0, min(settings.RETRY_MAX_SECONDS, settings.RETRY_BASE_SECONDS * 2 ** attempt))
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is not None:
+                    backoff = max(backoff, retry_after)
+                RETRIES.inc(limiter=self.name)
+                print(f"⚠️ {self.name}: intento {attempt} falló ({e}); reintentando en {backoff:.1f}s")
+                time.sleep(backoff)
+
+
+_limiters: Dict[str, Limiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(kind: str, api_key: str, model: str) -> Limiter:
+    """Un limiter por (API key, modelo). La key se hashea: no queremos secretos en nombres de archivo."""
+    key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:10]
+    name = f"{kind}-{model.replace('/', '_')}-{key_id}"
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            if kind == "embedding":
+                limiter = Limiter(name, settings.EMBEDDING_RPM, settings.EMBEDDING_CONCURRENCY, settings.EMBEDDING_MAX_CONCURRENCY)
+            else:
+                limiter = Limiter(name, settings.LLM_RPM, settings.LLM_CONCURRENCY, settings.LLM_MAX_CONCURRENCY)
+            _limiters[name] = limiter
+        return limiter
@@ -1,34 +1,240 @@
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+from jose import jwt, jwk, JWTError
+
+from app.core import metrics
+from app.core.config import settings
 
 # Este esquema le dice a Swagger UI que esperamos un token "Bearer"
 security = HTTPBearer()
 
+AUTH_CACHE = metrics.counter("auth_token_cache_total", "Tokens resueltos desde el cache de verificados (hit) o verificando la firma (miss)")
+JWKS_FETCHES = metrics.counter("auth_jwks_fetch_total", "Descargas del JWKS de Clerk por motivo y resultado")
+
+ALGORITHMS = ["RS256"]
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
+
+# ==========================================
+# JWKS DE CLERK (claves públicas cacheadas)
+# ==========================================
+
+class JWKSCache:
+    """
+    Claves públicas por 'kid', ya construidas (parsear el JWK en cada request cuesta).
+    - Refresco en background cada JWKS_REFRESH_SECONDS (thread lazy: arranca en el worker, no en el master).
+    - Kid desconocido (rotación de claves): re-descarga, como mucho una vez cada JWKS_MIN_REFETCH_SECONDS
+      para que tokens basura no conviertan cada request en un fetch.
+    - Si Clerk no responde se siguen usando las claves que había.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._last_fetch = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _download(self) -> dict:
+        if self.url.startswith(("http://", "https://")):
+            import requests
+            response = requests.get(self.url, timeout=5)
+            response.raise_for_status()
+            return response.json()
+        # Ruta local (o file://): JWKS fijo para desarrollo y benchmarks
+        with open(self.url.removeprefix("file://")) as fh:
+            return json.load(fh)
+
+    def refresh(self, reason: str = "refresh") -> bool:
+        self._last_fetch = time.monotonic()
+        try:
+            keys = {}
+            for key in self._download().get("keys", []):
+                if key.get("kid") and key.get("use", "sig") == "sig":
+                    keys[key["kid"]] = jwk.construct(key, key.get("alg", ALGORITHMS[0]))
+        except Exception as e:
+            JWKS_FETCHES.inc(reason=reason, result="error")
+            print(f"⚠️ No se pudo descargar el JWKS ({reason}): {e}")
+            return False
+        with self._lock:
+            self._keys = keys
+        JWKS_FETCHES.inc(reason=reason, result="ok")
+        return True
+
+    def has(self, kid: str) -> bool:
+        return kid in self._keys
+
+    def get(self, kid: str):
+        self._ensure_started()
+        key = self._keys.get(kid)
+        if key is None:
+            # Un solo fetch aunque lleguen muchos requests con el kid nuevo a la vez
+            with self._fetch_lock:
+                key = self._keys.get(kid)
+                if key is None and time.monotonic() - self._last_fetch >= settings.JWKS_MIN_REFETCH_SECONDS:
+                    self.refresh("kid_miss")
+                    key = self._keys.get(kid)
+        return key
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="jwks-refresh", daemon=True)
+        if not self._keys:
+            self.refresh("startup")
+        self._thread.start()
+        from app.core import lifecycle
+        lifecycle.on_shutdown("jwks_refresh", self.stop, order=80)
+
+    def _loop(self):
+        while not self._stop.wait(settings.JWKS_REFRESH_SECONDS):
+            self.refresh()
+
+    def stop(self):
+        self._stop.set()
+
+
+_jwks: Optional[JWKSCache] = None
+_jwks_lock = threading.Lock()
+
+def get_jwks() -> JWKSCache:
+    global _jwks
+    if _jwks is None:
+        with _jwks_lock:
+            if _jwks is None:
+                if not settings.CLERK_JWKS_URL:
+                    raise RuntimeError("AUTH_VERIFY_SIGNATURE=true requiere CLERK_JWKS_URL")
+                _jwks = JWKSCache(settings.CLERK_JWKS_URL)
+    return _jwks
+
+
+# ==========================================
+# CACHE DE TOKENS YA VERIFICADOS
+# ==========================================
+
+class VerifiedTokenCache:
+    """
+    LRU acotado: sha256(token) -> (user_id, exp, kid). Un token repetido (el front manda el mismo
+    en cada request hasta que Clerk lo renueva) no vuelve a pagar la verificación RSA.
+    Guardamos el hash y no el token. Una entrada deja de valer al vencer 'exp' o si su 'kid'
+    ya no está en el JWKS (clave rotada/revocada).
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[str, float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, digest: bytes, jwks: JWKSCache) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            user_id, exp, kid = entry
+            if exp <= time.time() or not jwks.has(kid):
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return user_id
+
+    def put(self, digest: bytes, user_id: str, exp: float, kid: str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[digest] = (user_id, exp, kid)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = VerifiedTokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+def verify_token(token: str) -> Tuple[str, float, str]:
+    """Verifica firma (JWKS de Clerk), exp/nbf y opcionalmente iss/aud. Devuelve (user_id, exp, kid)."""
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except JWTError:
+        raise _unauthorized("No se pudo validar las credenciales")
+    key = get_jwks().get(kid) if kid else None
+    if key is None:
+        raise _unauthorized("Token firmado con una clave desconocida")
+    try:
+        payload = jwt.decode(
+            token, key, algorithms=ALGORITHMS,
+            issuer=settings.CLERK_ISSUER or None,
+            audience=settings.AUTH_AUDIENCE or None,
+            options={"verify_aud": bool(settings.AUTH_AUDIENCE), "leeway": settings.AUTH_LEEWAY_SECONDS}
+        )
+    except JWTError:
+        raise _unauthorized("No se pudo validar las credenciales")
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise _unauthorized("Token inválido: No contiene ID de usuario")
+    # Sin 'exp' no se cachea más allá de un minuto
+    exp = float(payload.get("exp") or time.time() + 60)
+    return user_id, exp, kid
+
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Decodifica el token de Clerk y extrae el ID de usuario (user_id).
+    Con AUTH_VERIFY_SIGNATURE=true verifica la firma contra el JWKS de Clerk; los tokens
+    ya verificados se resuelven desde un LRU en memoria (sin criptografía).
     """
     token = credentials.credentials
+
+    if settings.AUTH_VERIFY_SIGNATURE:
+        digest = token_cache.digest(token)
+        user_id = token_cache.get(digest, get_jwks())
+        if user_id is not None:
+            AUTH_CACHE.inc(result="hit")
+            return user_id
+        AUTH_CACHE.inc(result="miss")
+        # RSA + posible fetch del JWKS: fuera del event loop
+        user_id, exp, kid = await run_in_threadpool(verify_token, token)
+        token_cache.put(digest, user_id, exp, kid)
+        return user_id
+
     try:
-        # NOTA DE SEGURIDAD: 
-        # En producción, deberíamos verificar la firma criptográfica con la clave pública de Clerk.
-        # Para desarrollo rápido, decodificamos los claims sin verificar la firma (confiando en que Clerk lo generó).
+        # Modo desarrollo (AUTH_VERIFY_SIGNATURE=false): decodificamos los claims sin verificar
+        # la firma (confiando en que Clerk lo generó).
         payload = jwt.get_unverified_claims(token)
-        
+
         # 'sub' es el estándar para el ID único del usuario (Subject)
         user_id = payload.get("sub")
-        
+
         if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token inválido: No contiene ID de usuario"
-            )
-            
+            raise _unauthorized("Token inválido: No contiene ID de usuario")
+
         return user_id
 
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="No se pudo validar las credenciales"
-        )
\ No newline at end of file
+        raise _unauthorized("No se pudo validar las credenciales")
@@ -0,0 +1,142 @@
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Perfil de arranque: cuánto tarda cada import y cada fase de init (create_all, warmup...).
+# El profiler de imports es opcional (STARTUP_PROFILE=true): envuelve exec_module de
+# cada loader, así que solo mide módulos importados después de instalarlo.
+
+PROCESS_START = time.perf_counter()
+
+_imports: Dict[str, dict] = {}
+_phases: List[dict] = []
+_local = threading.local()
+_lock = threading.Lock()
+
+# Estado para /health/ready
+state = {
+    "db_schema": False,
+    "db_error": None,
+    "warmup": "disabled", # disabled, running, done, failed
+    "started_at": None
+}
+
+
+# ==========================================
+# 1. PROFILER DE IMPORTS
+# ==========================================
+
+def _timed_exec(original: Callable) -> Callable:
+    def exec_module(module):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        frame = [time.perf_counter(), 0.0]
+        stack.append(frame)
+        try:
+            original(module)
+        finally:
+            stack.pop()
+            cumulative = time.perf_counter() - frame[0]
+            if stack:
+                stack[-1][1] += cumulative
+            with _lock:
+                _imports[module.__name__] = {
+                    "cumulative_ms": round(cumulative * 1000, 2),
+                    "self_ms": round((cumulative - frame[1]) * 1000, 2),
+                    "at_ms": round((frame[0] - PROCESS_START) * 1000, 1)
+                }
+    exec_module._startup_timed = True
+    return exec_module
+
+
+class _ImportProfiler:
+    """Meta path finder que delega en los demás y cronometra la ejecución del módulo."""
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # Los importers builtin/frozen son clases compartidas: no se tocan
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module") \
+                and not getattr(loader.exec_module, "_startup_timed", False):
+            loader.exec_module = _timed_exec(loader.exec_module)
+        return spec
+
+
+_profiler: Optional[_ImportProfiler] = None
+
+def install_import_profiler():
+    global _profiler
+    if _profiler is None:
+        _profiler = _ImportProfiler()
+        sys.meta_path.insert(0, _profiler)
+
+
+# ==========================================
+# 2. FASES DE INIT
+# ==========================================
+
+@contextmanager
+def phase(name: str):
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        with _lock:
+            _phases.append({
+                "phase": name,
+                "ms": round((time.perf_counter() - start) * 1000, 2),
+                "at_ms": round((start - PROCESS_START) * 1000, 1),
+                "status": status
+            })
+
+def run_warmup(tasks: List[Tuple[str, Callable]]):
+    """Ejecuta los warmups en un thread: el server atiende (y /health/live responde) mientras tanto."""
+    if not tasks:
+        return
+
+    def _run():
+        state["warmup"] = "running"
+        failed = False
+        for name, fn in tasks:
+            try:
+                with phase(f"warmup.{name}"):
+                    fn()
+            except Exception as e:
+                failed = True
+                print(f"⚠️ Warmup {name} falló: {e}")
+        state["warmup"] = "failed" if failed else "done"
+        print(f"🔥 Warmup terminado ({state['warmup']}).")
+
+    threading.Thread(target=_run, name="startup-warmup", daemon=True).start()
+
+
+def report(top: int = 30) -> dict:
+    with _lock:
+        imports = sorted(_imports.items(), key=lambda kv: kv[1]["cumulative_ms"], reverse=True)[:top]
+        phases = list(_phases)
+    return {
+        "uptime_seconds": round(time.perf_counter() - PROCESS_START, 2),
+        "ready_after_ms": state["started_at"],
+        "import_profiler": _profiler is not None,
+        "modules_loaded": len(sys.modules),
+        "phases": phases,
+        "slowest_imports": [{"module": name, **data} for name, data in imports]
+    }
+
+def mark_started():
+    state["started_at"] = round((time.perf_counter() - PROCESS_START) * 1000, 1)
+    print(f"🚀 API lista en {state['started_at']} ms (desde el import de app.core.startup)")
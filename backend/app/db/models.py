@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Float, DateTime, Boolean
 from sqlalchemy.sql import func
 from app.db.session import Base
 from datetime import datetime, timezone
@@ -64,4 +64,96 @@ class MLModelLog(Base):
     id = Column(Integer, primary_key=True, index=True)
     trained_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)) # Cuándo se entrenó
     rows_used = Column(Integer)
-    status = Column(String)
\ No newline at end of file
+    status = Column(String)
+
+# 6. TABLA DE HUELLAS DE CHUNKS (DEDUP DE NEAR-DUPLICATES + MANIFEST POR FUENTE)
+class ChunkFingerprint(Base):
+    __tablename__ = "chunk_fingerprints"
+    id = Column(Integer, primary_key=True, index=True)
+    namespace = Column(String, index=True, nullable=False)
+    scope = Column(String, index=True) # Categoría Pinecone: active_tender, company_knowledge, past_bid
+    source_id = Column(String, index=True)
+    chunk_hash = Column(String, index=True) # sha256 del texto del chunk (diff en re-ingesta)
+    simhash = Column(BigInteger, nullable=False) # Huella 64 bits: 16 de números + 48 de SimHash del texto (con signo para Postgres)
+    # Los 48 bits de texto en 4 bandas de 12 para buscar candidatos por LSH (ver app/utils/dedup.py)
+    band_0 = Column(Integer, index=True)
+    band_1 = Column(Integer, index=True)
+    band_2 = Column(Integer, index=True)
+    band_3 = Column(Integer, index=True)
+    vector_id = Column(String, nullable=True) # Vector propio (None si se descartó por duplicado)
+    duplicate_of = Column(String, nullable=True) # Vector canónico al que quedó enlazado
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+# 7. MANIFEST DE FUENTES VECTORIZADAS (RE-INGESTA INCREMENTAL)
+class SourceManifest(Base):
+    __tablename__ = "source_manifests"
+    id = Column(Integer, primary_key=True, index=True)
+    namespace = Column(String, index=True, nullable=False)
+    source_id = Column(String, index=True, nullable=False)
+    scope = Column(String, index=True)
+    metadata_hash = Column(String) # Si cambia (ej: status WON -> LOST) se actualiza metadata sin re-vectorizar
+    chunk_count = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+# 8. TABLA DE JOBS DE INGESTA EN BACKGROUND
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+    id = Column(String, primary_key=True, index=True) # uuid4
+    user_id = Column(String, index=True, nullable=False)
+    kind = Column(String, nullable=False) # knowledge_pdf, history_pdf
+    status = Column(String, index=True, default="QUEUED") # QUEUED, RUNNING, SUCCEEDED, FAILED
+    payload = Column(Text) # JSON con los parámetros del upload
+    checkpoint = Column(Text, nullable=True) # JSON del contexto tras la última etapa completada
+    current_stage = Column(String, nullable=True)
+    stage_timings = Column(Text, nullable=True) # JSON {etapa: {seconds, attempts, status}}
+    attempts = Column(Integer, default=0)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+# 9. MUESTRAS DE TEXTO PARA EL CLASIFICADOR LOCAL DE DOCUMENTOS
+class DocumentSample(Base):
+    __tablename__ = "document_samples"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, index=True, nullable=False)
+    document_id = Column(Integer, index=True, nullable=False) # knowledge_documents.id (la etiqueta es su category)
+    features = Column(Text) # JSON [índices, cuentas] del HashingVectorizer: nunca guardamos el texto (PII)
+    label_source = Column(String, default="user") # user (elegida/corregida), llm, local y default (no se usan para entrenar)
+    labeled_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+# 10. TENANTS QUE COMPARTEN SUS LICITACIONES (ANONIMIZADAS) CON EL MODELO BASE
+class MLPoolMember(Base):
+    __tablename__ = "ml_pool_members"
+    user_id = Column(String, primary_key=True, index=True)
+    opted_in = Column(Boolean, default=True, nullable=False) # False = baja (sus datos salen en el próximo re-entrenamiento)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+
+# 11. PERFIL DE EMBEDDINGS CON EL QUE ESTÁ INDEXADO CADA NAMESPACE (RE-INDEXADO AL CAMBIARLO)
+class EmbeddingIndexState(Base):
+    __tablename__ = "embedding_index_state"
+    namespace = Column(String, primary_key=True, index=True)
+    profile = Column(String, nullable=False) # api3072, api768, pca768@v000002 (sin fila = api3072 en el índice base)
+    index_name = Column(String, nullable=False)
+    vector_count = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+# 12. TANDAS DEL WRITE-BEHIND DESCARTADAS TRAS VECTOR_WRITE_MAX_ATTEMPTS (SE REINTENTAN DESPUÉS)
+class VectorWriteFailure(Base):
+    __tablename__ = "vector_write_failures"
+    id = Column(Integer, primary_key=True, index=True)
+    namespace = Column(String, index=True, nullable=False)
+    sources = Column(Text) # JSON [source_id, ...]: una nueva escritura de la fuente reaplica antes esta tanda
+    operations = Column(Text) # JSON {ops, updates, filters, manifests} (textos incluidos: se re-vectorizan)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
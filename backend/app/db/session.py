@@ -1,15 +1,24 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
+from app.core import instrumentation
 
 # Crear el motor de conexión
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,  # <--- LA CLAVE: "Toca el timbre" antes de entrar
-    pool_recycle=300,    # Recicla conexiones cada 5 minutos (300 seg)
-    pool_size=5,         # Mantiene 5 conexiones listas
-    max_overflow=10      # Permite hasta 10 extra si hay tráfico
-)
+if settings.DATABASE_URL.startswith("sqlite"):
+    # Stand-in local: SQLite se comparte entre threads (workers de jobs)
+    engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+else:
+    engine = create_engine(
+        settings.DATABASE_URL,
+        pool_pre_ping=True,  # <--- LA CLAVE: "Toca el timbre" antes de entrar
+        pool_recycle=300,    # Recicla conexiones cada 5 minutos (300 seg)
+        pool_size=5,         # Mantiene 5 conexiones listas
+        max_overflow=10,     # Permite hasta 10 extra si hay tráfico
+        connect_args={"connect_timeout": settings.DB_CONNECT_TIMEOUT}
+    )
+
+# Latencia de cada query en /metrics (sql_query_seconds, por operación y etapa)
+instrumentation.instrument_engine(engine)
 
 # Crear la fábrica de sesiones (cada petición tendrá su propia sesión)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -1,30 +1,42 @@
-from fastapi import File, UploadFile, FastAPI, Depends, HTTPException, Form
-from fastapi.responses import StreamingResponse
+# --- PERFIL DE ARRANQUE (antes de cualquier otro import) ---
+from app.core import startup
+from app.core.config import settings
+if settings.STARTUP_PROFILE:
+    startup.install_import_profiler()
+
+from fastapi import File, UploadFile, FastAPI, Depends, HTTPException, Form, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from pydantic import BaseModel
-from typing import List
+from sqlalchemy import func, text as sql_text
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime, timezone
-import pdfplumber
-import io
+import os
+import uuid
+import shutil
 
 # --- IMPORTACIONES INTERNAS ---
-from app.utils import pdf_parser
-from app.db.models import Bid, KnowledgeDocument, AppSettings, TokenUsageLog
+from app.utils import privacy, uploads
+from app.db.models import Bid, KnowledgeDocument, AppSettings, TokenUsageLog, IngestionJob
 from app.db.session import engine, Base, get_db
 from app.db import models
 from app.core import data_factory
-from app.utils.text_processing import clean_text_for_rag
+from app.core import metrics
+from app.core import lifecycle
+from app.core import instrumentation
 from app.services import ml_service
 from app.services import rag_service
+from app.services import ingest_service
+from app.services import doc_classifier
+from app.services import job_queue
+from app.services import export_service
+from app.services import vector_writer
 
 # --- SEGURIDAD NUEVA ---
 from app.core.security import get_current_user 
 
-# 1. Crear tablas automáticamente
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(title="AutoBid AI API", version="0.3.0")
 
 app.add_middleware(
@@ -34,6 +46,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Latencia por método/ruta/status (http_request_duration_seconds en /metrics)
+app.add_middleware(instrumentation.RequestTimingMiddleware)
 
 # ==========================================
 # 1. CORE & HEALTH
@@ -46,6 +60,79 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/live")
+def liveness():
+    # El proceso responde: no toca DB ni servicios externos
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness():
+    checks = {"db": False, "schema": startup.state["db_schema"], "warmup": startup.state["warmup"]}
+    if not checks["schema"]:
+        # La DB no estaba al arrancar: reintentamos crear las tablas
+        checks["schema"] = init_db()
+    try:
+        with engine.connect() as conn:
+            conn.execute(sql_text("SELECT 1"))
+        checks["db"] = True
+    except Exception as e:
+        checks["db_error"] = str(e)
+
+    ready = checks["db"] and checks["schema"]
+    if settings.READY_REQUIRES_WARMUP and startup.state["warmup"] == "running":
+        ready = False
+    return JSONResponse({"status": "ready" if ready else "not_ready", "checks": checks}, status_code=200 if ready else 503)
+
+@app.get("/health/startup")
+def startup_profile():
+    # Tiempos de import (con STARTUP_PROFILE=true) y de cada fase de init/warmup
+    return startup.report()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Métricas del proceso (rate limiting, latencia por etapa/ruta/SQL, etc.) en formato Prometheus
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+def init_db() -> bool:
+    """Crea las tablas. Si la DB no responde la API arranca igual (no-ready) y /health/ready reintenta."""
+    try:
+        with startup.phase("db.create_all"):
+            Base.metadata.create_all(bind=engine)
+        startup.state["db_schema"] = True
+        startup.state["db_error"] = None
+    except Exception as e:
+        startup.state["db_error"] = str(e)
+        print(f"⚠️ DB no disponible al arrancar: {e}")
+    return startup.state["db_schema"]
+
+@app.on_event("startup")
+def start_background_workers():
+    # 1. Crear tablas automáticamente
+    init_db()
+    with startup.phase("job_queue.start"):
+        job_queue.start_workers()
+    lifecycle.on_shutdown("job_queue", job_queue.stop_workers, order=10)
+    # Después de parar los jobs (no encolan más) y antes de cerrar pools: se aplica lo pendiente
+    lifecycle.on_shutdown("vector_writer", vector_writer.stop, order=20)
+    lifecycle.on_shutdown("pii_pool", privacy.shutdown_pool, order=90)
+    if settings.ML_POOL_ENABLED:
+        ml_service.start_pool_refresher()
+        lifecycle.on_shutdown("ml_pool", ml_service.stop_pool_refresher, order=30)
+
+    # Warmup opcional en background: la API ya acepta requests mientras tanto
+    warmup = []
+    if settings.STARTUP_WARMUP:
+        warmup += [("ml", ml_service.warmup), ("rag", rag_service.warmup)]
+    if settings.PII_WARMUP_ON_STARTUP:
+        warmup.append(("pii", privacy.warmup))
+    startup.run_warmup(warmup)
+    startup.mark_started()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    # SIGTERM (gunicorn/uvicorn): corren los hooks registrados, en orden
+    lifecycle.run_shutdown()
+
 # ==========================================
 # 2. DATA ENGINEERING & ML
 # ==========================================
@@ -54,6 +141,47 @@ def force_retrain(db: Session = Depends(get_db), user_id: str = Depends(get_curr
     result = ml_service.train_model_from_db(db, user_id=user_id) 
     return result
 
+class WhatIfAxis(BaseModel):
+    variable: str # budget | technical_score | days_deadline
+    # Grilla explícita, o bien start/stop/steps (linspace). Con los topes, un eje gigante es 422 sin llegar al servicio
+    values: List[float] = Field(default=[], max_length=settings.ML_WHATIF_MAX_POINTS)
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    steps: int = Field(default=50, ge=2, le=settings.ML_WHATIF_MAX_POINTS)
+
+class WhatIfRequest(BaseModel):
+    # Features de la licitación (las de la extracción); las no barridas quedan fijas
+    industry: str
+    budget: float
+    technical_score: float = 50
+    deadline: Optional[str] = None # YYYY-MM-DD
+    days_deadline: Optional[int] = None # Alternativa a deadline
+    axes: List[WhatIfAxis] = Field(max_length=2)
+
+@app.post("/ml/what-if")
+def what_if(req: WhatIfRequest, user_id: str = Depends(get_current_user)):
+    """Curva (1 eje) o superficie (2 ejes) de probabilidad de ganar, calculada en un solo batch."""
+    try:
+        return ml_service.predict_grid(
+            req.industry, req.budget, req.technical_score, req.deadline, user_id,
+            axes=[axis.model_dump() for axis in req.axes], days_deadline=req.days_deadline
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+class PoolOptInRequest(BaseModel):
+    opted_in: bool
+
+@app.get("/ml/pool")
+def get_pool_status(db: Session = Depends(get_db), user_id: str = Depends(get_current_user)):
+    return ml_service.pool_status(db, user_id)
+
+@app.post("/ml/pool")
+def set_pool_membership(req: PoolOptInRequest, db: Session = Depends(get_db), user_id: str = Depends(get_current_user)):
+    if not settings.ML_POOL_ENABLED:
+        raise HTTPException(status_code=400, detail="El modelo compartido no está habilitado (ML_POOL_ENABLED).")
+    return ml_service.set_pool_membership(db, user_id, req.opted_in)
+
 # ==========================================
 # 3. RAG & KNOWLEDGE BASE
 # ==========================================
@@ -72,99 +200,32 @@ def chat_active_tender(req: ChatRequest, user_id: str = Depends(get_current_user
 @app.post("/rag/upload-pdf")
 def upload_pdf_knowledge(
     file: UploadFile = File(...), 
-    category: str = Form("general"),
+    category: Optional[str] = Form(None), # Sin categoría = General (no cuenta como etiqueta); "auto" = clasificar
+    background: bool = True, # ?background=false: pipeline completo dentro del request
     db: Session = Depends(get_db),
     user_id: str = Depends(get_current_user)
 ): 
-    # 1. Extraer texto
-    text_content = pdf_parser.extract_text_from_pdf(file)
-    
-    # 2. Autodetectar categoría
-    final_category = category
-    if category == "auto":
-        try:
-            final_category = rag_service.detect_category(text_content, user_id=user_id)
-        except:
-            final_category = "General"
-    
-    # 3. Gestión de memoria
-    if final_category == "active_tender": 
-        rag_service.clear_active_tender(namespace=user_id) 
-        pinecone_category = "active_tender"
-        pinecone_sub = "input_file"
-    else:
-        pinecone_category = "company_knowledge"
-        pinecone_sub = final_category
-    
-    # 4. Ingestar en Pinecone
-    metadata = {
-        "category": pinecone_category,
-        "sub_category": pinecone_sub,
-        "source_id": file.filename
-    }
-    rag_service.ingest_text(text_content, metadata, namespace=user_id)
-    
-    # 5. Guardar registro en SQL (Solo si NO es active_tender)
-    if final_category != "active_tender" and category != "active_tender":
-        new_doc = KnowledgeDocument(
-            user_id=user_id,
-            filename=file.filename,
-            category=final_category,
-            upload_date=datetime.now(timezone.utc)
-        )
-        db.add(new_doc)
-        db.commit()
-    
-    # 6. ANÁLISIS + PREDICCIÓN ML (AHORA CON 4 ATRIBUTOS)
-    analysis_result = None
-    if final_category == "active_tender" or category == "active_tender":
-        try:
-            # A. Extraer datos con LLM (Trae Tech Score y Deadline)
-            extracted = rag_service.extract_key_data(text_content, user_id=user_id)
-            
-            industry = extracted.get("industry", "General")
-            budget = extracted.get("budget", 0)
-            tech_score = extracted.get("technical_score", 50)
-            deadline = extracted.get("deadline", None)
-            
-            # B. Predecir con ML (Pasamos los nuevos datos)
-            prediction_data = ml_service.predict_bid(
-                industry, 
-                budget, 
-                tech_score, 
-                deadline, 
-                user_id=user_id
-            )
-            
-            final_prob = 50.0
-            explanation_data = []
-
-            if prediction_data:
-                if isinstance(prediction_data, dict):
-                    # El ML service ya devuelve el % multiplicado (ej: 94.0)
-                    final_prob = prediction_data.get("probability", 50.0) 
-                    explanation_data = prediction_data.get("explanation", [])
-                else:
-                    final_prob = round(prediction_data * 100, 1)
-            
-            analysis_result = {
-                "detected_industry": industry,
-                "detected_budget": budget,
-                "win_probability": final_prob,
-                "explanation": explanation_data 
-            }
-        except Exception as e:
-            print(f"⚠️ Error analizando tender: {e}")
-            analysis_result = {
-                "detected_industry": "N/A", "detected_budget": 0, "win_probability": 50.0, "explanation": []
-            }
+    ctx = {"user_id": user_id, "filename": file.filename, "category": category}
 
-    return {
-        "message": "PDF procesado",
-        "filename": file.filename,
-        "detected_category": final_category,
-        "analysis": analysis_result
-    }
+    # Spool a disco con límites de tamaño/páginas (413): el PDF no se copia a memoria
+    try:
+        ctx["file_path"], ctx["upload"] = uploads.accept(file)
+    except uploads.UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # Modo background: 202 + job_id, el progreso se consulta en /jobs/{job_id}
+    if background:
+        job = job_queue.enqueue(db, user_id, ingest_service.KNOWLEDGE_PDF, ctx)
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"})
+
+    # 1-6. Texto (desde el archivo spooleado), categoría, ingesta en Pinecone, registro SQL y análisis ML
+    ctx["parse_wait"] = settings.UPLOAD_PARSE_WAIT_SECONDS
+    try:
+        return ingest_service.run_inline(ingest_service.KNOWLEDGE_PDF, ctx, db)
+    except uploads.UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    finally:
+        uploads.discard(ctx["file_path"])
 
 @app.get("/rag/documents")
 def get_documents(db: Session = Depends(get_db), user_id: str = Depends(get_current_user)):
@@ -186,12 +247,19 @@ class BulkCategoryRequest(BaseModel):
 @app.put("/rag/documents/bulk-update")
 def bulk_update_documents(req: BulkCategoryRequest, db: Session = Depends(get_db), user_id: str = Depends(get_current_user)):
     count = 0
+    updated_ids = []
     for item in req.updates:
         doc = db.query(KnowledgeDocument).filter(KnowledgeDocument.id == item.id, KnowledgeDocument.user_id == user_id).first()
         if doc:
-            doc.category = item.category
+            doc.category = doc_classifier.normalize_label(item.category)
+            updated_ids.append(doc.id)
             count += 1
+    # Las categorías corregidas/confirmadas son etiquetas para el clasificador local
+    if updated_ids:
+        doc_classifier.relabel(db, user_id, updated_ids)
     db.commit()
+    if updated_ids:
+        doc_classifier.refresh_async(user_id)
     return {"message": f"{count} documentos actualizados."}
 
 # Delete Documents
@@ -209,10 +277,27 @@ def delete_documents(req: DeleteDocsRequest, db: Session = Depends(get_db), user
             except Exception as e:
                 print(f"Error Pinecone: {e}")
             db.delete(doc)
+            doc_classifier.delete_samples(db, user_id, [doc.id])
             count += 1
     db.commit()
     return {"message": f"{count} eliminados."}
 
+@app.get("/rag/embedding-profile")
+def get_embedding_profile(user_id: str = Depends(get_current_user)):
+    # Perfil activo (dimensiones, reducción, cuantización, bytes por vector) vs. con el que está indexado el namespace
+    return rag_service.embedding_status(user_id)
+
+@app.post("/rag/reindex")
+def reindex_knowledge(background: bool = False, db: Session = Depends(get_db), user_id: str = Depends(get_current_user)):
+    """Re-indexa el namespace con el perfil de embeddings activo (también pasa solo en su primer uso)."""
+    if background:
+        job = job_queue.enqueue(db, user_id, ingest_service.REINDEX, {"user_id": user_id})
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"})
+    try:
+        return ingest_service.run_inline(ingest_service.REINDEX, {"user_id": user_id}, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/rag/generate-proposal")
 def generate_proposal(user_id: str = Depends(get_current_user)):
     draft = rag_service.generate_proposal_draft(namespace=user_id)
@@ -250,107 +335,112 @@ def get_dashboard_stats(db: Session = Depends(get_db), user_id: str = Depends(ge
 async def upload_historical_bid(
     file: UploadFile = File(...), 
     status: str = Form(...), 
+    background: bool = True, # ?background=false: pipeline completo dentro del request
     db: Session = Depends(get_db),
     user_id: str = Depends(get_current_user)
 ):
     print(f"📥 Intento de subida User {user_id}: {file.filename}")
 
-    file_bytes = await file.read()
-    
-    if len(file_bytes) == 0:
-        raise HTTPException(status_code=400, detail="El archivo está vacío.")
+    ctx = {"user_id": user_id, "filename": file.filename, "status": status}
 
-    text_content = ""
+    # Spool a disco con límites de tamaño/páginas (vacío: 400, grande: 413), fuera del event loop
     try:
-        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-            for page in pdf.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text_content += extracted + "\n"
-        
-        # 🔥 APLICAR LA LIMPIEZA AQUÍ (FIX) 🔥
-        text_content = clean_text_for_rag(text_content)
-        print(f"✨ Historial limpiado y aplanado ({len(text_content)} chars)")
+        ctx["file_path"], ctx["upload"] = await run_in_threadpool(uploads.accept, file)
+    except uploads.UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"PDF ilegible: {str(e)}")
+    if background:
+        job = job_queue.enqueue(db, user_id, ingest_service.HISTORY_PDF, ctx)
+        return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"})
 
+    # Parseo (pdfplumber desde el archivo), extracción LLM, SQL, Pinecone (diff) y re-entrenamiento
+    ctx["parse_wait"] = settings.UPLOAD_PARSE_WAIT_SECONDS
     try:
-        extracted_data = rag_service.extract_key_data(text_content, user_id=user_id)
-        industry = extracted_data.get("industry", "General")
-        budget = extracted_data.get("budget", 0.0)
-        tech_score = extracted_data.get("technical_score", 50.0)
-        deadline_str = extracted_data.get("deadline", None)
-        complexity = extracted_data.get("complexity", "Medium")
-        
-        # Convertir string fecha a objeto datetime
-        deadline_dt = None
-        if deadline_str:
-            try:
-                deadline_dt = datetime.strptime(deadline_str, "%Y-%m-%d").replace(tzinfo=timezone.utc)
-            except:
-                pass
-
-    except Exception:
-        industry = "General"
-        budget = 0.0
-        tech_score = 50.0
-        deadline_dt = None
-        complexity = "Medium"
-
-    # Limpieza en Pinecone
-    rag_service.delete_document_by_source(file.filename, namespace=user_id)
-
-    # Guardar en SQL con NUEVAS COLUMNAS
-    new_bid = Bid(
-        user_id=user_id,
-        project_name=file.filename.replace(".pdf", "").replace("_", " "),
-        client_name="Histórico Importado",
-        industry=industry,
-        budget=budget,
-        status=status,
-        content_text=text_content,
-        created_at=datetime.now(timezone.utc),
-        source_file=file.filename,
-        
-        # --- CAMPOS NUEVOS ---
-        technical_score=tech_score,
-        deadline_date=deadline_dt,
-        complexity=complexity
-    )
-    db.add(new_bid)
-    db.commit()
-    db.refresh(new_bid)
-
-    # Guardar en Pinecone (también va limpio)
-    if len(text_content) > 50:
-        metadata = {
-            "category": "past_bid",      
-            "status": status,            
-            "industry": industry,
-            "source_id": file.filename
-        }
-        rag_service.ingest_text(text_content, metadata, namespace=user_id)
-
-    # RE-ENTRENAMIENTO DEL MODELO 🧠
-    train_result = None
-    if status in ["WON", "LOST"]:
-        try:
-            train_result = ml_service.train_model_from_db(db, user_id=user_id)
-        except Exception as e:
-            train_result = {"status": "error", "message": str(e)}
-
-    return {
-        "message": "Historial guardado exitosamente", 
-        "id": new_bid.id,
-        "extracted_info": {"industry": industry, "budget": budget, "tech_score": tech_score},
-        "ml_training": train_result
+        return await run_in_threadpool(ingest_service.run_inline, ingest_service.HISTORY_PDF, ctx, db)
+    except uploads.UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ingest_service.UnreadablePDFError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        uploads.discard(ctx["file_path"])
+
+@app.post("/history/bulk-import")
+def bulk_import_history(
+    files: List[UploadFile] = File(...),
+    manifest: str = Form(""),
+    default_status: str = Form("PENDING"),
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Onboarding masivo: un ZIP (con manifest.csv/json opcional) o muchos PDFs + manifest de estados.
+    Corre como job: parseo y extracción en paralelo, un insert en lote, upserts agrupados y un único re-entrenamiento.
+    """
+    job_id = str(uuid.uuid4())
+    target_dir = job_queue.job_dir(job_id)
+    ctx = {
+        "user_id": user_id, "job_dir": target_dir, "manifest": manifest,
+        "default_status": default_status.upper(), "uploaded": [], "rejected": [], "archive_paths": []
     }
+    # Cada parte pasa por el spool con tope de tamaño (y de páginas los PDFs). Un PDF fuera de límites
+    # queda como error de ese archivo; un ZIP fuera de límites o el lote completo excedido es un 413.
+    total = 0
+    for i, upload in enumerate(files):
+        name = os.path.basename(upload.filename or f"archivo_{i}.pdf")
+        if not name.lower().endswith((".zip", ".pdf")):
+            continue
+        # Prefijo de índice en disco: dos archivos con el mismo nombre no se pisan
+        path = os.path.join(target_dir, f"{i:05d}-{name}")
+        try:
+            if name.lower().endswith(".zip"):
+                uploads.spool(upload, path, max_bytes=settings.BULK_MAX_ARCHIVE_BYTES)
+                ctx["archive_paths"].append(path)
+                continue
+            uploads.accept(upload, path)
+        except uploads.UploadRejectedError as e:
+            if name.lower().endswith(".zip"):
+                shutil.rmtree(target_dir, ignore_errors=True)
+                raise HTTPException(status_code=e.status_code, detail=f"{name}: {e.detail}")
+            ctx["rejected"].append({"filename": name, "error": e.detail})
+            continue
+        size = os.path.getsize(path)
+        total += size
+        ctx["uploaded"].append({"filename": name, "path": path, "size": size})
+        if len(ctx["uploaded"]) > settings.BULK_MAX_FILES or (settings.BULK_MAX_TOTAL_BYTES and total > settings.BULK_MAX_TOTAL_BYTES):
+            shutil.rmtree(target_dir, ignore_errors=True)
+            raise HTTPException(status_code=413, detail=f"La importación supera {settings.BULK_MAX_FILES} PDFs o "
+                                                         f"{settings.BULK_MAX_TOTAL_BYTES // (1024 * 1024)} MB.")
+
+    job = job_queue.enqueue(db, user_id, ingest_service.HISTORY_BULK, ctx, job_id=job_id)
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"})
 
 @app.get("/bids")
 def get_bids(db: Session = Depends(get_db), user_id: str = Depends(get_current_user)):
     return db.query(Bid).filter(Bid.user_id == user_id).order_by(Bid.id.desc()).all()
 
+@app.get("/export/{dataset}")
+def export_data(
+    dataset: str,
+    format: str = "csv",
+    columns: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Export completo por streaming: dataset 'bids' o 'usage', formato csv / ndjson / parquet.
+    columns=id,budget,status (por defecto todas menos content_text); date_from/date_to YYYY-MM-DD (inclusive).
+    """
+    try:
+        export = export_service.ExportRequest(dataset, format, user_id, columns, date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        export.iter_bytes(),
+        media_type=export.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export.filename}"'}
+    )
+
 class FinalizeRequest(BaseModel):
     title: str
     content: str
@@ -465,6 +555,7 @@ def purge_system(target: str = Form(...), db: Session = Depends(get_db), user_id
             db.query(Bid).filter(Bid.user_id == user_id).delete()
             db.query(KnowledgeDocument).filter(KnowledgeDocument.user_id == user_id).delete()
             db.commit()
+            ml_service.delete_model(user_id)
             msg += "Base de datos SQL limpiada."
         except Exception as e:
             db.rollback()
@@ -472,11 +563,28 @@ def purge_system(target: str = Form(...), db: Session = Depends(get_db), user_id
 
     return {"message": msg, "status": "success"}
 
+# ==========================================
+# 6. JOBS DE INGESTA EN BACKGROUND
+# ==========================================
+
+@app.get("/jobs")
+def list_jobs(limit: int = 20, db: Session = Depends(get_db), user_id: str = Depends(get_current_user)):
+    jobs = db.query(IngestionJob).filter(IngestionJob.user_id == user_id).order_by(IngestionJob.created_at.desc()).limit(limit).all()
+    return [job_queue.job_progress(j) for j in jobs]
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db), user_id: str = Depends(get_current_user)):
+    job = db.query(IngestionJob).filter(IngestionJob.id == job_id, IngestionJob.user_id == user_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job_queue.job_progress(job)
+
 @app.post("/rag/chat/stream")
-async def chat_streaming(request: ChatRequest, user_id: str = Depends(get_current_user)):
+async def chat_streaming(request: ChatRequest, http_request: Request, user_id: str = Depends(get_current_user)):
     return StreamingResponse(
-        rag_service.stream_ask_gemini(request.question, namespace=user_id), 
-        media_type="text/plain"
+        rag_service.astream_ask_gemini(request.question, namespace=user_id, is_disconnected=http_request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 # --- Modelos para actualización masiva de status ---
@@ -0,0 +1,82 @@
+from typing import List, Optional, Tuple
+from sqlalchemy import or_
+
+from app.db.session import SessionLocal
+from app.db.models import ChunkFingerprint
+from app.core.config import settings
+from app.utils import dedup
+
+
+def find_near_duplicates(chunks: List[str], namespace: str, scope: str, candidate_ids: List[str],
+                         batch_accepted: Optional[List[Tuple[int, str]]] = None) -> Tuple[List[int], List[Optional[str]]]:
+    """
+    Calcula la huella de cada chunk y la compara contra el índice del namespace/scope,
+    contra los chunks anteriores del mismo upload y contra los aceptados en el mismo lote
+    (batch_accepted, que se va completando con los nuevos aceptados).
+    candidate_ids[i] es el vector_id que tendría el chunk i (IDs determinísticos).
+    Devuelve (huellas, duplicate_of): duplicate_of[i] es None si hay que vectorizar el chunk
+    o el vector_id canónico al que queda enlazado.
+    """
+    fingerprints = [dedup.simhash(c) for c in chunks]
+    duplicate_of: List[Optional[str]] = [None] * len(chunks)
+
+    if not settings.DEDUP_ENABLED or not chunks:
+        return fingerprints, duplicate_of
+
+    max_distance = settings.DEDUP_MAX_HAMMING
+    chunk_bands = [dedup.bands(f) for f in fingerprints]
+
+    # 1. Candidatos del índice: cualquier banda coincidente (una sola query por upload)
+    db = SessionLocal()
+    try:
+        band_columns = [ChunkFingerprint.band_0, ChunkFingerprint.band_1, ChunkFingerprint.band_2, ChunkFingerprint.band_3]
+        conditions = [
+            col.in_({b[i] for b in chunk_bands}) for i, col in enumerate(band_columns)
+        ]
+        candidates = db.query(ChunkFingerprint.simhash, ChunkFingerprint.vector_id).filter(
+            ChunkFingerprint.namespace == namespace,
+            ChunkFingerprint.scope == scope,
+            ChunkFingerprint.vector_id.isnot(None),
+            or_(*conditions)
+        ).all()
+    finally:
+        db.close()
+
+    indexed = [(dedup.to_unsigned(h), vector_id) for h, vector_id in candidates]
+    accepted = batch_accepted if batch_accepted is not None else []
+
+    # 2. Comparación exacta por distancia de Hamming
+    for i, fp in enumerate(fingerprints):
+        match = next((vid for h, vid in indexed if dedup.is_near_duplicate(fp, h, max_distance)), None)
+        if match is None:
+            match = next((vid for h, vid in accepted if dedup.is_near_duplicate(fp, h, max_distance)), None)
+        if match is not None:
+            duplicate_of[i] = match
+            continue
+        accepted.append((fp, candidate_ids[i]))
+
+    return fingerprints, duplicate_of
+
+
+def record_fingerprints(namespace: str, scope: str, source_id: str, chunk_hashes: List[str], fingerprints: List[int],
+                        vector_ids: List[Optional[str]], duplicate_of: List[Optional[str]]):
+    """
+    Guarda las huellas del upload: las nuevas con su vector y las duplicadas enlazadas al canónico.
+    Estas filas son también el manifest de chunks de la fuente (ver manifest_service).
+    """
+    if not fingerprints:
+        return
+
+    db = SessionLocal()
+    try:
+        for i, fp in enumerate(fingerprints):
+            b = dedup.bands(fp)
+            db.add(ChunkFingerprint(
+                namespace=namespace, scope=scope, source_id=source_id, chunk_hash=chunk_hashes[i],
+                simhash=dedup.to_signed(fp),
+                band_0=b[0], band_1=b[1], band_2=b[2], band_3=b[3],
+                vector_id=vector_ids[i], duplicate_of=duplicate_of[i]
+            ))
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,217 @@
+import re
+import json
+import time
+import zlib
+import threading
+import unicodedata
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core import metrics
+from app.db.session import SessionLocal
+from app.db.models import DocumentSample, KnowledgeDocument
+
+# Clasificador local de documentos por tenant (reemplaza a detect_category en el caso común).
+# Etiquetas = KnowledgeDocument.category; features = hashing de uni/bigramas guardado en
+# document_samples (no guardamos texto). Si la confianza no alcanza, se usa el LLM.
+
+N_FEATURES = 2 ** 18
+# Peso de cada origen de etiqueta al entrenar. 'local' no entra: evitamos auto-reforzar errores.
+# 'default' (categoría por omisión del form, nadie la eligió) tampoco.
+TRAIN_WEIGHTS = {"user": 1.0, "llm": 0.5}
+
+# Forma canónica de las categorías: "general" y "General" son la misma clase
+CATEGORIES = ("CV", "Case Study", "Financial", "Technical", "General")
+_CANONICAL = {c.lower(): c for c in CATEGORIES}
+
+DECISIONS = metrics.counter("doc_classifier_decisions_total", "Clasificaciones de documentos por origen (local/llm)")
+PREDICT_TIME = metrics.histogram(
+    "doc_classifier_predict_seconds", "Latencia del clasificador local",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+)
+
+_TOKEN = re.compile(r"[a-z0-9]{2,}")
+_BIGRAM_MULT = np.uint64(1000003)
+
+
+def normalize_label(category: Optional[str]) -> Optional[str]:
+    if category is None:
+        return None
+    cleaned = " ".join(category.split())
+    return _CANONICAL.get(cleaned.lower(), cleaned)
+
+
+def featurize(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (índices, cuentas) de uni+bigramas hasheados (crc32, estable entre procesos) del comienzo del documento.
+    Más liviano que HashingVectorizer: cada token único se hashea una vez y los bigramas se combinan en numpy.
+    """
+    text = unicodedata.normalize("NFKD", text[:settings.DOC_CLASSIFIER_MAX_CHARS].lower()).encode("ascii", "ignore").decode("ascii")
+    tokens = _TOKEN.findall(text)
+    if not tokens:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+    hashes = {tok: zlib.crc32(tok.encode()) for tok in set(tokens)}
+    unigrams = np.array([hashes[t] for t in tokens], dtype=np.uint64)
+    bigrams = unigrams[:-1] * _BIGRAM_MULT ^ unigrams[1:]
+    indices, counts = np.unique(np.concatenate([unigrams, bigrams]) % np.uint64(N_FEATURES), return_counts=True)
+    return indices.astype(np.int64), counts.astype(np.float64)
+
+def _encode(features: Tuple[np.ndarray, np.ndarray]) -> str:
+    indices, counts = features
+    return json.dumps([indices.tolist(), counts.astype(int).tolist()])
+
+def _decode(raw: str):
+    from scipy.sparse import csr_matrix
+    indices, counts = json.loads(raw)
+    return csr_matrix((counts, indices, [0, len(indices)]), shape=(1, N_FEATURES), dtype=np.float64)
+
+
+class _TenantModel:
+    """
+    LogisticRegression "compilada": solo guardamos las columnas vistas al entrenar
+    (idf y coeficientes), así predecir es un searchsorted + un producto chico en numpy.
+    """
+
+    def __init__(self, tfidf, clf, seen: np.ndarray, signature: tuple, n_samples: int):
+        self.classes = [str(c) for c in clf.classes_]
+        self.seen = seen
+        self.idf = tfidf.idf_[seen]
+        self.unseen_idf = float(np.log(1 + n_samples) + 1)  # idf suavizado de un término nunca visto (df=0)
+        self.coef = clf.coef_[:, seen]
+        self.intercept = clf.intercept_
+        self.signature = signature
+        self.n_samples = n_samples
+
+    def predict(self, features: Tuple[np.ndarray, np.ndarray]) -> Tuple[str, float]:
+        indices, counts = features
+        if len(indices) == 0:
+            return self.classes[0], 0.0
+        pos = np.searchsorted(self.seen, indices)
+        pos[pos >= len(self.seen)] = 0
+        known = self.seen[pos] == indices
+        # sublinear tf * idf (las columnas no vistas solo aportan a la norma L2)
+        weights = (np.log(counts) + 1) * np.where(known, self.idf[pos], self.unseen_idf)
+        norm = np.sqrt(np.dot(weights, weights)) or 1.0
+        scores = self.coef[:, pos[known]] @ (weights[known] / norm) + self.intercept
+        if len(self.classes) == 2:
+            p1 = float(1.0 / (1.0 + np.exp(-scores[0])))
+            return (self.classes[1], p1) if p1 >= 0.5 else (self.classes[0], 1.0 - p1)
+        exp = np.exp(scores - scores.max())
+        best = int(exp.argmax())
+        return self.classes[best], float(exp[best] / exp.sum())
+
+
+_models: Dict[str, Optional[_TenantModel]] = {}
+_checked_at: Dict[str, float] = {}
+_refreshing = set()
+_lock = threading.Lock()
+
+
+def _signature(db: Session, user_id: str) -> tuple:
+    """Cambia si se agregan o re-etiquetan muestras entrenables."""
+    count, last = db.query(func.count(DocumentSample.id), func.max(DocumentSample.labeled_at)).filter(
+        DocumentSample.user_id == user_id,
+        DocumentSample.label_source.in_(list(TRAIN_WEIGHTS))
+    ).one()
+    return count, str(last)
+
+def train(db: Session, user_id: str) -> Optional[_TenantModel]:
+    signature = _signature(db, user_id)
+    rows = db.query(DocumentSample.features, DocumentSample.label_source, KnowledgeDocument.category).join(
+        KnowledgeDocument, KnowledgeDocument.id == DocumentSample.document_id
+    ).filter(
+        DocumentSample.user_id == user_id,
+        DocumentSample.label_source.in_(list(TRAIN_WEIGHTS)),
+        KnowledgeDocument.category.isnot(None)
+    ).all()
+
+    # Normalizadas también al entrenar: documentos guardados antes con otra capitalización
+    labels = [normalize_label(r.category) for r in rows]
+    if len(rows) < settings.DOC_CLASSIFIER_MIN_SAMPLES or len(set(labels)) < 2:
+        return None
+
+    # sklearn/scipy solo al entrenar: predecir usa numpy puro
+    from scipy.sparse import vstack
+    from sklearn.feature_extraction.text import TfidfTransformer
+    from sklearn.linear_model import LogisticRegression
+
+    X = vstack([_decode(r.features) for r in rows]).tocsr()
+    tfidf = TfidfTransformer(sublinear_tf=True).fit(X)
+    clf = LogisticRegression(C=10.0, max_iter=300, class_weight="balanced")
+    clf.fit(tfidf.transform(X), labels, sample_weight=[TRAIN_WEIGHTS[r.label_source] for r in rows])
+
+    seen = np.unique(X.indices)
+    model = _TenantModel(tfidf, clf, seen, signature, len(rows))
+    print(f"🏷️ Clasificador local de {user_id}: {len(rows)} muestras, clases {model.classes}")
+    return model
+
+def _refresh(user_id: str):
+    db = SessionLocal()
+    try:
+        current = _models.get(user_id)
+        if current is None or current.signature != _signature(db, user_id):
+            model = train(db, user_id)
+            with _lock:
+                _models[user_id] = model
+    except Exception as e:
+        print(f"⚠️ Error entrenando clasificador local de {user_id}: {e}")
+    finally:
+        db.close()
+        with _lock:
+            _refreshing.discard(user_id)
+            _checked_at[user_id] = time.monotonic()
+
+def refresh_async(user_id: str):
+    """Re-entrena en un thread si cambiaron las etiquetas. Mientras tanto se sigue usando el modelo anterior."""
+    with _lock:
+        if user_id in _refreshing:
+            return
+        _refreshing.add(user_id)
+    threading.Thread(target=_refresh, args=(user_id,), name=f"doc-classifier-{user_id}", daemon=True).start()
+
+def classify(text: str, user_id: str) -> Optional[Tuple[str, float]]:
+    """(categoría, confianza) si el modelo local está seguro; None = usar el LLM."""
+    with _lock:
+        model = _models.get(user_id)
+        stale = time.monotonic() - _checked_at.get(user_id, float("-inf")) > settings.DOC_CLASSIFIER_REFRESH_SECONDS
+    if stale:
+        # Otros procesos pudieron agregar etiquetas: chequeo barato de firma en background
+        refresh_async(user_id)
+    if model is None:
+        return None
+
+    start = time.perf_counter()
+    label, confidence = model.predict(featurize(text))
+    PREDICT_TIME.observe(time.perf_counter() - start)
+    if confidence < settings.DOC_CLASSIFIER_MIN_CONFIDENCE:
+        return None
+    return label, confidence
+
+
+# --- REGISTRO DE ETIQUETAS ---
+
+def record_sample(db: Session, user_id: str, document_id: int, text: str, label_source: str):
+    """Guarda las features del documento (el caller hace commit)."""
+    db.add(DocumentSample(
+        user_id=user_id,
+        document_id=document_id,
+        features=_encode(featurize(text)),
+        label_source=label_source
+    ))
+
+def relabel(db: Session, user_id: str, document_ids):
+    """El usuario corrigió/confirmó categorías (bulk-update): pasan a ser etiquetas 'user'."""
+    db.query(DocumentSample).filter(
+        DocumentSample.user_id == user_id,
+        DocumentSample.document_id.in_(list(document_ids))
+    ).update({"label_source": "user", "labeled_at": datetime.now(timezone.utc)}, synchronize_session=False)
+
+def delete_samples(db: Session, user_id: str, document_ids):
+    db.query(DocumentSample).filter(
+        DocumentSample.user_id == user_id,
+        DocumentSample.document_id.in_(list(document_ids))
+    ).delete(synchronize_session=False)
@@ -0,0 +1,237 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core import metrics
+from app.core.config import settings
+from app.services import model_store
+
+# Perfil de embeddings: cuántas dimensiones se guardan en Pinecone y cómo se cachean localmente.
+#   EMBEDDING_DIM         3072 = salida completa de gemini-embedding-001. Menos dimensiones = menos
+#                         storage, payload de upsert y costo de query en cada namespace.
+#   EMBEDDING_REDUCTION   api = outputDimensionality de Gemini (modelo Matryoshka: las primeras
+#                         dimensiones concentran la información) | pca = se piden los 3072 y se
+#                         proyectan con un PCA ajustado sobre vectores completos (model_store).
+#                         Sin proyección ajustada (no hay vectores completos) se usa api.
+#   EMBEDDING_QUANTIZATION  none | float16 | int8 (escala por vector) para el cache en memoria.
+# Pinecone guarda float32 siempre; un índice por dimensión (autobid-index, autobid-index-768...).
+# El id del perfil (api3072, api768, pca768@v000002) queda registrado por namespace: si cambia,
+# rag_service encola su re-indexado y lo sigue sirviendo desde el índice viejo hasta que termina.
+
+FULL_DIM = 3072
+LEGACY_PROFILE = f"api{FULL_DIM}" # Namespaces anteriores al perfil (sin fila en embedding_index_state)
+PROJECTION_KIND = "embedding_projection"
+PROJECTION_OWNER = "global"
+
+REDUCTIONS = ("api", "pca")
+QUANTIZATIONS = {"none": 4, "float16": 2, "int8": 1} # bytes por dimensión
+
+CACHE_EVENTS = metrics.counter("embedding_cache_total", "Embeddings servidos desde el cache local (hit) o pedidos a la API (miss)")
+
+
+class Profile:
+    """Perfil validado a partir de los settings (o de valores explícitos, para benchmarks)."""
+
+    def __init__(self, dim: Optional[int] = None, reduction: Optional[str] = None, quantization: Optional[str] = None,
+                 projection_version: Optional[str] = None):
+        self.dim = int(dim or settings.EMBEDDING_DIM)
+        self.projection_version = projection_version # Fija la proyección (perfil con que quedó indexado un namespace)
+        self.reduction = reduction or settings.EMBEDDING_REDUCTION
+        self.quantization = quantization or settings.EMBEDDING_QUANTIZATION
+        if not 1 <= self.dim <= FULL_DIM:
+            raise ValueError(f"EMBEDDING_DIM fuera de rango: {self.dim} (1-{FULL_DIM})")
+        if self.reduction not in REDUCTIONS:
+            raise ValueError(f"EMBEDDING_REDUCTION desconocida: {self.reduction} (opciones: {', '.join(REDUCTIONS)})")
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"EMBEDDING_QUANTIZATION desconocida: {self.quantization} (opciones: {', '.join(QUANTIZATIONS)})")
+        if self.dim == FULL_DIM:
+            self.reduction = "api"
+
+    @property
+    def reduced(self) -> bool:
+        return self.dim < FULL_DIM
+
+    @property
+    def id(self) -> str:
+        """Identidad del espacio vectorial (la cuantización del cache no cambia lo que hay en Pinecone)."""
+        if self.reduction == "pca":
+            version = self.projection_version or model_store.current_version(PROJECTION_KIND, PROJECTION_OWNER)
+            return f"pca{self.dim}@{version or 'none'}"
+        return f"api{self.dim}"
+
+    @classmethod
+    def from_id(cls, profile_id: str) -> "Profile":
+        """Inversa de .id (api768, pca768@v000002): el perfil con que está indexado un namespace."""
+        spec, _, version = profile_id.partition("@")
+        reduction = "pca" if spec.startswith("pca") else "api"
+        return cls(int(spec[len(reduction):]), reduction, projection_version=version if version not in ("", "none") else None)
+
+    def index_name(self, base: str) -> str:
+        return base if not self.reduced else f"{base}-{self.dim}"
+
+    def bytes_per_vector(self, quantization: Optional[str] = None) -> int:
+        quantization = quantization or self.quantization
+        return self.dim * QUANTIZATIONS[quantization] + (4 if quantization == "int8" else 0)
+
+    def describe(self) -> dict:
+        return {
+            "id": self.id, "dim": self.dim, "reduction": self.reduction, "quantization": self.quantization,
+            "bytes_per_vector_pinecone": self.bytes_per_vector("none"),
+            "bytes_per_vector_cache": self.bytes_per_vector(),
+        }
+
+
+_profile: Optional[Profile] = None
+_fallback: Optional[Profile] = None
+
+def configured() -> Profile:
+    global _profile
+    if _profile is None:
+        _profile = Profile()
+    return _profile
+
+def current() -> Profile:
+    """
+    Perfil activo: el configurado, salvo pca sin proyección publicada (deploy nuevo o sin vectores
+    completos suficientes para ajustarla), que se sirve como api con las mismas dimensiones.
+    """
+    global _fallback
+    profile = configured()
+    if profile.reduction != "pca" or not profile.reduced or model_store.current_version(PROJECTION_KIND, PROJECTION_OWNER):
+        return profile
+    if _fallback is None:
+        _fallback = Profile(profile.dim, "api", profile.quantization)
+        print(f"⚠️ EMBEDDING_REDUCTION=pca sin proyección ajustada: se usa {_fallback.id} (outputDimensionality) "
+              f"hasta que haya al menos {profile.dim} vectores de {FULL_DIM} dimensiones para ajustarla")
+    return _fallback
+
+
+# ==========================================
+# REDUCCIÓN: NORMALIZACIÓN + PROYECCIÓN LOCAL
+# ==========================================
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Lo que devuelve outputDimensionality: las primeras dim componentes, renormalizadas."""
+    return normalize(np.asarray(vectors)[..., :dim])
+
+def fit_pca(vectors: np.ndarray, dim: int) -> dict:
+    """Componentes principales de una muestra de vectores completos (n >= dim)."""
+    X = normalize(vectors).astype(np.float64)
+    if X.shape[0] < dim:
+        raise ValueError(f"Se necesitan al menos {dim} vectores para ajustar la proyección (hay {X.shape[0]})")
+    mean = X.mean(axis=0)
+    _, singular, vt = np.linalg.svd(X - mean, full_matrices=False)
+    explained = (singular[:dim] ** 2).sum() / max((singular ** 2).sum(), 1e-12)
+    return {
+        "components": vt[:dim].astype(np.float32),
+        "mean": mean.astype(np.float32),
+        "explained_variance": float(explained),
+    }
+
+def project(vectors: np.ndarray, projection: dict) -> np.ndarray:
+    vectors = normalize(vectors)
+    return normalize((vectors - projection["mean"]) @ projection["components"].T)
+
+
+_projection_cache = {"version": None, "projection": None}
+_projection_lock = threading.Lock()
+
+def save_projection(vectors: np.ndarray, dim: int) -> dict:
+    """Ajusta y publica la proyección (cambia el id del perfil pca: los namespaces se re-indexan)."""
+    fitted = fit_pca(vectors, dim)
+    version = model_store.save(
+        PROJECTION_KIND, PROJECTION_OWNER,
+        arrays={"components": fitted["components"], "mean": fitted["mean"]},
+        meta={"dim": dim, "samples": int(len(vectors)), "explained_variance": fitted["explained_variance"]},
+    )
+    print(f"🧭 Proyección de embeddings {FULL_DIM}->{dim} publicada ({version}, varianza explicada {fitted['explained_variance']:.1%})")
+    return {"version": version, "samples": int(len(vectors)), "explained_variance": fitted["explained_variance"]}
+
+def load_projection(version: Optional[str] = None) -> Optional[dict]:
+    """Proyección activa o la versión pedida (cacheada por versión: otro proceso puede haber publicado una nueva)."""
+    version = version or model_store.current_version(PROJECTION_KIND, PROJECTION_OWNER)
+    if version is None:
+        return None
+    with _projection_lock:
+        if _projection_cache["version"] != version:
+            artifact = model_store.load(PROJECTION_KIND, PROJECTION_OWNER, version)
+            _projection_cache["projection"] = {"components": np.asarray(artifact["components"]),
+                                               "mean": np.asarray(artifact["mean"])}
+            _projection_cache["version"] = version
+        return _projection_cache["projection"]
+
+def finish(values: List[float], profile: Profile) -> List[float]:
+    """Vector de la API -> vector del perfil (normalizado; proyectado si la reducción es local)."""
+    vector = np.asarray(values, dtype=np.float32)
+    if profile.reduction == "pca" and profile.reduced:
+        projection = load_projection(profile.projection_version)
+        if projection is None:
+            raise RuntimeError("EMBEDDING_REDUCTION=pca sin proyección ajustada (se ajusta al re-indexar)")
+        return project(vector, projection).tolist()
+    if vector.shape[0] > profile.dim:
+        vector = vector[:profile.dim]
+    return normalize(vector).tolist()
+
+
+# ==========================================
+# CUANTIZACIÓN + CACHE LOCAL
+# ==========================================
+
+def quantize(vector, quantization: str) -> Tuple[np.ndarray, float]:
+    """(códigos, escala). int8 es simétrico con escala por vector: valor = código * escala."""
+    vector = np.asarray(vector, dtype=np.float32)
+    if quantization == "int8":
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return np.clip(np.rint(vector / scale), -127, 127).astype(np.int8), scale
+    if quantization == "float16":
+        return vector.astype(np.float16), 1.0
+    return vector, 1.0
+
+def dequantize(codes: np.ndarray, scale: float) -> np.ndarray:
+    return codes.astype(np.float32) * np.float32(scale)
+
+
+class VectorCache:
+    """LRU de embeddings por hash del texto, guardados cuantizados (códigos + escala)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(profile: Profile, text: str) -> str:
+        return f"{profile.id}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+        CACHE_EVENTS.inc(result="hit" if item is not None else "miss")
+        return dequantize(*item).tolist() if item is not None else None
+
+    def put(self, key: str, vector: List[float], quantization: str):
+        if self.max_entries <= 0:
+            return
+        item = quantize(vector, quantization)
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": sum(codes.nbytes + (4 if codes.dtype == np.int8 else 0) for codes, _ in self._items.values())}
+
+
+cache = VectorCache(settings.EMBEDDING_CACHE_SIZE)
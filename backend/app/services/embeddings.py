@@ -0,0 +1,91 @@
+import requests
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+
+from app.core import instrumentation
+from app.services import embedding_profile
+from app.core.rate_limit import get_limiter, parse_retry_after, RateLimitedError, RetryableError
+
+# Embeddings de Gemini vía REST. En su propio módulo para que importar rag_service
+# no cargue langchain: rag_service.get_embeddings() lo importa recién al primer uso.
+
+class GoogleRawRESTEmbeddings(Embeddings):
+
+    def __init__(self, api_key: str, profile: Optional[embedding_profile.Profile] = None):
+        self.api_key = api_key
+        self._profile = profile
+        self.model_name = "models/gemini-embedding-001"
+        self.api_url = (
+            f"https://generativelanguage.googleapis.com/v1beta/"
+            f"{self.model_name}:embedContent"
+        )
+
+    @property
+    def profile(self) -> embedding_profile.Profile:
+        # Sin perfil fijo sigue al activo (pca reemplaza al fallback api apenas se publica la proyección)
+        return self._profile or embedding_profile.current()
+
+    def _post(self, payload: dict) -> List[float]:
+        try:
+            response = requests.post(
+                self.api_url,
+                headers={
+                    "Content-Type": "application/json",
+                    "x-goog-api-key": self.api_key,
+                },
+                json=payload,
+                timeout=20,
+            )
+        except requests.RequestException as e:
+            raise RetryableError(str(e))
+
+        if response.status_code == 429:
+            raise RateLimitedError(response.text, retry_after=parse_retry_after(response.headers.get("Retry-After")))
+        if response.status_code >= 500:
+            raise RetryableError(response.text)
+        if response.status_code != 200:
+            raise RuntimeError(response.text)
+
+        data = response.json()
+        return data["embedding"]["values"]
+
+    def _embed_single(self, text: str) -> List[float]:
+        clean_text = text.replace("\n", " ").strip()
+
+        # Cache local (cuantizado según EMBEDDING_QUANTIZATION): boilerplate repetido entre
+        # namespaces y consultas repetidas no vuelven a la API
+        profile = self.profile
+        key = embedding_profile.cache.key(profile, clean_text)
+        cached = embedding_profile.cache.get(key)
+        if cached is not None:
+            return cached
+
+        payload = {
+            "content": {
+                "parts": [{"text": clean_text}]
+            }
+        }
+        # Perfil reducido vía API: Gemini devuelve solo las primeras N dimensiones (sin normalizar)
+        if profile.reduced and profile.reduction == "api":
+            payload["outputDimensionality"] = profile.dim
+
+        # Token bucket compartido + AIMD + retry con jitter (respeta Retry-After)
+        limiter = get_limiter("embedding", self.api_key, self.model_name)
+        try:
+            values = limiter.call(lambda: self._post(payload))
+        except Exception as e:
+            raise RuntimeError(f"Fallo total gemini-embedding-001: {e}")
+
+        vector = embedding_profile.finish(values, profile)
+        embedding_profile.cache.put(key, vector, profile.quantization)
+        return vector
+
+    # 👇 ESTO FALTABA
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        print(f"⚡ Procesando {len(texts)} textos...")
+        with instrumentation.stage("embed.documents"):
+            return [self._embed_single(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        with instrumentation.stage("embed.query"):
+            return self._embed_single(text)
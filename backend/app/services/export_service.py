@@ -0,0 +1,187 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Optional
+
+from sqlalchemy import select, Integer, BigInteger, Float, Boolean, DateTime
+
+from app.core import metrics
+from app.core.config import settings
+from app.db.models import Bid, TokenUsageLog
+from app.db.session import SessionLocal
+
+# Export por streaming (CSV / NDJSON / Parquet) de licitaciones y consumo de tokens.
+# Las filas salen de la DB en tandas de EXPORT_BATCH_ROWS (yield_per + stream_results: cursor
+# del lado del servidor en Postgres) y se escriben al response tanda por tanda: la memoria no
+# depende de cuántas filas tenga el tenant.
+
+EXPORT_ROWS = metrics.counter("export_rows_total", "Filas exportadas por dataset y formato")
+
+# dataset -> (modelo, columna de fecha para el filtro, columnas por defecto)
+DATASETS = {
+    "bids": (Bid, "created_at", [
+        "id", "project_name", "client_name", "industry", "budget", "status", "technical_score", "complexity",
+        "client_type", "deadline_date", "win_probability", "source_file", "created_at", "updated_at",
+    ]),
+    "usage": (TokenUsageLog, "timestamp", [
+        "id", "model_name", "input_tokens", "output_tokens", "total_tokens", "timestamp",
+    ]),
+}
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _parse_date(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Fecha inválida: {value} (usar YYYY-MM-DD o ISO 8601)")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    # date_to=2024-03-31 incluye todo ese día
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+class ExportRequest:
+    """Export validado (dataset, columnas, formato, rango); iter_bytes() genera el archivo."""
+
+    def __init__(self, dataset: str, fmt: str, user_id: str, columns: Optional[str] = None,
+                 date_from: Optional[str] = None, date_to: Optional[str] = None):
+        if dataset not in DATASETS:
+            raise ValueError(f"Dataset desconocido: {dataset} (opciones: {', '.join(DATASETS)})")
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato desconocido: {fmt} (opciones: {', '.join(FORMATS)})")
+        if fmt == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError("El export a Parquet requiere pyarrow instalado")
+        self.model, date_column, default_columns = DATASETS[dataset]
+        available = [c.name for c in self.model.__table__.columns if c.name != "user_id"]
+        if columns:
+            self.columns = [c.strip() for c in columns.split(",") if c.strip()]
+            unknown = [c for c in self.columns if c not in available]
+            if unknown:
+                raise ValueError(f"Columnas desconocidas: {', '.join(unknown)} (disponibles: {', '.join(available)})")
+        else:
+            self.columns = default_columns
+        self.dataset, self.format, self.user_id = dataset, fmt, user_id
+        self.date_column = getattr(self.model, date_column)
+        self.date_from = _parse_date(date_from)
+        self.date_to = _parse_date(date_to, end=True)
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.format][0]
+
+    @property
+    def filename(self) -> str:
+        return f"{self.dataset}_{datetime.now(timezone.utc):%Y%m%d}.{FORMATS[self.format][1]}"
+
+    def _statement(self):
+        stmt = select(*[getattr(self.model, c) for c in self.columns]).where(self.model.user_id == self.user_id)
+        if self.date_from:
+            stmt = stmt.where(self.date_column >= self.date_from)
+        if self.date_to:
+            stmt = stmt.where(self.date_column < self.date_to)
+        return stmt.order_by(self.model.id).execution_options(stream_results=True, yield_per=settings.EXPORT_BATCH_ROWS)
+
+    def _batches(self) -> Iterator[List[tuple]]:
+        # Sesión propia: la del Depends(get_db) se cierra antes de que termine el streaming
+        db = SessionLocal()
+        try:
+            for rows in db.execute(self._statement()).partitions():
+                EXPORT_ROWS.inc(len(rows), dataset=self.dataset, format=self.format)
+                yield rows
+        finally:
+            db.close()
+
+    def iter_bytes(self) -> Iterator[bytes]:
+        return {"csv": self._csv, "ndjson": self._ndjson, "parquet": self._parquet}[self.format]()
+
+    def _csv(self) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.columns)
+        for rows in self._batches():
+            writer.writerows([v.isoformat() if isinstance(v, datetime) else v for v in row] for row in rows)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def _ndjson(self) -> Iterator[bytes]:
+        for rows in self._batches():
+            lines = [json.dumps(dict(zip(self.columns, row)), default=_json_default, ensure_ascii=False) for row in rows]
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _parquet(self) -> Iterator[bytes]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(c, _arrow_type(getattr(self.model, c).type)) for c in self.columns])
+        sink = _DrainableSink()
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        try:
+            # Un row group por tanda: lo escrito se manda y se descarta
+            for rows in self._batches():
+                table = pa.Table.from_arrays([pa.array(list(col), type=field.type) for col, field in zip(zip(*rows), schema)], schema=schema)
+                writer.write_table(table)
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _arrow_type(column_type):
+    import pyarrow as pa
+    if isinstance(column_type, (Integer, BigInteger)):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    return pa.string()
+
+
+class _DrainableSink(io.RawIOBase):
+    """File-like de solo escritura: ParquetWriter escribe acá y drain() devuelve lo acumulado."""
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
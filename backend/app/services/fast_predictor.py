@@ -0,0 +1,144 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Predictor "compilado" del pipeline de licitaciones (OneHotEncoder + StandardScaler + RandomForest).
+# Para una sola fila, armar el DataFrame + ColumnTransformer + validaciones de sklearn cuesta más
+# que recorrer los árboles. Acá todo queda en arrays contiguos (se guardan como .npy en el
+# model_store y se cargan con mmap):
+#   - industria -> columna one-hot (en el manifest), media/escala del scaler
+#   - todos los árboles concatenados: feature, threshold, hijo izq/der, P(gana) en cada hoja.
+#     Índices en int64 (= np.intp): indexar con int32 obliga a numpy a convertirlos en cada nivel.
+#     Las hojas apuntan a sí mismas, así que recorrer max_depth niveles para todos los árboles a
+#     la vez (np.where sobre el vector de nodos) termina siempre en la hoja correcta.
+# Mismas cuentas que sklearn (scaler en float64, árboles comparan en float32): la salida coincide
+# con predict_proba salvo redondeo del promedio.
+
+ARRAY_NAMES = ("tree_feature", "tree_threshold", "tree_left", "tree_right", "tree_value", "tree_roots",
+               "scaler_mean", "scaler_scale")
+
+
+def compile_pipeline(pipeline, positive_class=1) -> Tuple[Dict[str, np.ndarray], dict]:
+    """Aplana el pipeline entrenado. Devuelve (arrays para model_store, meta)."""
+    preprocessor = pipeline.named_steps['preprocessor']
+    forest = pipeline.named_steps['classifier']
+    ohe = preprocessor.named_transformers_['cat']
+    scaler = preprocessor.named_transformers_['num']
+    industries = [str(c) for c in ohe.categories_[0]]
+    n_cat = len(industries)
+
+    classes = list(forest.classes_)
+    column = classes.index(positive_class) if positive_class in classes else None
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        nodes = np.arange(n, dtype=np.int64) + offset
+        leaf = tree.children_left < 0
+        features.append(np.where(leaf, 0, tree.feature).astype(np.int64))
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(np.where(leaf, nodes, tree.children_left + offset).astype(np.int64))
+        rights.append(np.where(leaf, nodes, tree.children_right + offset).astype(np.int64))
+        counts = tree.value[:, 0, :]
+        proba = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1e-12)
+        values.append(proba[:, column] if column is not None else np.zeros(n))
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        "tree_feature": np.concatenate(features),
+        "tree_threshold": np.concatenate(thresholds),
+        "tree_left": np.concatenate(lefts),
+        "tree_right": np.concatenate(rights),
+        "tree_value": np.concatenate(values).astype(np.float64),
+        "tree_roots": np.asarray(roots, dtype=np.int64),
+        "scaler_mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scaler_scale": np.asarray(scaler.scale_, dtype=np.float64),
+    }
+    meta = {
+        "industries": {name: i for i, name in enumerate(industries)},
+        "n_features": n_cat + len(scaler.mean_),
+        "max_depth": int(max_depth),
+        "n_trees": len(forest.estimators_),
+    }
+    return arrays, meta
+
+
+class FastPredictor:
+    """P(gana) sin pandas ni sklearn: one-hot + scaler + bosque con operaciones de numpy."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: dict):
+        # np.asarray: vista ndarray del memmap (indexar un np.memmap es más lento); sin copia si ya es intp
+        for name in ARRAY_NAMES:
+            dtype = np.intp if name in ("tree_feature", "tree_left", "tree_right", "tree_roots") else np.float64
+            setattr(self, name, np.asarray(arrays[name], dtype=dtype))
+        self.industries: Dict[str, int] = meta["industries"]
+        self.n_features: int = meta["n_features"]
+        self.max_depth: int = meta["max_depth"]
+        self.n_cat = len(self.industries)
+
+    @classmethod
+    def from_artifact(cls, artifact: dict) -> Optional["FastPredictor"]:
+        """Desde un artefacto del model_store (None si es de antes de tener predictor compilado)."""
+        meta = artifact.get("meta", {}).get("fast_predictor")
+        if not meta or any(name not in artifact for name in ARRAY_NAMES):
+            return None
+        return cls({name: artifact[name] for name in ARRAY_NAMES}, meta)
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> "FastPredictor":
+        arrays, meta = compile_pipeline(pipeline)
+        return cls(arrays, meta)
+
+    def transform(self, industry: List[str], numeric: np.ndarray) -> np.ndarray:
+        """Equivalente a preprocessor.transform: (n, n_features) float64. Industria desconocida = todo 0."""
+        numeric = np.asarray(numeric, dtype=np.float64).reshape(len(industry), -1)
+        X = np.zeros((len(industry), self.n_features), dtype=np.float64)
+        cols = np.fromiter((self.industries.get(i, -1) for i in industry), dtype=np.int64, count=len(industry))
+        known = cols >= 0
+        X[np.nonzero(known)[0], cols[known]] = 1.0
+        X[:, self.n_cat:] = (numeric - self.scaler_mean) / self.scaler_scale
+        return X
+
+    def predict_one(self, industry: str, budget: float, technical_score: float, days_deadline: float) -> float:
+        """Camino rápido de una fila (~decenas de µs)."""
+        x = np.zeros(self.n_features, dtype=np.float64)
+        col = self.industries.get(industry)
+        if col is not None:
+            x[col] = 1.0
+        x[self.n_cat:] = (np.array((budget, technical_score, days_deadline), dtype=np.float64) - self.scaler_mean) / self.scaler_scale
+        # Los árboles de sklearn comparan X en float32 (el cast de vuelta a float64 es exacto)
+        x = x.astype(np.float32).astype(np.float64)
+
+        feature, threshold, left, right = self.tree_feature, self.tree_threshold, self.tree_left, self.tree_right
+        node = self.tree_roots
+        for _ in range(self.max_depth):
+            node = np.where(x[feature[node]] <= threshold[node], left[node], right[node])
+        return float(self.tree_value[node].mean())
+
+    def predict_transformed(self, X: np.ndarray) -> np.ndarray:
+        """P(gana) para una matriz ya transformada (n, n_features)."""
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.tree_roots, (X.shape[0], len(self.tree_roots))).copy()
+        for _ in range(self.max_depth):
+            node = np.where(X[rows, self.tree_feature[node]] <= self.tree_threshold[node],
+                            self.tree_left[node], self.tree_right[node])
+        return self.tree_value[node].mean(axis=1)
+
+    def predict_many(self, industry: List[str], numeric: np.ndarray) -> np.ndarray:
+        """P(gana) para n filas: industry (n,), numeric (n, 3) = budget, technical_score, days_deadline."""
+        return self.predict_transformed(self.transform(industry, numeric))
+
+
+def max_abs_error(predictor: FastPredictor, pipeline, df) -> float:
+    """Diferencia máxima contra pipeline.predict_proba sobre un DataFrame (columnas de entrenamiento)."""
+    expected = pipeline.predict_proba(df)
+    classes = list(pipeline.named_steps['classifier'].classes_)
+    expected = expected[:, classes.index(1)] if 1 in classes else np.zeros(len(df))
+    got = predictor.predict_many(df["industry"].astype(str).tolist(),
+                                 df[["budget", "technical_score", "days_deadline"]].to_numpy())
+    return float(np.abs(got - expected).max()) if len(df) else 0.0
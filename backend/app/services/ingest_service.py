@@ -0,0 +1,508 @@
+"""
+Pipelines de ingesta por etapas. Los usan tanto los endpoints síncronos como los
+workers de la cola de jobs: cada etapa lee/escribe un contexto JSON-serializable,
+así un job puede guardar checkpoint tras cada etapa y retomar desde ahí.
+"""
+import os
+import csv
+import io
+import json
+import time
+import shutil
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core import instrumentation
+from app.db.models import Bid, KnowledgeDocument
+from app.services import ml_service, doc_classifier
+from app.services import rag_service, vector_writer
+from app.utils import pdf_parser, uploads
+
+KNOWLEDGE_PDF = "knowledge_pdf"
+HISTORY_PDF = "history_pdf"
+HISTORY_BULK = "history_bulk"
+REINDEX = "reindex"
+
+VALID_STATUSES = {"WON", "LOST", "PENDING"}
+
+
+class UnreadablePDFError(Exception):
+    """El PDF no se pudo leer: no tiene sentido reintentar."""
+
+
+class BulkLimitError(Exception):
+    """La importación masiva supera BULK_MAX_FILES / BULK_MAX_TOTAL_BYTES: no tiene sentido reintentar."""
+
+
+# ==========================================
+# 1. KNOWLEDGE BASE (/rag/upload-pdf)
+# ==========================================
+
+def _parse_guarded(ctx: dict, parse):
+    # Cupo de parseos grandes del worker + pico de RSS (los requests inline esperan con tope: parse_wait)
+    report = {}
+    with uploads.parse_guard(ctx["file_path"], report, wait=ctx.get("parse_wait")):
+        text = parse(ctx["file_path"])
+    ctx["upload"] = {**(ctx.get("upload") or {}), **report}
+    return text
+
+def _knowledge_parse(ctx: dict, db: Session):
+    ctx["text"] = _parse_guarded(ctx, pdf_parser.extract_text_from_path)
+
+def _knowledge_classify(ctx: dict, db: Session):
+    category = ctx["category"]
+    final_category = doc_classifier.normalize_label(category)
+    label_source = "user"
+    if category is None:
+        # Sin categoría en el form: General por omisión, no es una etiqueta elegida
+        final_category, label_source = "General", "default"
+    elif category == "auto":
+        # Primero el clasificador local del tenant; el LLM solo si no está seguro
+        local = doc_classifier.classify(ctx["text"], ctx["user_id"])
+        if local:
+            final_category, label_source = local[0], "local"
+        else:
+            detected = rag_service.detect_category(ctx["text"], user_id=ctx["user_id"])
+            if detected is not None:
+                final_category, label_source = detected, "llm"
+            else:
+                final_category, label_source = "General", "local"  # Fallback: no sirve como etiqueta
+        doc_classifier.DECISIONS.inc(source=label_source)
+    ctx["final_category"] = final_category
+    ctx["label_source"] = label_source
+
+def _is_active_tender(ctx: dict) -> bool:
+    return ctx["final_category"] == "active_tender" or ctx["category"] == "active_tender"
+
+def _knowledge_ingest(ctx: dict, db: Session):
+    user_id = ctx["user_id"]
+    if ctx["final_category"] == "active_tender":
+        rag_service.clear_active_tender(namespace=user_id, keep_source=ctx["filename"])
+        pinecone_category = "active_tender"
+        pinecone_sub = "input_file"
+    else:
+        pinecone_category = "company_knowledge"
+        pinecone_sub = ctx["final_category"]
+
+    metadata = {
+        "category": pinecone_category,
+        "sub_category": pinecone_sub,
+        "source_id": ctx["filename"]
+    }
+    ctx["ingest"] = rag_service.ingest_text(ctx["text"], metadata, namespace=user_id)
+    if pinecone_category == "active_tender":
+        # Lo siguiente suele ser el chat sobre la licitación (quizás en otro worker): se escribe ya
+        vector_writer.barrier(user_id)
+
+def _knowledge_register(ctx: dict, db: Session):
+    # Solo si NO es active_tender (y una sola vez aunque se reintente el job)
+    if _is_active_tender(ctx) or ctx.get("document_id"):
+        return
+    new_doc = KnowledgeDocument(
+        user_id=ctx["user_id"],
+        filename=ctx["filename"],
+        category=ctx["final_category"],
+        upload_date=datetime.now(timezone.utc)
+    )
+    db.add(new_doc)
+    db.flush()
+    label_source = ctx.get("label_source", "user")
+    doc_classifier.record_sample(db, ctx["user_id"], new_doc.id, ctx["text"], label_source)
+    db.commit()
+    ctx["document_id"] = new_doc.id
+    if label_source in doc_classifier.TRAIN_WEIGHTS:
+        doc_classifier.refresh_async(ctx["user_id"])
+
+def _knowledge_analyze(ctx: dict, db: Session):
+    ctx["analysis"] = None
+    if not _is_active_tender(ctx):
+        return
+    user_id = ctx["user_id"]
+    try:
+        # A. Extraer datos con LLM (Trae Tech Score y Deadline)
+        extracted = rag_service.extract_key_data(ctx["text"], user_id=user_id)
+
+        industry = extracted.get("industry", "General")
+        budget = extracted.get("budget", 0)
+        tech_score = extracted.get("technical_score", 50)
+        deadline = extracted.get("deadline", None)
+
+        # B. Predecir con ML
+        prediction_data = ml_service.predict_bid(industry, budget, tech_score, deadline, user_id=user_id)
+
+        final_prob = 50.0
+        explanation_data = []
+
+        if prediction_data:
+            if isinstance(prediction_data, dict):
+                # El ML service ya devuelve el % multiplicado (ej: 94.0)
+                final_prob = prediction_data.get("probability", 50.0)
+                explanation_data = prediction_data.get("explanation", [])
+            else:
+                final_prob = round(prediction_data * 100, 1)
+
+        ctx["analysis"] = {
+            "detected_industry": industry,
+            "detected_budget": budget,
+            "win_probability": final_prob,
+            "explanation": explanation_data
+        }
+    except Exception as e:
+        print(f"⚠️ Error analizando tender: {e}")
+        ctx["analysis"] = {
+            "detected_industry": "N/A", "detected_budget": 0, "win_probability": 50.0, "explanation": []
+        }
+
+def _knowledge_result(ctx: dict) -> dict:
+    return {
+        "message": "PDF procesado",
+        "filename": ctx["filename"],
+        "detected_category": ctx["final_category"],
+        "analysis": ctx.get("analysis"),
+        "ingest": ctx.get("ingest"),
+        "upload": ctx.get("upload")
+    }
+
+
+# ==========================================
+# 2. HISTORIAL (/history/upload)
+# ==========================================
+
+def _history_parse(ctx: dict, db: Session):
+    try:
+        ctx["text"] = _parse_guarded(ctx, pdf_parser.extract_text)
+    except uploads.UploadRejectedError:
+        raise
+    except Exception as e:
+        raise UnreadablePDFError(f"PDF ilegible: {str(e)}")
+    print(f"✨ Historial limpiado y aplanado ({len(ctx['text'])} chars)")
+
+def _history_extract(ctx: dict, db: Session):
+    try:
+        extracted_data = rag_service.extract_key_data(ctx["text"], user_id=ctx["user_id"])
+        ctx["extracted"] = {
+            "industry": extracted_data.get("industry", "General"),
+            "budget": extracted_data.get("budget", 0.0),
+            "tech_score": extracted_data.get("technical_score", 50.0),
+            "deadline": extracted_data.get("deadline", None),
+            "complexity": extracted_data.get("complexity", "Medium")
+        }
+    except Exception:
+        ctx["extracted"] = {"industry": "General", "budget": 0.0, "tech_score": 50.0, "deadline": None, "complexity": "Medium"}
+
+def _parse_deadline(deadline_str):
+    # Convertir string fecha a objeto datetime
+    if deadline_str:
+        try:
+            return datetime.strptime(deadline_str, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        except:
+            pass
+    return None
+
+def _history_bid(ctx: dict) -> Bid:
+    extracted = ctx["extracted"]
+    filename = ctx["filename"]
+    return Bid(
+        user_id=ctx["user_id"],
+        project_name=filename.replace(".pdf", "").replace("_", " "),
+        client_name="Histórico Importado",
+        industry=extracted["industry"],
+        budget=extracted["budget"],
+        status=ctx["status"],
+        content_text=ctx["text"],
+        created_at=datetime.now(timezone.utc),
+        source_file=filename,
+        technical_score=extracted["tech_score"],
+        deadline_date=_parse_deadline(extracted["deadline"]),
+        complexity=extracted["complexity"]
+    )
+
+def _history_register(ctx: dict, db: Session):
+    if ctx.get("bid_id"):
+        return
+    new_bid = _history_bid(ctx)
+    db.add(new_bid)
+    db.commit()
+    db.refresh(new_bid)
+    ctx["bid_id"] = new_bid.id
+
+def _history_metadata(ctx: dict) -> dict:
+    return {
+        "category": "past_bid",
+        "status": ctx["status"],
+        "industry": ctx["extracted"]["industry"],
+        "source_id": ctx["filename"]
+    }
+
+def _history_ingest(ctx: dict, db: Session):
+    ctx["ingest"] = None
+    if len(ctx["text"]) > 50:
+        # Re-subida: ingest_text hace el diff contra el manifest (solo chunks nuevos/borrados)
+        ctx["ingest"] = rag_service.ingest_text(ctx["text"], _history_metadata(ctx), namespace=ctx["user_id"])
+    else:
+        rag_service.delete_document_by_source(ctx["filename"], namespace=ctx["user_id"])
+
+def _history_train(ctx: dict, db: Session):
+    # RE-ENTRENAMIENTO DEL MODELO 🧠
+    ctx["ml_training"] = None
+    if ctx["status"] in ["WON", "LOST"]:
+        try:
+            ctx["ml_training"] = ml_service.train_model_from_db(db, user_id=ctx["user_id"])
+        except Exception as e:
+            ctx["ml_training"] = {"status": "error", "message": str(e)}
+
+def _history_result(ctx: dict) -> dict:
+    extracted = ctx["extracted"]
+    return {
+        "message": "Historial guardado exitosamente",
+        "id": ctx["bid_id"],
+        "extracted_info": {"industry": extracted["industry"], "budget": extracted["budget"], "tech_score": extracted["tech_score"]},
+        "ml_training": ctx.get("ml_training"),
+        "ingest": ctx.get("ingest"),
+        "upload": ctx.get("upload")
+    }
+
+
+# ==========================================
+# 3. IMPORTACIÓN MASIVA DE HISTORIAL (/history/bulk-import)
+# ==========================================
+
+def parse_status_manifest(content: str) -> dict:
+    """Manifest de estados: JSON {"archivo.pdf": "WON"} o CSV con columnas filename,status."""
+    content = (content or "").strip()
+    if not content:
+        return {}
+    if content.startswith("{"):
+        return {k: str(v).upper() for k, v in json.loads(content).items()}
+    reader = csv.DictReader(io.StringIO(content))
+    return {row["filename"].strip(): row["status"].strip().upper() for row in reader if row.get("filename")}
+
+def _bulk_unpack(ctx: dict, db: Session):
+    ctx["started_at"] = time.time()
+    job_dir = ctx["job_dir"]
+    manifest = parse_status_manifest(ctx.get("manifest", ""))
+    max_bytes = settings.UPLOAD_MAX_BYTES
+    sources = list(ctx.get("uploaded", []))
+    files = [{**r, "path": None, "status": "PENDING"} for r in ctx.get("rejected", [])]
+
+    # Presupuesto antes de escribir nada: el directorio central del ZIP declara cuántos miembros
+    # hay y cuánto ocupan descomprimidos (miles de PDFs justo bajo el límite llenarían el disco)
+    count, total = len(sources), sum(s.get("size", 0) for s in sources)
+    for archive in ctx.get("archive_paths", []):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if info.filename.lower().endswith(".pdf") and not info.is_dir():
+                    count += 1
+                    total += info.file_size if not (max_bytes and info.file_size > max_bytes) else 0
+    if count > settings.BULK_MAX_FILES:
+        raise BulkLimitError(f"La importación tiene {count} PDFs (máximo {settings.BULK_MAX_FILES}).")
+    if settings.BULK_MAX_TOTAL_BYTES and total > settings.BULK_MAX_TOTAL_BYTES:
+        raise BulkLimitError(f"La importación ocupa {total // (1024 * 1024)} MB descomprimida "
+                             f"(máximo {settings.BULK_MAX_TOTAL_BYTES // (1024 * 1024)} MB).")
+
+    # ZIPs: solo PDFs y un manifest interno. En disco cada miembro va con prefijo de índice y sin
+    # rutas (evita zip-slip y que dos carpetas con el mismo nombre de archivo se pisen); la ruta
+    # original queda como filename (source_id) y para buscar el estado en el manifest.
+    for a, archive in enumerate(ctx.get("archive_paths", [])):
+        with zipfile.ZipFile(archive) as zf:
+            for n, info in enumerate(zf.infolist()):
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name:
+                    continue
+                # file_size es el tope que respeta ZipFile.open al descomprimir: el chequeo cubre zip bombs
+                too_big = max_bytes and info.file_size > max_bytes
+                if name.lower() in ("manifest.csv", "manifest.json"):
+                    if not too_big:
+                        manifest = {**parse_status_manifest(zf.read(info).decode("utf-8")), **manifest}
+                elif name.lower().endswith(".pdf"):
+                    if too_big:
+                        files.append({"filename": info.filename, "path": None, "status": "PENDING",
+                                      "error": f"El archivo supera el máximo de {max_bytes // (1024 * 1024)} MB."})
+                        continue
+                    target = os.path.join(job_dir, f"zip{a}-{n:05d}-{name}")
+                    with zf.open(info) as src, open(target, "wb") as dst:
+                        shutil.copyfileobj(src, dst, length=uploads.CHUNK_BYTES)
+                    try:
+                        uploads.check_pages(target)
+                    except uploads.UploadRejectedError as e:
+                        uploads.discard(target)
+                        files.append({"filename": info.filename, "path": None, "status": "PENDING", "error": e.detail})
+                        continue
+                    sources.append({"filename": info.filename, "path": target})
+    # Los ZIPs se borran en la etapa siguiente: si esta se reintenta (o la retoma otro worker) se
+    # vuelven a extraer con los mismos nombres y el resultado es el mismo
+
+    default_status = ctx.get("default_status", "PENDING")
+    for source in sources:
+        filename = source["filename"]
+        status = manifest.get(filename, manifest.get(os.path.basename(filename), default_status)).upper()
+        entry = {"filename": filename, "path": source["path"], "status": status}
+        if status not in VALID_STATUSES:
+            entry["error"] = f"Status inválido: {status}"
+        files.append(entry)
+    ctx["files"] = files
+
+def _bulk_parse(ctx: dict, db: Session):
+    # Parseo CPU-bound: pool de procesos ("spawn" porque corremos dentro de un thread worker).
+    # Se manda la función de pdf_parser (liviano) para que los hijos no importen los servicios.
+    for archive in ctx.get("archive_paths", []):
+        uploads.discard(archive) # El unpack ya tiene checkpoint
+    pending = [f for f in ctx["files"] if not f.get("error") and not f.get("text_path")]
+    if not pending:
+        return
+    workers = settings.BULK_PARSE_WORKERS or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {id(f): pool.submit(pdf_parser.extract_text, f["path"]) for f in pending}
+        for entry in pending:
+            try:
+                text = futures[id(entry)].result()
+                if not text:
+                    entry["error"] = "PDF sin texto extraíble"
+                    continue
+                # El texto va a disco, no al checkpoint (cientos de documentos)
+                entry["text_path"] = entry["path"] + ".txt"
+                with open(entry["text_path"], "w", encoding="utf-8") as fh:
+                    fh.write(text)
+            except Exception as e:
+                entry["error"] = f"PDF ilegible: {str(e)}"
+
+def _read_text(entry: dict) -> str:
+    with open(entry["text_path"], encoding="utf-8") as fh:
+        return fh.read()
+
+def _bulk_extract(ctx: dict, db: Session):
+    # Extracción LLM: I/O-bound, pool de threads
+    pending = [f for f in ctx["files"] if not f.get("error") and "extracted" not in f]
+
+    def extract(entry):
+        sub_ctx = {"user_id": ctx["user_id"], "text": _read_text(entry)}
+        _history_extract(sub_ctx, db=None)
+        entry["extracted"] = sub_ctx["extracted"]
+
+    with ThreadPoolExecutor(max_workers=settings.BULK_EXTRACT_WORKERS) as pool:
+        list(pool.map(extract, pending))
+
+def _bulk_register(ctx: dict, db: Session):
+    pending = [f for f in ctx["files"] if not f.get("error") and not f.get("bid_id")]
+    bids = []
+    for entry in pending:
+        sub_ctx = {"user_id": ctx["user_id"], "filename": entry["filename"], "status": entry["status"],
+                   "text": _read_text(entry), "extracted": entry["extracted"]}
+        bids.append(_history_bid(sub_ctx))
+    # Un solo commit para todo el lote
+    db.add_all(bids)
+    db.commit()
+    for entry, bid in zip(pending, bids):
+        entry["bid_id"] = bid.id
+
+def _bulk_ingest(ctx: dict, db: Session):
+    pending = [f for f in ctx["files"] if f.get("bid_id") and not f.get("ingested")]
+    batch_size = settings.BULK_INGEST_BATCH_DOCS
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        items = []
+        for entry in batch:
+            text = _read_text(entry)
+            if len(text) > 50:
+                metadata = _history_metadata({"status": entry["status"], "extracted": entry["extracted"], "filename": entry["filename"]})
+                items.append((text, metadata))
+        rag_service.ingest_texts(items, namespace=ctx["user_id"])
+        for entry in batch:
+            entry["ingested"] = True
+
+def _bulk_train(ctx: dict, db: Session):
+    # Un único re-entrenamiento al final del lote
+    ctx["ml_training"] = None
+    if any(f.get("bid_id") and f["status"] in ["WON", "LOST"] for f in ctx["files"]):
+        try:
+            ctx["ml_training"] = ml_service.train_model_from_db(db, user_id=ctx["user_id"])
+        except Exception as e:
+            ctx["ml_training"] = {"status": "error", "message": str(e)}
+    ctx["finished_at"] = time.time()
+
+def _bulk_result(ctx: dict) -> dict:
+    files = ctx["files"]
+    imported = [f for f in files if f.get("bid_id")]
+    elapsed = max(ctx.get("finished_at", time.time()) - ctx["started_at"], 1e-6)
+    return {
+        "message": f"{len(imported)} de {len(files)} licitaciones importadas",
+        "total_files": len(files),
+        "imported": len(imported),
+        "failed": len(files) - len(imported),
+        "errors": [{"filename": f["filename"], "error": f["error"]} for f in files if f.get("error")],
+        "elapsed_seconds": round(elapsed, 2),
+        "documents_per_minute": round(len(imported) / elapsed * 60, 1),
+        "ml_training": ctx.get("ml_training")
+    }
+
+
+# ==========================================
+# 3b. RE-INDEXADO AL CAMBIAR EL PERFIL DE EMBEDDINGS (/rag/reindex)
+# ==========================================
+
+def _reindex_vectors(ctx: dict, db: Session):
+    # Idempotente (upserts por ID): si el job se retoma, se vuelve a copiar el namespace entero
+    ctx["reindex"] = rag_service.reindex_namespace(ctx["user_id"])
+
+def _reindex_result(ctx: dict) -> dict:
+    return ctx["reindex"]
+
+# ==========================================
+# 4. REGISTRO DE PIPELINES
+# ==========================================
+
+PIPELINES = {
+    KNOWLEDGE_PDF: [
+        ("parse", _knowledge_parse),
+        ("classify", _knowledge_classify),
+        ("ingest", _knowledge_ingest),
+        ("register", _knowledge_register),
+        ("analyze", _knowledge_analyze),
+    ],
+    HISTORY_PDF: [
+        ("parse", _history_parse),
+        ("extract", _history_extract),
+        ("register", _history_register),
+        ("ingest", _history_ingest),
+        ("train", _history_train),
+    ],
+    HISTORY_BULK: [
+        ("unpack", _bulk_unpack),
+        ("parse", _bulk_parse),
+        ("extract", _bulk_extract),
+        ("register", _bulk_register),
+        ("ingest", _bulk_ingest),
+        ("train", _bulk_train),
+    ],
+    REINDEX: [
+        ("reindex", _reindex_vectors),
+    ],
+}
+
+RESULT_BUILDERS = {
+    KNOWLEDGE_PDF: _knowledge_result,
+    HISTORY_PDF: _history_result,
+    HISTORY_BULK: _bulk_result,
+    REINDEX: _reindex_result,
+}
+
+# Errores que no se arreglan reintentando
+NON_RETRYABLE = (UnreadablePDFError, BulkLimitError)
+
+
+def run_stage(kind: str, stage: str, fn, ctx: dict, db: Session):
+    """Corre una etapa del pipeline midiendo su latencia (pipeline.<kind>.<etapa> en /metrics)."""
+    with instrumentation.stage(f"pipeline.{kind}.{stage}", tenant=ctx.get("user_id")):
+        fn(ctx, db)
+
+def run_inline(kind: str, ctx: dict, db: Session, skip: tuple = ()) -> dict:
+    """Corre el pipeline completo dentro del request (modo síncrono de los endpoints)."""
+    for stage, fn in PIPELINES[kind]:
+        if stage in skip:
+            continue
+        run_stage(kind, stage, fn, ctx, db)
+    return RESULT_BUILDERS[kind](ctx)
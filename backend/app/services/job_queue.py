@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import uuid
+import socket
+import shutil
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import or_, and_, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.db.models import IngestionJob
+from app.services import ingest_service, vector_writer
+
+# --- VARIABLES ---
+_workers: List[threading.Thread] = []
+_stop = threading.Event()
+_wakeup = threading.Event()
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+# ==========================================
+# 1. ENCOLAR Y CONSULTAR
+# ==========================================
+
+def enqueue(db: Session, user_id: str, kind: str, payload: dict, job_id: Optional[str] = None) -> IngestionJob:
+    job = IngestionJob(
+        id=job_id or str(uuid.uuid4()),
+        user_id=user_id,
+        kind=kind,
+        status="QUEUED",
+        payload=json.dumps({**payload, "user_id": user_id}),
+        stage_timings=json.dumps({})
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _wakeup.set()
+    return job
+
+def job_progress(job: IngestionJob) -> dict:
+    stages = [name for name, _ in ingest_service.PIPELINES[job.kind]]
+    timings = json.loads(job.stage_timings or "{}")
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "current_stage": job.current_stage,
+        "stages": [{"name": s, **timings.get(s, {"status": "pending"})} for s in stages],
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error
+    }
+
+
+# ==========================================
+# 2. WORKERS
+# ==========================================
+
+def _claim_next(db: Session) -> Optional[Tuple[str, str]]:
+    """
+    Reclama un job QUEUED (o RUNNING con lease vencido: su worker murió). Devuelve (job_id, lease).
+    El UPDATE condicional hace el claim atómico tanto en Postgres como en SQLite; el lease
+    (WORKER_ID + token del claim) distingue también a dos threads del mismo proceso.
+    """
+    now = _now()
+    claimable = or_(
+        IngestionJob.status == "QUEUED",
+        and_(IngestionJob.status == "RUNNING", IngestionJob.locked_until < now)
+    )
+    candidates = db.query(IngestionJob.id).filter(claimable).order_by(IngestionJob.created_at).limit(5).all()
+    for (job_id,) in candidates:
+        lease = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+        res = db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == job_id, claimable)
+            .values(status="RUNNING", locked_by=lease, locked_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS))
+        )
+        db.commit()
+        if res.rowcount == 1:
+            return job_id, lease
+    return None
+
+class LeaseLostError(Exception):
+    """Otro worker reclamó el job (lease vencido): este worker no escribe más nada del job."""
+
+
+def _renew_lease(db: Session, job_id: str, lease: Optional[str]) -> bool:
+    """Extiende locked_until solo si el job sigue siendo nuestro (UPDATE condicional, sin commit)."""
+    res = db.execute(
+        update(IngestionJob)
+        .where(IngestionJob.id == job_id, IngestionJob.locked_by == lease)
+        .values(locked_until=_now() + timedelta(seconds=settings.JOB_LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    return res.rowcount == 1
+
+def _commit_owned(db: Session, job_id: str, lease: Optional[str]):
+    """Commit de checkpoint/estado final en la misma transacción que el chequeo del lease."""
+    if not _renew_lease(db, job_id, lease):
+        db.rollback()
+        raise LeaseLostError(f"Job {job_id}: lease perdido")
+    db.commit()
+
+
+class _Heartbeat:
+    """Renueva el lease cada JOB_HEARTBEAT_SECONDS mientras corre una etapa (las largas superan el lease)."""
+
+    def __init__(self, job_id: str, lease: Optional[str]):
+        self.job_id, self.lease = job_id, lease
+        self.lost = threading.Event()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+
+    def _loop(self):
+        while not self._done.wait(settings.JOB_HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                owned = _renew_lease(db, self.job_id, self.lease)
+                db.commit()
+                if not owned:
+                    print(f"⚠️ Job {self.job_id}: lease tomado por otro worker")
+                    self.lost.set()
+                    return
+            except Exception as e:
+                print(f"⚠️ Heartbeat del job {self.job_id}: {e}")
+            finally:
+                db.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+
+def _cleanup_file(ctx: dict):
+    path = ctx.get("file_path")
+    if path and os.path.exists(path):
+        try: os.remove(path)
+        except OSError: pass
+    if ctx.get("job_dir"):
+        shutil.rmtree(ctx["job_dir"], ignore_errors=True)
+
+def job_dir(job_id: str) -> str:
+    path = os.path.join(settings.UPLOADS_DIR, job_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def run_job(job_id: str, lease: Optional[str] = None):
+    db = SessionLocal()
+    try:
+        job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+        if not job:
+            return
+        lease = lease or job.locked_by
+
+        # Retomamos desde el último checkpoint si el job ya había avanzado
+        ctx = json.loads(job.checkpoint) if job.checkpoint else json.loads(job.payload)
+        completed = ctx.setdefault("_completed", [])
+        timings = json.loads(job.stage_timings or "{}")
+        job.started_at = job.started_at or _now()
+        db.commit()
+
+        for stage, fn in ingest_service.PIPELINES[job.kind]:
+            if stage in completed:
+                continue
+
+            job.current_stage = stage
+            _commit_owned(db, job_id, lease)
+
+            attempt = 0
+            while True:
+                attempt += 1
+                job.attempts = (job.attempts or 0) + 1
+                _commit_owned(db, job_id, lease) # Persistido antes de la etapa: el rollback de un fallo no lo descuenta
+                start = time.perf_counter()
+                try:
+                    with _Heartbeat(job_id, lease) as heartbeat:
+                        ingest_service.run_stage(job.kind, stage, fn, ctx, db)
+                        # Las escrituras vectoriales de la etapa se aplican antes del checkpoint: una etapa
+                        # completada no puede quedar solo en el buffer en memoria si el worker muere
+                        vector_writer.barrier(job.user_id)
+                    if heartbeat.lost.is_set():
+                        raise LeaseLostError(f"Job {job_id}: lease perdido durante '{stage}'")
+                    timings[stage] = {"status": "done", "seconds": round(time.perf_counter() - start, 3), "attempts": attempt}
+                    break
+                except LeaseLostError:
+                    raise
+                except Exception as e:
+                    db.rollback()
+                    elapsed = round(time.perf_counter() - start, 3)
+                    retryable = not isinstance(e, ingest_service.NON_RETRYABLE)
+                    print(f"⚠️ Job {job_id} etapa '{stage}' intento {attempt}: {e}")
+                    if not retryable or attempt >= settings.JOB_STAGE_MAX_ATTEMPTS:
+                        timings[stage] = {"status": "failed", "seconds": elapsed, "attempts": attempt}
+                        job.status = "FAILED"
+                        job.error = str(e)
+                        job.stage_timings = json.dumps(timings)
+                        job.finished_at = _now()
+                        _commit_owned(db, job_id, lease)
+                        _cleanup_file(ctx)
+                        return
+                    time.sleep(2 ** (attempt - 1))
+
+            # Checkpoint + renovación del lease
+            completed.append(stage)
+            job.checkpoint = json.dumps(ctx, default=str)
+            job.stage_timings = json.dumps(timings)
+            _commit_owned(db, job_id, lease)
+
+        job.status = "SUCCEEDED"
+        job.current_stage = None
+        job.result = json.dumps(ingest_service.RESULT_BUILDERS[job.kind](ctx), default=str)
+        job.finished_at = _now()
+        _commit_owned(db, job_id, lease)
+        _cleanup_file(ctx)
+        print(f"✅ Job {job_id} ({job.kind}) completado.")
+    except LeaseLostError as e:
+        # El worker que lo reclamó sigue desde el último checkpoint (y usa los archivos del job)
+        db.rollback()
+        print(f"⚠️ {e}: se abandona sin escribir")
+    except Exception as e:
+        print(f"❌ Error inesperado en job {job_id}: {e}")
+    finally:
+        db.close()
+
+def _worker_loop():
+    while not _stop.is_set():
+        claimed = None
+        db = SessionLocal()
+        try:
+            claimed = _claim_next(db)
+        except Exception as e:
+            print(f"⚠️ Error reclamando jobs: {e}")
+        finally:
+            db.close()
+
+        if claimed:
+            run_job(*claimed)
+            continue
+
+        _wakeup.wait(settings.JOB_POLL_SECONDS)
+        _wakeup.clear()
+
+def start_workers(count: Optional[int] = None):
+    count = settings.JOB_WORKERS if count is None else count
+    _stop.clear()
+    for i in range(count - len(_workers)):
+        t = threading.Thread(target=_worker_loop, name=f"ingest-worker-{i}", daemon=True)
+        t.start()
+        _workers.append(t)
+    if count:
+        print(f"👷 {count} workers de ingesta iniciados ({WORKER_ID}).")
+
+def stop_workers(timeout: float = 10.0):
+    """Los jobs a medio correr quedan RUNNING y se retoman al vencer el lease."""
+    _stop.set()
+    _wakeup.set()
+    for t in _workers:
+        t.join(timeout=timeout)
+    _workers.clear()
@@ -0,0 +1,191 @@
+import time
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Callable, Dict, List
+
+from app.core.config import settings
+from app.core import metrics
+
+# Clases de prioridad (menor = más urgente)
+INTERACTIVE = 0 # Chat: hay un usuario mirando la pantalla
+STANDARD = 1 # Generación de propuestas (disparada por el usuario, tolera más latencia)
+BATCH = 2 # Ingesta: detect_category, extract_key_data
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", STANDARD: "standard", BATCH: "batch"}
+
+# --- MÉTRICAS ---
+QUEUE_DEPTH = metrics.gauge("llm_dispatch_queue_depth", "Llamadas LLM esperando slot, por prioridad")
+WAIT_TIME = metrics.histogram("llm_dispatch_wait_seconds", "Espera en la cola del dispatcher LLM, por prioridad")
+RUNNING = metrics.gauge("llm_dispatch_running", "Llamadas LLM en curso, por prioridad")
+
+
+class _Waiter:
+    __slots__ = ("user_id", "priority", "finish_tag", "enqueued_at", "seq", "granted")
+
+    def __init__(self, user_id: str, priority: int, finish_tag: float, seq: int):
+        self.user_id = user_id
+        self.priority = priority
+        self.finish_tag = finish_tag
+        self.enqueued_at = time.monotonic()
+        self.seq = seq
+        self.granted = False
+
+
+class LLMDispatcher:
+    """
+    Cola delante de get_llm():
+    - Prioridad estricta por clase (interactive > standard > batch), con aging para que
+      batch no quede esperando para siempre (sube hasta standard, nunca a interactive).
+    - Dentro de una clase, weighted fair queuing entre user_ids: cada tenant tiene un
+      "finish tag" virtual; se atiende el menor, así un tenant con 500 uploads en cola
+      no pasa delante del chat de otro.
+    - Tope de concurrencia por tenant y slots reservados para interactive.
+    """
+
+    def __init__(self, slots: int, tenant_cap: int, interactive_reserved: int, aging_seconds: float):
+        self.slots = slots
+        self.tenant_cap = tenant_cap
+        self.interactive_reserved = min(interactive_reserved, max(0, slots - 1))
+        self.aging_seconds = aging_seconds
+        self.weights: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._waiting: List[_Waiter] = []
+        self._running_total = 0
+        self._running_by_tenant: Dict[str, int] = {}
+        self._running_non_interactive = 0
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._seq = itertools.count()
+
+    def set_tenant_weight(self, user_id: str, weight: float):
+        with self._cond:
+            self.weights[user_id] = max(weight, 0.01)
+
+    def _effective_priority(self, waiter: _Waiter, now: float) -> int:
+        if self.aging_seconds <= 0 or waiter.priority == INTERACTIVE:
+            return waiter.priority
+        promoted = int((now - waiter.enqueued_at) // self.aging_seconds)
+        # El aging reordena solo entre standard y batch: nunca pasa delante del chat
+        return max(STANDARD, waiter.priority - promoted)
+
+    def _eligible(self, waiter: _Waiter) -> bool:
+        if self._running_by_tenant.get(waiter.user_id, 0) >= self.tenant_cap:
+            return False
+        # Por la clase original: lo no interactivo no usa los slots reservados aunque haya envejecido
+        if waiter.priority != INTERACTIVE and self._running_non_interactive >= self.slots - self.interactive_reserved:
+            return False
+        return True
+
+    def _grant(self):
+        """Asigna slots libres a los mejores waiters elegibles (llamar con el lock tomado)."""
+        now = time.monotonic()
+        while self._running_total < self.slots and self._waiting:
+            best, best_key = None, None
+            for w in self._waiting:
+                if not self._eligible(w):
+                    continue
+                priority = self._effective_priority(w, now)
+                key = (priority, w.finish_tag, w.seq)
+                if best_key is None or key < best_key:
+                    best, best_key = w, key
+            if best is None:
+                return
+            self._waiting.remove(best)
+            best.granted = True
+            self._virtual_time = max(self._virtual_time, best.finish_tag)
+            self._running_total += 1
+            self._running_by_tenant[best.user_id] = self._running_by_tenant.get(best.user_id, 0) + 1
+            if best.priority != INTERACTIVE:
+                self._running_non_interactive += 1
+            QUEUE_DEPTH.dec(priority=PRIORITY_NAMES[best.priority])
+            RUNNING.inc(priority=PRIORITY_NAMES[best.priority])
+            self._cond.notify_all()
+
+    def acquire(self, user_id: str, priority: int = INTERACTIVE) -> _Waiter:
+        with self._cond:
+            weight = self.weights.get(user_id, 1.0)
+            start_tag = max(self._virtual_time, self._last_finish.get(user_id, 0.0))
+            finish_tag = start_tag + 1.0 / weight
+            self._last_finish[user_id] = finish_tag
+            waiter = _Waiter(user_id, priority, finish_tag, next(self._seq))
+            self._waiting.append(waiter)
+            QUEUE_DEPTH.inc(priority=PRIORITY_NAMES[priority])
+            self._grant()
+            while not waiter.granted:
+                # Timeout corto: el aging puede cambiar el orden sin que nadie libere slot
+                self._cond.wait(timeout=max(0.5, self.aging_seconds / 4) if self.aging_seconds > 0 else None)
+                if not waiter.granted:
+                    self._grant()
+        WAIT_TIME.observe(time.monotonic() - waiter.enqueued_at, priority=PRIORITY_NAMES[priority])
+        return waiter
+
+    def release(self, waiter: _Waiter):
+        with self._cond:
+            self._running_total -= 1
+            self._running_by_tenant[waiter.user_id] -= 1
+            if self._running_by_tenant[waiter.user_id] == 0:
+                del self._running_by_tenant[waiter.user_id]
+            if waiter.priority != INTERACTIVE:
+                self._running_non_interactive -= 1
+            RUNNING.dec(priority=PRIORITY_NAMES[waiter.priority])
+            self._grant()
+
+    def stats(self) -> dict:
+        with self._cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for w in self._waiting:
+                depth[PRIORITY_NAMES[w.priority]] += 1
+            return {
+                "slots": self.slots,
+                "running": self._running_total,
+                "queue_depth": depth,
+                "tenants_running": dict(self._running_by_tenant)
+            }
+
+
+_dispatcher = None
+
+def get_dispatcher() -> LLMDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = LLMDispatcher(
+            slots=settings.LLM_DISPATCH_SLOTS,
+            tenant_cap=settings.LLM_TENANT_MAX_CONCURRENCY,
+            interactive_reserved=settings.LLM_INTERACTIVE_RESERVED_SLOTS,
+            aging_seconds=settings.LLM_DISPATCH_AGING_SECONDS
+        )
+    return _dispatcher
+
+@contextmanager
+def slot(user_id: str, priority: int = INTERACTIVE):
+    dispatcher = get_dispatcher()
+    waiter = dispatcher.acquire(user_id, priority)
+    try:
+        yield
+    finally:
+        dispatcher.release(waiter)
+
+async def acquire_in_thread(acquire: Callable, release: Callable):
+    """
+    Espera un acquire bloqueante en un thread sin frenar el event loop.
+    Si la corutina se cancela mientras espera (cliente desconectado), el slot
+    que el thread termine obteniendo se libera igual: no se pierden slots.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(acquire))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(lambda f: release(f.result()) if not f.cancelled() and f.exception() is None else None)
+        raise
+
+@asynccontextmanager
+async def aslot(user_id: str, priority: int = INTERACTIVE):
+    """Versión async (streaming)."""
+    dispatcher = get_dispatcher()
+    waiter = await acquire_in_thread(lambda: dispatcher.acquire(user_id, priority), dispatcher.release)
+    try:
+        yield
+    finally:
+        dispatcher.release(waiter)
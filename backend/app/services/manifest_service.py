@@ -0,0 +1,136 @@
+import json
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.db.session import SessionLocal
+from app.db.models import ChunkFingerprint, SourceManifest
+
+
+# --- IDS DETERMINÍSTICOS ---
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def vector_id(namespace: str, source_id: str, chunk_hash_value: str) -> str:
+    """Mismo namespace + fuente + contenido => mismo ID (el upsert es idempotente)."""
+    return hashlib.sha256(f"{namespace}:{source_id}:{chunk_hash_value}".encode("utf-8")).hexdigest()[:40]
+
+def metadata_hash(metadata: dict) -> str:
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# --- LECTURA ---
+
+def get_source(namespace: str, source_id: str) -> Optional[SourceManifest]:
+    db = SessionLocal()
+    try:
+        return db.query(SourceManifest).filter(
+            SourceManifest.namespace == namespace, SourceManifest.source_id == source_id
+        ).first()
+    finally:
+        db.close()
+
+def chunk_vectors(namespace: str, source_id: str) -> Dict[str, Optional[str]]:
+    """{chunk_hash: vector_id} de la fuente (vector_id None si el chunk quedó enlazado por dedup)."""
+    db = SessionLocal()
+    try:
+        rows = db.query(ChunkFingerprint.chunk_hash, ChunkFingerprint.vector_id).filter(
+            ChunkFingerprint.namespace == namespace, ChunkFingerprint.source_id == source_id
+        ).all()
+        return {h: vid for h, vid in rows}
+    finally:
+        db.close()
+
+def namespace_vector_ids(namespace: str) -> List[str]:
+    """Todos los vector_ids propios del namespace (los que existen en el índice; re-indexado)."""
+    db = SessionLocal()
+    try:
+        rows = db.query(ChunkFingerprint.vector_id).filter(
+            ChunkFingerprint.namespace == namespace, ChunkFingerprint.vector_id.isnot(None)
+        ).distinct().all()
+        return sorted(vid for (vid,) in rows)
+    finally:
+        db.close()
+
+def has_vectors(namespace: str) -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(ChunkFingerprint.id).filter(
+            ChunkFingerprint.namespace == namespace, ChunkFingerprint.vector_id.isnot(None)
+        ).first() is not None
+    finally:
+        db.close()
+
+def namespaces() -> List[str]:
+    db = SessionLocal()
+    try:
+        return [ns for (ns,) in db.query(ChunkFingerprint.namespace).distinct().all()]
+    finally:
+        db.close()
+
+
+# --- ESCRITURA ---
+
+def save_source(namespace: str, source_id: str, scope: str, metadata_hash_value: str, chunk_count: int):
+    db = SessionLocal()
+    try:
+        manifest = db.query(SourceManifest).filter(
+            SourceManifest.namespace == namespace, SourceManifest.source_id == source_id
+        ).first()
+        if not manifest:
+            manifest = SourceManifest(namespace=namespace, source_id=source_id)
+            db.add(manifest)
+        manifest.scope = scope
+        manifest.metadata_hash = metadata_hash_value
+        manifest.chunk_count = chunk_count
+        manifest.updated_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+
+def delete_chunks(namespace: str, source_id: Optional[str] = None, scope: Optional[str] = None,
+                  chunk_hashes: Optional[List[str]] = None, exclude_source: Optional[str] = None) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Borra filas del manifest. Devuelve (vector_ids que hay que borrar del índice, {vector_id: source_id}
+    de los que se conservan). Sin chunk_hashes se borra la fuente completa (y su SourceManifest).
+    Un vector que otra fuente sigue usando (enlazada por dedup) no se borra: pasa a ser de la
+    primera fuente enlazada y las demás siguen apuntándolo.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(ChunkFingerprint).filter(ChunkFingerprint.namespace == namespace)
+        sources = db.query(SourceManifest).filter(SourceManifest.namespace == namespace)
+        if source_id is not None:
+            query = query.filter(ChunkFingerprint.source_id == source_id)
+            sources = sources.filter(SourceManifest.source_id == source_id)
+        if scope is not None:
+            query = query.filter(ChunkFingerprint.scope == scope)
+            sources = sources.filter(SourceManifest.scope == scope)
+        if exclude_source is not None:
+            query = query.filter(ChunkFingerprint.source_id != exclude_source)
+            sources = sources.filter(SourceManifest.source_id != exclude_source)
+        if chunk_hashes is not None:
+            if not chunk_hashes:
+                return [], {}
+            query = query.filter(ChunkFingerprint.chunk_hash.in_(chunk_hashes))
+
+        vector_ids = [vid for (vid,) in query.with_entities(ChunkFingerprint.vector_id).all() if vid]
+        query.delete(synchronize_session=False)
+        if chunk_hashes is None:
+            sources.delete(synchronize_session=False)
+        promoted: Dict[str, str] = {}
+        if vector_ids:
+            linked = db.query(ChunkFingerprint).filter(
+                ChunkFingerprint.namespace == namespace,
+                ChunkFingerprint.duplicate_of.in_(vector_ids)
+            ).order_by(ChunkFingerprint.id).all()
+            for row in linked:
+                vid = row.duplicate_of
+                if vid not in promoted:
+                    promoted[vid] = row.source_id
+                    row.vector_id, row.duplicate_of = vid, None
+        db.commit()
+        return [vid for vid in vector_ids if vid not in promoted], promoted
+    finally:
+        db.close()
@@ -1,41 +1,122 @@
 import os
-import joblib
-import pandas as pd
-import numpy as np
-import shap
-from datetime import datetime
+import time
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 from sqlalchemy import desc
 from sqlalchemy.orm import Session
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
 
-from app.db.models import Bid, MLModelLog
+from app.db.models import Bid, MLModelLog, MLPoolMember
+from app.core import instrumentation
+from app.core.config import settings
+from app.services import model_store
+from app.services.fast_predictor import FastPredictor, compile_pipeline, max_abs_error
 
-# --- CONFIGURACIÓN DE RUTAS DINÁMICAS ---
-MODEL_DIR = "app/models_storage"
-os.makedirs(MODEL_DIR, exist_ok=True)
+# --- ARTEFACTOS ---
+# Un modelo por tenant en el model_store (versionado, escritura atómica, comprimido)
+MODEL_KIND = "bid_model"
+os.makedirs(settings.MODEL_STORE_DIR, exist_ok=True)
 
-def get_model_path(user_id: str):
-    return os.path.join(MODEL_DIR, f"model_{user_id}.pkl")
+def has_model(user_id: str) -> bool:
+    return model_store.current_version(MODEL_KIND, user_id) is not None or _migrate_legacy(user_id)
 
-def get_columns_path(user_id: str):
-    return os.path.join(MODEL_DIR, f"model_{user_id}_columns.pkl")
+def delete_model(user_id: str):
+    model_store.delete(MODEL_KIND, user_id)
+    model_store.delete(CALIBRATION_KIND, user_id)
 
+# Formato anterior: model_{user_id}.pkl + model_{user_id}_columns.pkl sueltos en el directorio
+def _legacy_paths(user_id: str):
+    return (os.path.join(settings.MODEL_STORE_DIR, f"model_{user_id}.pkl"),
+            os.path.join(settings.MODEL_STORE_DIR, f"model_{user_id}_columns.pkl"))
 
-def train_model_from_db(db: Session, user_id: str):
-    print(f"🧠 ML Service: Entrenando modelo AVANZADO (4 Atributos) para {user_id}...")
+def _migrate_legacy(user_id: str) -> bool:
+    """Pasa un .pkl del formato viejo al store (una sola vez) y borra los archivos sueltos."""
+    model_path, columns_path = _legacy_paths(user_id)
+    if not os.path.exists(model_path):
+        return False
+    import joblib
+    try:
+        pipeline = joblib.load(model_path)
+        feature_names = joblib.load(columns_path) if os.path.exists(columns_path) else None
+        model_store.save(MODEL_KIND, user_id, objects={"pipeline": pipeline},
+                         meta={"feature_names": feature_names, "migrated_from": os.path.basename(model_path)})
+    except Exception as e:
+        print(f"⚠️ No se pudo migrar {model_path}: {e}")
+        return False
+    for path in (model_path, columns_path):
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"📦 Modelo legacy de {user_id} migrado al model store")
+    return True
 
-    # 1. Obtener datos DEL USUARIO
-    bids = db.query(Bid).filter(
-        Bid.user_id == user_id,
-        Bid.status.in_(["WON", "LOST"])
-    ).all()
 
-    if len(bids) < 5:
-        return {"status": "skipped", "reason": "Insuficientes datos (<5)."}
+# pandas / sklearn / shap / joblib suman segundos de import: se cargan al entrenar/predecir,
+# no al levantar la API (warmup() los precarga en background si se quiere).
+
+def warmup():
+    import joblib, pandas, shap  # noqa: F401
+    import sklearn.ensemble, sklearn.compose, sklearn.pipeline, sklearn.preprocessing  # noqa: F401
 
+# Cache de artefactos en memoria: {(kind, owner): (version, artifact)}.
+# Se invalida cuando CURRENT apunta a otra versión (re-entrenamiento en este u otro proceso).
+_model_cache = {}
+
+def _load_artifact(kind: str, owner: str) -> Optional[dict]:
+    version = model_store.current_version(kind, owner)
+    if version is None:
+        return None
+    cached = _model_cache.get((kind, owner))
+    if cached and cached[0] == version:
+        return cached[1]
+    artifact = model_store.load(kind, owner, version)
+    if "pipeline" in artifact and settings.ML_FAST_PREDICT:
+        # Modelos viejos (sin arrays compilados): se compilan en memoria al cargar
+        try:
+            artifact["predictor"] = FastPredictor.from_artifact(artifact) or FastPredictor.from_pipeline(artifact["pipeline"])
+        except Exception as e:
+            print(f"⚠️ Predictor compilado no disponible para {kind}/{owner}: {e}")
+    _model_cache[(kind, owner)] = (version, artifact)
+    return artifact
+
+_last_touch: Dict[str, float] = {}
+TOUCH_INTERVAL_SECONDS = 3600
+
+def _load_model(user_id: str):
+    # Uso del modelo para el orden del preload (un utime por tenant y hora, no por predict)
+    now = time.time()
+    if now - _last_touch.get(user_id, 0.0) >= TOUCH_INTERVAL_SECONDS:
+        _last_touch[user_id] = now
+        model_store.touch(MODEL_KIND, user_id)
+    return _load_artifact(MODEL_KIND, user_id)
+
+def preload_models() -> int:
+    """
+    Carga los ML_PRELOAD_MAX_TENANTS modelos usados más recientemente (preload del master: los
+    workers los heredan por COW). El resto se carga lazy en el primer predict de cada worker:
+    con miles de tenants, cargar todos haría crecer sin tope el master y cada worker.
+    """
+    for name in os.listdir(settings.MODEL_STORE_DIR):
+        if name.startswith("model_") and name.endswith(".pkl") and not name.endswith("_columns.pkl"):
+            _migrate_legacy(name[len("model_"):-len(".pkl")])
+    owners = sorted(model_store.owners(MODEL_KIND), key=lambda o: model_store.last_used(MODEL_KIND, o), reverse=True)
+    count = 0
+    for owner in owners[:max(settings.ML_PRELOAD_MAX_TENANTS, 0)]:
+        try:
+            user_id = model_store.manifest(MODEL_KIND, owner)["owner"]
+            _load_artifact(MODEL_KIND, user_id)
+            count += 1
+        except Exception as e:
+            print(f"⚠️ No se pudo precargar el modelo de {owner}: {e}")
+    if len(owners) > count:
+        print(f"🧠 {count} de {len(owners)} modelos precargados (el resto se carga al primer uso)")
+    return count
+
+
+FEATURES = ["industry", "budget", "technical_score", "days_deadline"]
+CATEGORICAL_FEATURES = ['industry']
+NUMERICAL_FEATURES = ['budget', 'technical_score', 'days_deadline']
+
+def _bid_rows(bids) -> List[dict]:
     data = []
     for bid in bids:
         # --- CALCULO DE URGENCIA (Días hasta deadline) ---
@@ -55,80 +136,348 @@ def train_model_from_db(db: Session, user_id: str):
             "days_deadline": days_deadline,               # Nuevo atributo
             "result": 1 if bid.status == "WON" else 0
         })
-    
+    return data
+
+def _fit_pipeline(data: List[dict], **forest_params):
+    """Ajusta preprocesador + RandomForest. Devuelve (pipeline, feature_names)."""
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+
     df = pd.DataFrame(data)
     
     # Definimos Features (X) y Target (y)
-    X = df[["industry", "budget", "technical_score", "days_deadline"]]
+    X = df[FEATURES]
     y = df["result"]
     
     # 2. Pipeline Actualizado
-    categorical_features = ['industry']
-    numerical_features = ['budget', 'technical_score', 'days_deadline']
-
     preprocessor = ColumnTransformer(
         transformers=[
-            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), categorical_features), 
-            ('num', StandardScaler(), numerical_features)
+            ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), CATEGORICAL_FEATURES), 
+            ('num', StandardScaler(), NUMERICAL_FEATURES)
         ]
     )
     
     pipeline = Pipeline(steps=[
         ('preprocessor', preprocessor),
-        ('classifier', RandomForestClassifier(n_estimators=100, random_state=42))
+        ('classifier', RandomForestClassifier(n_estimators=100, random_state=42, **forest_params))
     ])
+    pipeline.fit(X, y)
+
+    # Nombres de columnas para SHAP (van en el manifest)
+    ohe = pipeline.named_steps['preprocessor'].named_transformers_['cat']
+    cat_names = ohe.get_feature_names_out(CATEGORICAL_FEATURES)
+    return pipeline, list(cat_names) + NUMERICAL_FEATURES
+
+def _compile(pipeline, data: List[dict]):
+    """Arrays del predictor compilado + su meta. Si no reproduce a predict_proba, no se exporta."""
+    import pandas as pd
+    try:
+        arrays, meta = compile_pipeline(pipeline)
+        error = max_abs_error(FastPredictor(arrays, meta), pipeline, pd.DataFrame(data)[FEATURES])
+    except Exception as e:
+        print(f"⚠️ No se pudo compilar el predictor: {e}")
+        return {}, None
+    if error > 1e-6:
+        print(f"⚠️ Predictor compilado descartado (difiere {error:.2e} de predict_proba)")
+        return {}, None
+    return arrays, meta
+
+
+@instrumentation.timed("ml.train", tenant_arg="user_id")
+def train_model_from_db(db: Session, user_id: str):
+    import sklearn
+
+    # 1. Obtener datos DEL USUARIO
+    bids = db.query(Bid).filter(
+        Bid.user_id == user_id,
+        Bid.status.in_(["WON", "LOST"])
+    ).all()
+
+    # Modo jerárquico: con pocos datos, modelo base compartido + calibración (sin bosque propio)
+    if _pool_serves(db, user_id, len(bids)):
+        return calibrate_tenant(db, user_id, bids)
+
+    if len(bids) < 5:
+        return {"status": "skipped", "reason": "Insuficientes datos (<5)."}
+
+    print(f"🧠 ML Service: Entrenando modelo AVANZADO (4 Atributos) para {user_id}...")
+    data = _bid_rows(bids)
     
     try:
-        pipeline.fit(X, y)
-        
-        # Guardamos
-        joblib.dump(pipeline, get_model_path(user_id))
-        
-        # Guardamos nombres de columnas para SHAP
-        ohe = pipeline.named_steps['preprocessor'].named_transformers_['cat']
-        cat_names = ohe.get_feature_names_out(categorical_features)
-        feature_names = list(cat_names) + numerical_features
-        joblib.dump(feature_names, get_columns_path(user_id))
+        pipeline, feature_names = _fit_pipeline(data)
+        arrays, fast_meta = _compile(pipeline, data)
+
+        # Guardamos: versión nueva en el store (los requests en curso siguen con la anterior)
+        version = model_store.save(MODEL_KIND, user_id, objects={"pipeline": pipeline}, arrays=arrays, meta={
+            "feature_names": feature_names,
+            "samples": len(data),
+            "sklearn": sklearn.__version__,
+            "fast_predictor": fast_meta,
+        })
+        # Con bosque propio la calibración sobre el modelo base ya no se usa
+        model_store.delete(CALIBRATION_KIND, user_id)
         
-        print(f"✅ Modelo entrenado con {len(df)} registros.")
-        return {"status": "trained", "total_samples": len(df)}
+        print(f"✅ Modelo entrenado con {len(data)} registros ({version}).")
+        return {"status": "trained", "total_samples": len(data)}
         
     except Exception as e:
         print(f"❌ Error guardando modelo: {e}")
         return {"status": "error", "reason": str(e)}
 
 
-def predict_bid(industry: str, budget: float, tech_score: float, deadline_str: str, user_id: str):
-    model_path = get_model_path(user_id)
-    columns_path = get_columns_path(user_id)
+# ==========================================
+# MODELO BASE COMPARTIDO (COLD START)
+# ==========================================
+# Los tenants que se suman (ml_pool_members) aportan sus licitaciones cerradas, sin
+# identificadores y con valores redondeados, a un bosque común. Un tenant adherido con menos
+# de ML_POOL_MIN_TENANT_SAMPLES licitaciones cerradas no entrena bosque propio: usa el base
+# con una calibración logística por tenant (2 parámetros), que se ajusta en milisegundos.
 
-    if not os.path.exists(model_path):
+POOL_KIND = "pool_model"
+POOL_OWNER = "global"
+CALIBRATION_KIND = "pool_calibration"
+
+def _round_sig(value: float, digits: int = 2) -> float:
+    if not value:
+        return 0.0
+    from math import floor, log10
+    return round(value, -int(floor(log10(abs(value)))) + digits - 1)
+
+def _anonymize(row: dict) -> dict:
+    # Sin user_id/cliente/nombres; presupuesto a 2 cifras significativas (los umbrales del bosque no revelan montos exactos)
+    return {**row, "budget": _round_sig(row["budget"]), "technical_score": round(row["technical_score"])}
+
+def is_pool_member(db: Session, user_id: str) -> bool:
+    member = db.query(MLPoolMember).filter(MLPoolMember.user_id == user_id).first()
+    return bool(member and member.opted_in)
+
+def _closed_bids(db: Session, user_id: str) -> int:
+    return db.query(Bid).filter(Bid.user_id == user_id, Bid.status.in_(["WON", "LOST"])).count()
+
+def _model_label(user_id: str) -> Optional[str]:
+    """Modelo que sirve al tenant: base + calibración, bosque propio o ninguno (50% neutro)."""
+    if settings.ML_POOL_ENABLED and model_store.current_version(CALIBRATION_KIND, user_id) is not None:
+        return "pool"
+    return "tenant" if has_model(user_id) else None
+
+def _pool_serves(db: Session, user_id: str, closed_bids: int) -> bool:
+    return (
+        settings.ML_POOL_ENABLED
+        and closed_bids < settings.ML_POOL_MIN_TENANT_SAMPLES
+        and model_store.current_version(POOL_KIND, POOL_OWNER) is not None
+        and is_pool_member(db, user_id)
+    )
+
+def train_pool_model(db: Session) -> dict:
+    """Re-entrena el modelo base con los miembros actuales y recalibra a los tenants que lo usan."""
+    import sklearn
+    members = [m.user_id for m in db.query(MLPoolMember).filter(MLPoolMember.opted_in == True).all()]  # noqa: E712
+
+    data, contributors = [], []
+    for member in members:
+        # Tope por tenant: uno grande no define el modelo de todos
+        bids = db.query(Bid).filter(Bid.user_id == member, Bid.status.in_(["WON", "LOST"])) \
+            .order_by(desc(Bid.created_at)).limit(settings.ML_POOL_MAX_ROWS_PER_TENANT).all()
+        if bids:
+            contributors.append(member)
+        data.extend(_anonymize(row) for row in _bid_rows(bids))
+    # Cuentan los tenants que aportan licitaciones cerradas, no los adheridos sin historial
+    if len(contributors) < settings.ML_POOL_MIN_TENANTS:
+        return {"status": "skipped", "reason": f"Menos de {settings.ML_POOL_MIN_TENANTS} tenants con licitaciones cerradas."}
+    if len(data) < 20 or len({row["result"] for row in data}) < 2:
+        return {"status": "skipped", "reason": "Insuficientes datos en el pool."}
+
+    # Hojas más grandes: probabilidades menos extremas (la calibración por tenant parte de acá)
+    pipeline, feature_names = _fit_pipeline(data, min_samples_leaf=5)
+    arrays, fast_meta = _compile(pipeline, data)
+    version = model_store.save(POOL_KIND, POOL_OWNER, objects={"pipeline": pipeline}, arrays=arrays, meta={
+        "feature_names": feature_names,
+        "samples": len(data),
+        "tenants": len(contributors),
+        "sklearn": sklearn.__version__,
+        "fast_predictor": fast_meta,
+    })
+    print(f"🌐 Modelo base entrenado: {len(data)} licitaciones de {len(contributors)} tenants ({version})")
+
+    # Recalibra a los que ya usan el base y calibra a los adheridos sin bosque propio que todavía
+    # no tienen calibración (se sumaron antes de que existiera el base: día uno)
+    recalibrated = 0
+    for member in members:
+        calibrated = model_store.current_version(CALIBRATION_KIND, member) is not None
+        if calibrated or (not has_model(member) and _closed_bids(db, member) < settings.ML_POOL_MIN_TENANT_SAMPLES):
+            calibrate_tenant(db, member)
+            recalibrated += 1
+    return {"status": "trained", "version": version, "total_samples": len(data), "tenants": len(contributors),
+            "recalibrated": recalibrated}
+
+def _fit_calibration(base_probs, labels, l2: float):
+    """
+    logit(p) = a * logit(p_base) + b, con penalización L2 hacia (a=1, b=0): sin datos es
+    la identidad y se aleja del base a medida que el tenant acumula licitaciones. Newton 2x2.
+    """
+    import numpy as np
+    z = np.log(np.clip(base_probs, 1e-4, 1 - 1e-4) / (1 - np.clip(base_probs, 1e-4, 1 - 1e-4)))
+    y = np.asarray(labels, dtype=float)
+    a, b = 1.0, 0.0
+    for _ in range(25):
+        p = 1 / (1 + np.exp(-(a * z + b)))
+        w = p * (1 - p)
+        grad = np.array([np.dot(p - y, z) + 2 * l2 * (a - 1), np.sum(p - y) + 2 * l2 * b])
+        hess = np.array([[np.dot(w, z * z) + 2 * l2, np.dot(w, z)], [np.dot(w, z), np.sum(w) + 2 * l2]])
+        step = np.linalg.solve(hess, grad)
+        a, b = a - step[0], b - step[1]
+        if np.abs(step).max() < 1e-6:
+            break
+    return float(a), float(b)
+
+def calibrate_tenant(db: Session, user_id: str, bids=None) -> dict:
+    import pandas as pd
+    if bids is None:
+        bids = db.query(Bid).filter(Bid.user_id == user_id, Bid.status.in_(["WON", "LOST"])).all()
+    base = _load_artifact(POOL_KIND, POOL_OWNER)
+    data = _bid_rows(bids)
+    a, b = 1.0, 0.0
+    if data:
+        base_probs = base["pipeline"].predict_proba(pd.DataFrame(data)[FEATURES])[:, 1]
+        a, b = _fit_calibration(base_probs, [row["result"] for row in data], settings.ML_POOL_CALIBRATION_L2)
+    model_store.save(CALIBRATION_KIND, user_id, meta={"a": a, "b": b, "samples": len(data), "pool_version": base["version"]})
+    print(f"🎯 Calibración de {user_id} sobre el modelo base {base['version']}: a={a:.3f} b={b:.3f} ({len(data)} licitaciones)")
+    return {"status": "calibrated", "model": "pool", "pool_version": base["version"], "total_samples": len(data)}
+
+def _apply_calibration(p, calibration: dict):
+    """Escalar o array de probabilidades del base -> probabilidades del tenant."""
+    import numpy as np
+    p = np.clip(p, 1e-4, 1 - 1e-4)
+    return 1 / (1 + np.exp(-(calibration["a"] * np.log(p / (1 - p)) + calibration["b"])))
+
+def set_pool_membership(db: Session, user_id: str, opted_in: bool) -> dict:
+    member = db.query(MLPoolMember).filter(MLPoolMember.user_id == user_id).first()
+    if not member:
+        member = MLPoolMember(user_id=user_id)
+        db.add(member)
+    member.opted_in = opted_in
+    member.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    if not opted_in:
+        # Vuelve a su bosque propio (o al 50% neutro) y sus datos salen del base en el próximo entrenamiento
+        model_store.delete(CALIBRATION_KIND, user_id)
+        refresh_pool_async(force=True)
+        return {"opted_in": False, "model": _model_label(user_id)}
+    training = train_model_from_db(db, user_id)
+    return {"opted_in": True, "model": _model_label(user_id), "training": training}
+
+def pool_status(db: Session, user_id: str) -> dict:
+    base = model_store.manifest(POOL_KIND, POOL_OWNER)
+    calibration = model_store.manifest(CALIBRATION_KIND, user_id)
+    return {
+        "enabled": settings.ML_POOL_ENABLED,
+        "opted_in": is_pool_member(db, user_id),
+        "model": _model_label(user_id),
+        "pool": {"version": base["version"], "created_at": base["created_at"], "samples": base["meta"]["samples"],
+                 "tenants": base["meta"]["tenants"]} if base else None,
+        "calibration": calibration["meta"] if calibration else None,
+    }
+
+# Re-entrenamiento periódico del base (cada proceso chequea; publicar es atómico)
+_pool_stop = threading.Event()
+_pool_thread = None
+
+def _pool_is_stale() -> bool:
+    base = model_store.manifest(POOL_KIND, POOL_OWNER)
+    if base is None:
+        return True
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(base["created_at"])
+    return age.total_seconds() >= settings.ML_POOL_RETRAIN_SECONDS
+
+def _refresh_pool(force: bool = False):
+    from app.db.session import SessionLocal
+    if not force and not _pool_is_stale():
+        return
+    db = SessionLocal()
+    try:
+        train_pool_model(db)
+    except Exception as e:
+        print(f"⚠️ Error entrenando el modelo base: {e}")
+    finally:
+        db.close()
+
+def refresh_pool_async(force: bool = False):
+    if settings.ML_POOL_ENABLED:
+        threading.Thread(target=_refresh_pool, args=(force,), name="ml-pool-train", daemon=True).start()
+
+def start_pool_refresher():
+    global _pool_thread
+    if not settings.ML_POOL_ENABLED or _pool_thread is not None:
+        return
+
+    def loop():
+        while not _pool_stop.wait(min(settings.ML_POOL_RETRAIN_SECONDS, 600)):
+            _refresh_pool()
+
+    _refresh_pool()
+    _pool_thread = threading.Thread(target=loop, name="ml-pool-refresh", daemon=True)
+    _pool_thread.start()
+
+def stop_pool_refresher():
+    _pool_stop.set()
+
+
+def _serving_model(user_id: str):
+    """(artefacto, calibración) con que se predice al tenant: base + calibración, bosque propio o (None, None)."""
+    # Tenant en modo jerárquico (calibración sobre el base) o con bosque propio
+    calibration = _load_artifact(CALIBRATION_KIND, user_id) if settings.ML_POOL_ENABLED else None
+    base = _load_artifact(POOL_KIND, POOL_OWNER) if calibration else None
+    if base is not None:
+        return base, calibration
+    if has_model(user_id):
+        return _load_model(user_id), None
+    return None, None
+
+def _days_until(deadline_str: Optional[str]) -> int:
+    # Calculamos días desde HOY hasta el Deadline
+    days_deadline = 30 # Default
+    if deadline_str:
+        try:
+            dt_deadline = datetime.strptime(deadline_str, "%Y-%m-%d")
+            delta = (dt_deadline - datetime.now()).days
+            days_deadline = max(0, delta)
+        except:
+            pass
+    return days_deadline
+
+
+@instrumentation.timed("ml.predict", tenant_arg="user_id")
+def predict_bid(industry: str, budget: float, tech_score: float, deadline_str: str, user_id: str):
+    artifact, calibration = _serving_model(user_id)
+    if artifact is None:
         return {"probability": 50.0, "explanation": []}
 
+    import numpy as np
+
     try:
-        pipeline = joblib.load(model_path)
-        
-        # Calculamos días desde HOY hasta el Deadline
-        days_deadline = 30 # Default
-        if deadline_str:
-            try:
-                dt_deadline = datetime.strptime(deadline_str, "%Y-%m-%d")
-                delta = (dt_deadline - datetime.now()).days
-                days_deadline = max(0, delta)
-            except:
-                pass
+        pipeline, feature_names = artifact["pipeline"], artifact["meta"].get("feature_names")
+        predictor = artifact.get("predictor")
+        days_deadline = _days_until(deadline_str)
 
-        # DataFrame de entrada con 4 columnas
-        input_df = pd.DataFrame([{
-            "industry": industry, 
-            "budget": budget,
-            "technical_score": tech_score,
-            "days_deadline": days_deadline
-        }])
-        
-        # 1. Probabilidad
-        probs = pipeline.predict_proba(input_df)
-        win_prob = probs[0][1] 
+        # 1. Probabilidad: predictor compilado (numpy) o, si no hay, el pipeline con un DataFrame
+        if predictor is not None:
+            win_prob = predictor.predict_one(industry, budget, tech_score, days_deadline)
+        else:
+            import pandas as pd
+            # DataFrame de entrada con 4 columnas
+            input_df = pd.DataFrame([{
+                "industry": industry, 
+                "budget": budget,
+                "technical_score": tech_score,
+                "days_deadline": days_deadline
+            }])
+            probs = pipeline.predict_proba(input_df)
+            win_prob = probs[0][1] 
+        if calibration is not None:
+            win_prob = float(_apply_calibration(win_prob, calibration["meta"]))
 
         # 2. Explicación (SHAP)
         explanation = []
@@ -136,15 +485,18 @@ def predict_bid(industry: str, budget: float, tech_score: float, deadline_str: s
             preprocessor = pipeline.named_steps['preprocessor']
             classifier = pipeline.named_steps['classifier']
             
-            X_transformed = preprocessor.transform(input_df)
-            
-            if os.path.exists(columns_path):
-                feature_names = joblib.load(columns_path)
+            if predictor is not None:
+                X_transformed = predictor.transform([industry], [budget, tech_score, days_deadline])
             else:
+                X_transformed = preprocessor.transform(input_df)
+            
+            if not feature_names:
                 feature_names = [f"Feature {i}" for i in range(X_transformed.shape[1])]
 
-            explainer = shap.TreeExplainer(classifier)
-            shap_values = explainer.shap_values(X_transformed)
+            import shap
+            with instrumentation.stage("ml.shap"):
+                explainer = shap.TreeExplainer(classifier)
+                shap_values = explainer.shap_values(X_transformed)
             
             if isinstance(shap_values, list):
                 shap_val = shap_values[1][0] 
@@ -177,9 +529,101 @@ def predict_bid(industry: str, budget: float, tech_score: float, deadline_str: s
 
         return {
             "probability": round(win_prob * 100, 1), # Ya multiplicado por 100
-            "explanation": explanation
+            "explanation": explanation,
+            "model": "pool" if calibration is not None else "tenant"
         }
 
     except Exception as e:
         print(f"Error prediciendo: {e}")
-        return {"probability": 50.0, "explanation": []}
\ No newline at end of file
+        return {"probability": 50.0, "explanation": []}
+
+
+# ==========================================
+# WHAT-IF: GRILLA DE PROBABILIDADES
+# ==========================================
+# Barrido de 1 o 2 variables alrededor de una licitación: toda la grilla sale de un solo
+# batch contra el modelo (no N llamadas a predict_bid).
+
+WHATIF_VARIABLES = NUMERICAL_FEATURES
+# Hasta acá el predictor compilado (numpy) es más rápido; con más puntos gana el recorrido
+# en Cython de sklearn (~55 ms para 10k puntos vs ~600 ms)
+FAST_BATCH_MAX_POINTS = 256
+
+def _axis_size(axis: Dict) -> int:
+    """Puntos del eje, validado sin construirlo (el tope se chequea antes de reservar memoria)."""
+    if axis.get("values"):
+        return len(axis["values"])
+    if axis.get("start") is None or axis.get("stop") is None:
+        raise ValueError(f"Eje '{axis.get('variable')}': indicar 'values' o 'start' + 'stop'.")
+    steps = int(axis.get("steps") or 50)
+    if steps < 2:
+        raise ValueError("'steps' debe ser al menos 2.")
+    return steps
+
+def _axis_values(axis: Dict) -> List[float]:
+    if axis.get("values"):
+        return [float(v) for v in axis["values"]]
+    import numpy as np
+    return np.linspace(float(axis["start"]), float(axis["stop"]), int(axis.get("steps") or 50)).tolist()
+
+@instrumentation.timed("ml.what_if", tenant_arg="user_id")
+def predict_grid(industry: str, budget: float, tech_score: float, deadline_str: Optional[str], user_id: str,
+                 axes: List[Dict], days_deadline: Optional[int] = None) -> dict:
+    """
+    Probabilidad de ganar (0-100) sobre una grilla. axes: 1 o 2 dicts {variable, values | start, stop, steps}
+    con variable en budget / technical_score / days_deadline; el resto queda fijo en los valores de la licitación.
+    Devuelve una curva (1 eje) o una superficie [i][j] (eje 0 x eje 1).
+    """
+    import numpy as np
+
+    if not 1 <= len(axes) <= 2:
+        raise ValueError("Se admiten 1 o 2 ejes.")
+    names = [axis.get("variable") for axis in axes]
+    unknown = [n for n in names if n not in WHATIF_VARIABLES]
+    if unknown or len(set(names)) != len(names):
+        raise ValueError(f"Variables válidas (sin repetir): {', '.join(WHATIF_VARIABLES)}.")
+    points = 1
+    for axis in axes:
+        points *= _axis_size(axis)
+    if points > settings.ML_WHATIF_MAX_POINTS:
+        raise ValueError(f"La grilla tiene {points} puntos (máximo {settings.ML_WHATIF_MAX_POINTS}).")
+    grids = [_axis_values(axis) for axis in axes]
+
+    fixed = {
+        "budget": float(budget),
+        "technical_score": float(tech_score),
+        "days_deadline": days_deadline if days_deadline is not None else _days_until(deadline_str),
+    }
+    mesh = np.meshgrid(*[np.asarray(g, dtype=np.float64) for g in grids], indexing="ij")
+    numeric = np.empty((points, len(NUMERICAL_FEATURES)), dtype=np.float64)
+    for j, name in enumerate(NUMERICAL_FEATURES):
+        numeric[:, j] = fixed[name]
+    for name, values in zip(names, mesh):
+        numeric[:, NUMERICAL_FEATURES.index(name)] = values.ravel()
+    if "days_deadline" in names:
+        # Igual que al entrenar: deadline vencido = 0 días
+        numeric[:, NUMERICAL_FEATURES.index("days_deadline")] = np.maximum(numeric[:, NUMERICAL_FEATURES.index("days_deadline")], 0)
+
+    artifact, calibration = _serving_model(user_id)
+    if artifact is None:
+        probs = np.full(points, 0.5)
+    else:
+        predictor = artifact.get("predictor")
+        if predictor is not None and points <= FAST_BATCH_MAX_POINTS:
+            probs = predictor.predict_many([industry] * points, numeric)
+        else:
+            import pandas as pd
+            df = pd.DataFrame(numeric, columns=NUMERICAL_FEATURES)
+            df.insert(0, "industry", industry)
+            probs = artifact["pipeline"].predict_proba(df[FEATURES])[:, 1]
+        if calibration is not None:
+            probs = _apply_calibration(probs, calibration["meta"])
+
+    return {
+        "model": None if artifact is None else ("pool" if calibration is not None else "tenant"),
+        "industry": industry,
+        "fixed": {k: v for k, v in fixed.items() if k not in names},
+        "axes": [{"variable": name, "values": [round(v, 4) for v in grid]} for name, grid in zip(names, grids)],
+        "points": points,
+        "probability": np.round(probs * 100, 1).reshape([len(g) for g in grids]).tolist(),
+    }
@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+# Artefactos de modelos versionados en disco:
+#   <MODEL_STORE_DIR>/<kind>/<owner>/v000007/manifest.json   (metadata + lista de archivos)
+#                                           /<name>.joblib    (objetos, comprimidos con zlib)
+#                                           /<name>.npy       (arrays, se cargan con mmap: páginas compartidas entre procesos)
+#                                   /CURRENT                  (nombre de la versión activa)
+#                                   /LAST_USED                (vacío: su mtime es el último uso, orden del preload)
+# Publicar es atómico: la versión se arma en un directorio temporal, se renombra y recién
+# después se reemplaza CURRENT (os.replace). Un lector nunca ve un modelo a medio escribir.
+
+VERSION_RE = re.compile(r"^v(\d{6})$")
+
+
+def _safe(owner: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", owner)
+
+def owner_dir(kind: str, owner: str) -> str:
+    return os.path.join(settings.MODEL_STORE_DIR, kind, _safe(owner))
+
+def _versions(directory: str) -> List[int]:
+    try:
+        return sorted(int(m.group(1)) for m in (VERSION_RE.match(n) for n in os.listdir(directory)) if m)
+    except FileNotFoundError:
+        return []
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+def _write_atomic(path: str, data: str):
+    tmp = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+    with open(tmp, "w") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def current_version(kind: str, owner: str) -> Optional[str]:
+    """Versión activa ('v000007') o None si el owner no tiene modelo."""
+    try:
+        with open(os.path.join(owner_dir(kind, owner), "CURRENT")) as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def owners(kind: str) -> List[str]:
+    """Owners (directorios) con una versión publicada."""
+    base = os.path.join(settings.MODEL_STORE_DIR, kind)
+    try:
+        names = os.listdir(base)
+    except FileNotFoundError:
+        return []
+    return [n for n in names if os.path.exists(os.path.join(base, n, "CURRENT"))]
+
+
+def save(kind: str, owner: str, objects: Optional[Dict] = None, arrays: Optional[Dict] = None,
+         meta: Optional[Dict] = None) -> str:
+    """
+    Publica una versión nueva con objetos (joblib) y arrays (.npy) y la deja activa.
+    Aplica la retención (MODEL_STORE_KEEP_VERSIONS). Devuelve el nombre de la versión.
+    """
+    import joblib
+    import numpy as np
+
+    base = owner_dir(kind, owner)
+    os.makedirs(base, exist_ok=True)
+    tmp = os.path.join(base, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp)
+    compress = settings.MODEL_STORE_COMPRESS
+    files = {}
+    try:
+        for name, obj in (objects or {}).items():
+            path = os.path.join(tmp, f"{name}.joblib")
+            joblib.dump(obj, path, compress=("zlib", compress) if compress else 0)
+            files[name] = {"file": f"{name}.joblib", "format": "joblib", "compress": compress, "bytes": os.path.getsize(path)}
+        for name, array in (arrays or {}).items():
+            path = os.path.join(tmp, f"{name}.npy")
+            np.save(path, np.ascontiguousarray(array))
+            files[name] = {"file": f"{name}.npy", "format": "npy", "dtype": str(array.dtype),
+                           "shape": list(array.shape), "bytes": os.path.getsize(path)}
+        for info in files.values():
+            with open(os.path.join(tmp, info["file"]), "rb") as fh:
+                os.fsync(fh.fileno())
+
+        # Número de versión: siguiente al mayor. Si otro proceso publica a la vez, el rename
+        # choca con el directorio existente y probamos con el siguiente.
+        for _ in range(20):
+            version_number = (_versions(base) or [0])[-1] + 1
+            version = f"v{version_number:06d}"
+            manifest = {
+                "kind": kind, "owner": owner, "version": version,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "files": files, "meta": meta or {},
+            }
+            with open(os.path.join(tmp, "manifest.json"), "w") as fh:
+                json.dump(manifest, fh, indent=2)
+                fh.flush()
+                os.fsync(fh.fileno())
+            try:
+                os.rename(tmp, os.path.join(base, version))
+                break
+            except OSError:
+                time.sleep(0.01)
+        else:
+            raise RuntimeError(f"No se pudo publicar el modelo {kind}/{owner}")
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    _fsync_dir(base)
+    _write_atomic(os.path.join(base, "CURRENT"), version)
+    prune(kind, owner)
+    return version
+
+
+def manifest(kind: str, owner: str, version: Optional[str] = None) -> Optional[dict]:
+    version = version or current_version(kind, owner)
+    if not version:
+        return None
+    with open(os.path.join(owner_dir(kind, owner), version, "manifest.json")) as fh:
+        return json.load(fh)
+
+def load(kind: str, owner: str, version: Optional[str] = None) -> Optional[dict]:
+    """
+    Carga una versión (la activa por defecto): {"version", "meta", <name>: objeto/array}.
+    Los .npy y los joblib sin comprimir se mapean con mmap_mode="r" (solo lectura, compartidos).
+    """
+    import joblib
+    import numpy as np
+
+    data = manifest(kind, owner, version)
+    if data is None:
+        return None
+    directory = os.path.join(owner_dir(kind, owner), data["version"])
+    loaded = {"version": data["version"], "meta": data.get("meta", {})}
+    for name, info in data["files"].items():
+        path = os.path.join(directory, info["file"])
+        if info["format"] == "npy":
+            loaded[name] = np.load(path, mmap_mode="r")
+        else:
+            loaded[name] = joblib.load(path, mmap_mode=None if info.get("compress") else "r")
+    return loaded
+
+
+def prune(kind: str, owner: str, keep: Optional[int] = None) -> int:
+    """Borra versiones viejas (conserva las `keep` más nuevas y siempre la activa) y temporales huérfanos."""
+    keep = max(1, keep if keep is not None else settings.MODEL_STORE_KEEP_VERSIONS)
+    base = owner_dir(kind, owner)
+    active = current_version(kind, owner)
+    removed = 0
+    for number in _versions(base)[:-keep]:
+        version = f"v{number:06d}"
+        if version != active:
+            # Un proceso que ya lo tenía mapeado sigue leyendo: el inode vive hasta que lo suelte
+            shutil.rmtree(os.path.join(base, version), ignore_errors=True)
+            removed += 1
+    try:
+        for name in os.listdir(base):
+            path = os.path.join(base, name)
+            # Temporales de publicaciones que murieron a mitad de camino (más de una hora)
+            if name.startswith(".tmp-") and time.time() - os.path.getmtime(path) > 3600:
+                shutil.rmtree(path, ignore_errors=True)
+    except FileNotFoundError:
+        pass
+    return removed
+
+
+def touch(kind: str, owner: str):
+    """Registra el uso del artefacto (mtime de LAST_USED)."""
+    path = os.path.join(owner_dir(kind, owner), "LAST_USED")
+    try:
+        with open(path, "a"):
+            os.utime(path, None)
+    except OSError:
+        pass
+
+def last_used(kind: str, owner: str) -> float:
+    """Último uso o publicación (timestamp; 0 si no hay registro)."""
+    base = owner_dir(kind, owner)
+    times = []
+    for name in ("LAST_USED", "CURRENT"):
+        try:
+            times.append(os.path.getmtime(os.path.join(base, name)))
+        except OSError:
+            pass
+    return max(times, default=0.0)
+
+def delete(kind: str, owner: str):
+    """Borra todas las versiones de un owner (ej: purge del tenant)."""
+    shutil.rmtree(owner_dir(kind, owner), ignore_errors=True)
+
+
+def disk_usage(kind: str) -> dict:
+    total, count = 0, 0
+    for root, _, names in os.walk(os.path.join(settings.MODEL_STORE_DIR, kind)):
+        for name in names:
+            total += os.path.getsize(os.path.join(root, name))
+            count += 1
+    return {"bytes": total, "files": count}
@@ -1,90 +1,50 @@
 import os
 import json
 import time
-import requests
+import asyncio
+from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
 
-# Interfaces
-from langchain_core.embeddings import Embeddings 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_pinecone import PineconeVectorStore
-from langchain.prompts import PromptTemplate
-from langchain.schema import StrOutputParser
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
+import numpy as np
+
+# Interfaces: langchain, Pinecone y Gemini se importan dentro de los cargadores
+# (importar este módulo tiene que ser barato: arranque rápido y workers livianos)
 
 # DB
 from app.db.session import SessionLocal
-from app.db.models import AppSettings, TokenUsageLog
-from pinecone import Pinecone
+from app.db.models import AppSettings, Bid, TokenUsageLog, EmbeddingIndexState, IngestionJob
+from app.services import dedup_service, manifest_service, llm_dispatch, embedding_profile, vector_writer
+from app.utils import key_data_extractor
 from app.core.config import settings
+from app.core import instrumentation
+from app.core.rate_limit import get_limiter, is_throttle_error, QUEUE_WAIT, THROTTLE_EVENTS
 
 # --- VARIABLES ---
 _embeddings = None
 _vector_store = None
 _pc_index = None
+_pc_indexes = {} # Índices de otros perfiles (origen de un re-indexado)
+_vector_stores = {} # (perfil, índice) -> vector store de un perfil anterior
 _llm = None
+_splitter = None
 
 index_name = "autobid-index"
 
-class GoogleRawRESTEmbeddings(Embeddings):
-
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.model_name = "models/gemini-embedding-001"
-        self.api_url = (
-            f"https://generativelanguage.googleapis.com/v1beta/"
-            f"{self.model_name}:embedContent"
-        )
-
-    def _embed_single(self, text: str) -> List[float]:
-        clean_text = text.replace("\n", " ").strip()
-
-        payload = {
-            "content": {
-                "parts": [{"text": clean_text}]
-            }
-        }
-
-        for attempt in range(3):
-            try:
-                response = requests.post(
-                    self.api_url,
-                    headers={
-                        "Content-Type": "application/json",
-                        "x-goog-api-key": self.api_key,
-                    },
-                    json=payload,
-                    timeout=20,
-                )
-
-                if response.status_code != 200:
-                    if response.status_code == 429:
-                        time.sleep(2)
-                        continue
-                    raise RuntimeError(response.text)
-
-                data = response.json()
-                return data["embedding"]["values"]
-
-            except Exception as e:
-                print(f"⚠️ Retry {attempt+1}: {e}")
-                time.sleep(1)
+def current_index_name() -> str:
+    """Índice del perfil de embeddings activo (uno por dimensión: autobid-index, autobid-index-768...)."""
+    return embedding_profile.current().index_name(index_name)
 
-        raise RuntimeError("Fallo total gemini-embedding-001.")
+# Segundos sin tokens antes de mandar un heartbeat SSE (evita cortes de proxies)
+SSE_HEARTBEAT_SECONDS = 15
+# Chunks del LLM que se pueden acumular sin que el cliente los consuma (backpressure)
+STREAM_QUEUE_SIZE = 32
 
-    # 👇 ESTO FALTABA
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        print(f"⚡ Procesando {len(texts)} textos...")
-        return [self._embed_single(t) for t in texts]
-
-    def embed_query(self, text: str) -> List[float]:
-        return self._embed_single(text)
 # --- CARGADORES ---
 
 def get_embeddings():
     global _embeddings
     if _embeddings is None:
+        from app.services.embeddings import GoogleRawRESTEmbeddings
         key = settings.GOOGLE_API_KEY
         if not key: print("❌ FALTA API KEY")
         
@@ -95,8 +55,9 @@ def get_embeddings():
 def get_vector_store():
     global _vector_store
     if _vector_store is None:
+        from langchain_pinecone import PineconeVectorStore
         _vector_store = PineconeVectorStore(
-            index_name=index_name,
+            index_name=current_index_name(),
             embedding=get_embeddings(), 
             pinecone_api_key=settings.PINECONE_API_KEY
         )
@@ -105,42 +66,366 @@ def get_vector_store():
 def get_pc_index():
     global _pc_index
     if _pc_index is None:
+        from pinecone import Pinecone
         pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-        _pc_index = pc.Index(index_name)
+        _pc_index = pc.Index(current_index_name())
     return _pc_index
 
+def _store_for(profile_id: str, name: str):
+    """Vector store de un perfil/índice: el activo o uno anterior (namespaces que todavía no se re-indexaron)."""
+    if (profile_id, name) == (embedding_profile.current().id, current_index_name()):
+        return get_vector_store()
+    if (profile_id, name) not in _vector_stores:
+        from langchain_pinecone import PineconeVectorStore
+        from app.services.embeddings import GoogleRawRESTEmbeddings
+        _vector_stores[(profile_id, name)] = PineconeVectorStore(
+            index_name=name,
+            embedding=GoogleRawRESTEmbeddings(api_key=settings.GOOGLE_API_KEY, profile=embedding_profile.Profile.from_id(profile_id)),
+            pinecone_api_key=settings.PINECONE_API_KEY
+        )
+    return _vector_stores[(profile_id, name)]
+
+def _open_index(name: str):
+    if name == current_index_name():
+        return get_pc_index()
+    if name not in _pc_indexes:
+        from pinecone import Pinecone
+        _pc_indexes[name] = Pinecone(api_key=settings.PINECONE_API_KEY).Index(name)
+    return _pc_indexes[name]
+
+def _get_splitter():
+    global _splitter
+    if _splitter is None:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        _splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    return _splitter
+
 def get_llm():
     global _llm
     if _llm is None:
+        from langchain_google_genai import ChatGoogleGenerativeAI
         _llm = ChatGoogleGenerativeAI(
             model="gemini-2.5-flash", 
             temperature=0.3,
-            google_api_key=settings.GOOGLE_API_KEY
+            google_api_key=settings.GOOGLE_API_KEY,
+            max_retries=1 # Los reintentos los maneja _invoke_llm (evita tormentas de retries)
         )
     return _llm
 
+def warmup(clients: bool = True):
+    """
+    Importa langchain/Gemini/Pinecone y crea los clientes antes del primer request.
+    clients=False solo importa (preload antes del fork: las conexiones no se comparten entre procesos).
+    """
+    _get_splitter()
+    if not clients:
+        import langchain_pinecone, langchain_google_genai, pinecone  # noqa: F401
+        import app.services.embeddings  # noqa: F401
+        return
+    get_embeddings()
+    get_llm()
+    get_vector_store()
+
+def _llm_limiter():
+    return get_limiter("llm", settings.GOOGLE_API_KEY, get_llm().model)
+
+def _invoke_llm(prompt: str, user_id: str, priority: int = llm_dispatch.INTERACTIVE):
+    """
+    llm.invoke pasando por el dispatcher (prioridad + fair queuing entre tenants)
+    y luego por el rate limit compartido (AIMD + retry con backoff).
+    """
+    llm = get_llm()
+    with llm_dispatch.slot(user_id, priority):
+        with instrumentation.stage("llm.invoke", tenant=user_id):
+            return _llm_limiter().call(lambda: llm.invoke(prompt))
+
 # --- UTILS Y NEGOCIO ---
 
 def _log_token_usage(user_id: str, model_name: str, response: Any):
     try:
-        token_info = response.response_metadata.get("token_usage", {}) or response.response_metadata.get("usage_metadata", {})
-        if token_info.get("total_tokens", 0) > 0:
+        # Streaming: los chunks agregados traen 'usage_metadata' (input/output/total)
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("total_tokens", 0) > 0:
+            total = usage.get("total_tokens")
+            input_tokens = usage.get("input_tokens", 0)
+            output_tokens = usage.get("output_tokens", 0)
+        else:
+            token_info = response.response_metadata.get("token_usage", {}) or response.response_metadata.get("usage_metadata", {})
+            total = token_info.get("total_tokens", 0)
+            input_tokens = token_info.get("prompt_token_count")
+            output_tokens = token_info.get("candidates_token_count")
+        if total > 0:
             db = SessionLocal()
             db.add(TokenUsageLog(
-                user_id=user_id, model_name=model_name, total_tokens=token_info.get("total_tokens"),
-                input_tokens=token_info.get("prompt_token_count"),
-                output_tokens=token_info.get("candidates_token_count")
+                user_id=user_id, model_name=model_name, total_tokens=total,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens
             ))
             db.commit()
             db.close()
     except: pass
 
-def clear_active_tender(namespace: str):
-    try: get_pc_index().delete(filter={"category": "active_tender"}, namespace=namespace)
-    except: pass
+# Pinecone acepta hasta 1000 IDs por delete; para upserts recomienda lotes de ~100 vectores
+DELETE_BATCH_SIZE = 1000
+UPSERT_BATCH_SIZE = 100
 
-def ingest_text(text: str, metadata: dict, namespace: str):
-    if not text: return {"error": "Vacío"}
+# Las escrituras al índice pasan por el write-behind (vector_writer): se encolan y se aplican
+# en tandas por namespace. Las lecturas del manifest de una fuente esperan sus escrituras pendientes.
+
+def _delete_vector_ids(ids: List[str], namespace: str, source_id: Optional[str] = None,
+                       promoted: Optional[Dict[str, str]] = None):
+    vector_writer.delete(namespace, ids, source_id)
+    if promoted:
+        # Vectores que otra fuente sigue usando (dedup): se quedan, con el source_id del nuevo dueño.
+        # Se aplica ya: un delete por filtro de la fuente vieja no tiene que alcanzarlos
+        for vid, owner in promoted.items():
+            vector_writer.update_metadata(namespace, [vid], {"source_id": owner}, owner)
+        vector_writer.barrier(namespace)
+
+# --- PERFIL DE EMBEDDINGS Y RE-INDEXADO ---
+# Si el perfil activo cambió, el namespace se re-indexa en un job (REINDEX). Mientras tanto las
+# lecturas salen del índice/perfil con que quedó indexado y las escrituras van a los dos.
+
+# namespace -> id del perfil con el que ya se verificó en este proceso (evita una query por request)
+_ready_namespaces: Dict[str, str] = {}
+# namespace -> cuándo se encoló (o se vio encolado) su re-indexado desde este proceso
+_reindex_scheduled: Dict[str, float] = {}
+REINDEX_RECHECK_SECONDS = 60
+
+def _index_state(namespace: str) -> tuple:
+    """(perfil, índice) con el que está indexado el namespace. Sin fila: perfil completo en el índice base."""
+    db = SessionLocal()
+    try:
+        row = db.query(EmbeddingIndexState).filter(EmbeddingIndexState.namespace == namespace).first()
+        return (row.profile, row.index_name) if row else (embedding_profile.LEGACY_PROFILE, index_name)
+    finally:
+        db.close()
+
+def _save_index_state(namespace: str, profile_id: str, index: str, vector_count: int):
+    db = SessionLocal()
+    try:
+        row = db.query(EmbeddingIndexState).filter(EmbeddingIndexState.namespace == namespace).first()
+        if not row:
+            row = EmbeddingIndexState(namespace=namespace)
+            db.add(row)
+        row.profile = profile_id
+        row.index_name = index
+        row.vector_count = vector_count
+        row.updated_at = datetime.now(timezone.utc)
+        db.commit()
+    finally:
+        db.close()
+
+def _fetch_vectors(index, ids: List[str], namespace: str) -> List[tuple]:
+    """[(id, values, metadata)] en el orden de ids (los que no estén en el índice se omiten)."""
+    response = index.fetch(ids=ids, namespace=namespace)
+    found = response["vectors"] if isinstance(response, dict) else response.vectors
+    records = []
+    for vid in ids:
+        vector = found.get(vid)
+        if vector is None:
+            continue
+        if isinstance(vector, dict):
+            records.append((vid, vector["values"], vector.get("metadata") or {}))
+        else:
+            records.append((vid, vector.values, vector.metadata or {}))
+    return records
+
+def serving_state(namespace: str) -> tuple:
+    """(perfil, índice) del que se lee el namespace: el activo o, hasta que termine su re-indexado, el anterior."""
+    profile_id = embedding_profile.current().id
+    if _ready_namespaces.get(namespace) == profile_id:
+        return profile_id, current_index_name()
+    state = _index_state(namespace)
+    if state != (profile_id, current_index_name()) and not manifest_service.has_vectors(namespace):
+        # Namespace nuevo o vacío: no hay nada que copiar, arranca directo en el perfil activo
+        _save_index_state(namespace, profile_id, current_index_name(), 0)
+        state = (profile_id, current_index_name())
+    if state == (profile_id, current_index_name()):
+        _ready_namespaces[namespace] = profile_id
+    return state
+
+def serving_store(namespace: str):
+    return _store_for(*serving_state(namespace))
+
+def write_targets(namespace: str) -> List[tuple]:
+    """
+    [(índice, vector store)] donde aplicar las escrituras del namespace. Durante el re-indexado van al
+    activo y al anterior: el anterior sigue sirviendo las lecturas y el copiado no pierde nada.
+    """
+    targets = [(get_pc_index(), get_vector_store())]
+    state_profile, state_index = serving_state(namespace)
+    # Mismo índice (p. ej. otra versión de la proyección): el re-indexado lo reescribe en el lugar
+    if state_index != current_index_name():
+        targets.append((_open_index(state_index), _store_for(state_profile, state_index)))
+    return targets
+
+def _schedule_reindex(namespace: str):
+    """Encola el job REINDEX del namespace, salvo que ya haya uno en curso (de este u otro proceso)."""
+    from app.services import ingest_service, job_queue
+    db = SessionLocal()
+    try:
+        running = db.query(IngestionJob).filter(
+            IngestionJob.user_id == namespace, IngestionJob.kind == ingest_service.REINDEX,
+            IngestionJob.status.in_(["QUEUED", "RUNNING"])
+        ).first()
+        if running is None:
+            job = job_queue.enqueue(db, namespace, ingest_service.REINDEX, {})
+            print(f"🔁 Re-indexado de {namespace} encolado ({job.id}): se sirve del índice anterior hasta que termine")
+    finally:
+        db.close()
+
+def fit_embedding_projection() -> dict:
+    """
+    Ajusta la proyección PCA (EMBEDDING_REDUCTION=pca) con hasta EMBEDDING_PCA_SAMPLE_SIZE vectores
+    completos leídos de los namespaces que siguen en el perfil completo: no hace llamadas de embedding.
+    """
+    profile = embedding_profile.configured()
+    sample = []
+    for namespace in manifest_service.namespaces():
+        state_profile, state_index = _index_state(namespace)
+        if state_profile != embedding_profile.LEGACY_PROFILE:
+            continue
+        ids = manifest_service.namespace_vector_ids(namespace)
+        source = _open_index(state_index)
+        for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+            sample.extend(values for _, values, _ in _fetch_vectors(source, ids[i:i + UPSERT_BATCH_SIZE], namespace))
+            if len(sample) >= settings.EMBEDDING_PCA_SAMPLE_SIZE:
+                break
+        if len(sample) >= settings.EMBEDDING_PCA_SAMPLE_SIZE:
+            break
+    if len(sample) < profile.dim:
+        raise ValueError(f"Se necesitan al menos {profile.dim} vectores de {embedding_profile.FULL_DIM} dimensiones "
+                         f"para ajustar la proyección pca (hay {len(sample)})")
+    return embedding_profile.save_projection(np.asarray(sample, dtype=np.float32), profile.dim)
+
+@instrumentation.timed("vector.reindex", tenant_arg="namespace")
+def reindex_namespace(namespace: str) -> dict:
+    """
+    Pasa los vectores del namespace (los del manifest) al perfil de embeddings activo.
+    Desde el perfil completo a pca se proyectan los vectores guardados; en cualquier otro caso se
+    re-vectoriza el texto que guarda la metadata. Si cambió el índice, se vacía el namespace en el viejo.
+    Corre en el job REINDEX: mientras copia, el namespace se sigue sirviendo desde el perfil anterior.
+    """
+    configured = embedding_profile.configured()
+    if configured.reduction == "pca" and configured.reduced and embedding_profile.load_projection() is None:
+        try:
+            fit_embedding_projection()
+        except ValueError as e:
+            # current() sigue en api con las mismas dimensiones; se reintenta en el próximo re-indexado
+            print(f"⚠️ {e}: se re-indexa con {embedding_profile.current().id}")
+    profile = embedding_profile.current()
+    local_projection = profile.reduction == "pca" and profile.reduced
+    target_profile, target_index = profile.id, current_index_name()
+    source_profile, source_index = _index_state(namespace)
+    if (source_profile, source_index) == (target_profile, target_index):
+        _ready_namespaces[namespace] = target_profile
+        return {"status": "up_to_date", "profile": target_profile, "index": target_index}
+
+    source, target = _open_index(source_index), get_pc_index()
+    projection = embedding_profile.load_projection() if local_projection and source_profile == embedding_profile.LEGACY_PROFILE else None
+    start = time.perf_counter()
+    counts = {"moved": 0, "reembedded": 0, "skipped": 0}
+
+    def copy(ids: List[str]):
+        for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+            records = _fetch_vectors(source, ids[i:i + UPSERT_BATCH_SIZE], namespace)
+            if projection is not None:
+                vectors = embedding_profile.project(np.asarray([values for _, values, _ in records], dtype=np.float32), projection).tolist() if records else []
+            else:
+                # Sin texto en la metadata no se puede re-vectorizar: el próximo upload de esa fuente lo repone
+                counts["skipped"] += sum(1 for _, _, meta in records if not meta.get("text"))
+                records = [r for r in records if r[2].get("text")]
+                vectors = get_embeddings().embed_documents([meta["text"] for _, _, meta in records]) if records else []
+                counts["reembedded"] += len(records)
+            if records:
+                target.upsert(vectors=[(vid, vector, meta) for (vid, _, meta), vector in zip(records, vectors)], namespace=namespace)
+                counts["moved"] += len(records)
+
+    vector_writer.barrier(namespace)
+    ids = manifest_service.namespace_vector_ids(namespace)
+    copy(ids)
+    # Lo que entró y salió del manifest mientras se copiaba (las escrituras ya fueron a los dos índices;
+    # esto cubre las que resolvieron el destino antes de que empezara el re-indexado)
+    vector_writer.barrier(namespace)
+    latest = manifest_service.namespace_vector_ids(namespace)
+    copied, present = set(ids), set(latest)
+    copy([vid for vid in latest if vid not in copied])
+    stale = [vid for vid in ids if vid not in present]
+    for i in range(0, len(stale), DELETE_BATCH_SIZE):
+        target.delete(ids=stale[i:i + DELETE_BATCH_SIZE], namespace=namespace)
+
+    _save_index_state(namespace, target_profile, target_index, len(latest))
+    _ready_namespaces[namespace] = target_profile
+    if source_index != target_index:
+        try:
+            source.delete(delete_all=True, namespace=namespace)
+        except Exception as e:
+            print(f"⚠️ No se pudo vaciar {namespace} en {source_index}: {e}")
+
+    moved, reembedded = counts["moved"], counts["reembedded"]
+    print(f"🔁 Namespace {namespace} re-indexado {source_profile} -> {target_profile}: {moved} vectores "
+          f"({reembedded} re-vectorizados) en {time.perf_counter() - start:.1f}s")
+    return {
+        "status": "reindexed", "from": {"profile": source_profile, "index": source_index},
+        "to": {"profile": target_profile, "index": target_index},
+        "vectors": moved, "reembedded": reembedded, "projected": moved - reembedded, "skipped": counts["skipped"],
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+def ensure_namespace(namespace: str):
+    """
+    Antes de leer/escribir vectores: si el namespace está indexado con otro perfil, encola su
+    re-indexado y vuelve (las lecturas siguen en el perfil anterior hasta que el job termine).
+    """
+    if serving_state(namespace) == (embedding_profile.current().id, current_index_name()):
+        return
+    last = _reindex_scheduled.get(namespace)
+    if last is not None and time.monotonic() - last < REINDEX_RECHECK_SECONDS:
+        return
+    _reindex_scheduled[namespace] = time.monotonic()
+    try:
+        _schedule_reindex(namespace)
+    except Exception as e:
+        print(f"⚠️ No se pudo encolar el re-indexado de {namespace}: {e}")
+
+def embedding_status(namespace: str) -> dict:
+    profile = embedding_profile.current()
+    configured = embedding_profile.configured()
+    state_profile, state_index = _index_state(namespace)
+    return {
+        "profile": profile.describe(),
+        # pca sin proyección ajustada se sirve como api (ver embedding_profile.current)
+        "configured": {"dim": configured.dim, "reduction": configured.reduction, "fallback": configured is not profile},
+        "index": current_index_name(),
+        "namespace": {"profile": state_profile, "index": state_index,
+                      "vectors": len(manifest_service.namespace_vector_ids(namespace))},
+        "needs_reindex": (state_profile, state_index) != (profile.id, current_index_name()),
+        "cache": embedding_profile.cache.stats(),
+    }
+
+def clear_active_tender(namespace: str, keep_source: Optional[str] = None):
+    """Borra la licitación activa anterior. Si se re-sube la misma fuente, se conserva para el diff."""
+    try:
+        ensure_namespace(namespace)
+        # Varias fuentes del scope: se espera todo lo pendiente del namespace antes de leer el manifest
+        vector_writer.barrier(namespace)
+        ids, promoted = manifest_service.delete_chunks(namespace, scope="active_tender", exclude_source=keep_source)
+        _delete_vector_ids(ids, namespace, promoted=promoted)
+    except Exception as e:
+        print(f"⚠️ Error borrando licitación activa: {e}")
+    # Vectores legacy (sin manifest, IDs aleatorios)
+    if keep_source is None:
+        vector_writer.delete_filter(namespace, {"category": "active_tender"})
+
+@instrumentation.timed("ingest.prepare", tenant_arg="namespace")
+def _prepare_ingest(text: str, metadata: dict, namespace: str, batch_accepted: Optional[list] = None) -> dict:
+    """
+    Primera mitad de la ingesta: sanitiza, parte en chunks, hace el diff contra el manifest
+    (borrando chunks que desaparecieron) y el dedup. No vectoriza: devuelve un plan
+    que _commit_ingest aplica, así varios documentos comparten un solo upsert.
+    """
+    ensure_namespace(namespace)
     text = text.replace("\x00", "")
     
     if metadata.get("category") != "active_tender":
@@ -149,71 +434,369 @@ def ingest_text(text: str, metadata: dict, namespace: str):
             text = sanitize_text(text)
         except: pass
 
+    with instrumentation.stage("ingest.split"):
+        chunks = _get_splitter().split_text(text)
+
+    source_id = metadata.get("source_id") or ""
+    scope = metadata.get("category")
+
+    # 1. Hashes únicos (chunks idénticos dentro del documento cuentan una vez)
+    unique_chunks, chunk_hashes = [], []
+    for c in chunks:
+        h = manifest_service.chunk_hash(c)
+        if h not in chunk_hashes:
+            unique_chunks.append(c)
+            chunk_hashes.append(h)
+
+    # 2. Diff contra el manifest (si la fuente tiene escrituras encoladas, primero se aplican)
+    meta_hash = manifest_service.metadata_hash(metadata)
+    vector_writer.barrier(namespace, source_id)
+    with instrumentation.stage("ingest.manifest"):
+        previous = manifest_service.get_source(namespace, source_id)
+    if previous is None:
+        # Fuente nueva o ingestada antes del manifest (IDs aleatorios): limpieza por filtro
+        vector_writer.delete_filter(namespace, {"source_id": source_id})
+        existing = {}
+    elif previous.scope != scope:
+        delete_document_by_source(source_id, namespace)
+        existing = {}
+    else:
+        existing = manifest_service.chunk_vectors(namespace, source_id)
+
+    current = set(chunk_hashes)
+    removed = [h for h in existing if h not in current]
+    kept_ids = [vid for h, vid in existing.items() if h in current and vid]
+    added = [i for i, h in enumerate(chunk_hashes) if h not in existing]
+
+    vector_writes = 0
+    if removed:
+        removed_ids, promoted = manifest_service.delete_chunks(namespace, source_id=source_id, chunk_hashes=removed)
+        _delete_vector_ids(removed_ids, namespace, source_id, promoted)
+        vector_writes += len(removed_ids)
+
+    # Solo cambió la metadata (ej: status): se actualiza sin re-vectorizar
+    if previous is not None and previous.scope == scope and previous.metadata_hash != meta_hash:
+        vector_writer.update_metadata(namespace, kept_ids, metadata, source_id)
+        vector_writes += len(kept_ids)
+
+    # 3. Dedup: de los chunks nuevos, solo vectorizamos los que no tengan un casi-idéntico
+    added_chunks = [unique_chunks[i] for i in added]
+    added_hashes = [chunk_hashes[i] for i in added]
+    candidate_ids = [manifest_service.vector_id(namespace, source_id, h) for h in added_hashes]
+    with instrumentation.stage("ingest.dedup"):
+        fingerprints, duplicate_of = dedup_service.find_near_duplicates(added_chunks, namespace, scope, candidate_ids, batch_accepted)
+    new_positions = [j for j, dup in enumerate(duplicate_of) if dup is None]
+    vector_ids = [candidate_ids[j] if duplicate_of[j] is None else None for j in range(len(added_chunks))]
+
+    return {
+        "metadata": metadata,
+        "source_id": source_id,
+        "scope": scope,
+        "metadata_hash": meta_hash,
+        "unique_count": len(unique_chunks),
+        "texts": [added_chunks[j] for j in new_positions],
+        "ids": [vector_ids[j] for j in new_positions],
+        "records": (added_hashes, fingerprints, vector_ids, duplicate_of),
+        "report": {
+            "message": "Éxito (Google 004) 🚀",
+            "chunks_count": len(new_positions),
+            "diff": {
+                "unchanged": len(current) - len(added),
+                "added": len(added),
+                "removed": len(removed),
+                "vector_writes": vector_writes + len(new_positions)
+            },
+            "dedup": {
+                "chunks_total": len(chunks),
+                "chunks_skipped": len(chunks) - len(new_positions),
+                "embedding_calls_saved": len(chunks) - len(new_positions)
+            }
+        }
+    }
+
+@instrumentation.timed("ingest.commit", tenant_arg="namespace")
+def _commit_ingest(plans: List[dict], namespace: str):
+    """
+    Segunda mitad: encola los chunks nuevos de todos los planes en el write-behind (se vectorizan
+    junto con lo que otros requests encolaron en el namespace) y el manifest se escribe al aplicarse.
+    """
+    texts, metadatas, ids = [], [], []
+    for plan in plans:
+        texts.extend(plan["texts"])
+        metadatas.extend([plan["metadata"]] * len(plan["texts"]))
+        ids.extend(plan["ids"])
+
+    # Serializable: si la tanda termina en vector_write_failures, el manifest se escribe al reaplicarla
+    manifest = [
+        {"scope": plan["scope"], "source_id": plan["source_id"], "records": [list(r) for r in plan["records"]],
+         "metadata_hash": plan["metadata_hash"], "unique_count": plan["unique_count"]}
+        for plan in plans
+    ]
+    vector_writer.upsert(namespace, texts, metadatas, ids, manifest=manifest)
+
+def record_manifest(namespace: str, entries: List[dict]):
+    """Manifest de ingestas cuya tanda ya está en el índice (lo llama vector_writer al aplicarla)."""
+    with instrumentation.stage("ingest.manifest"):
+        for entry in entries:
+            dedup_service.record_fingerprints(namespace, entry["scope"], entry["source_id"], *entry["records"])
+            manifest_service.save_source(namespace, entry["source_id"], entry["scope"], entry["metadata_hash"], entry["unique_count"])
+
+def ingest_text(text: str, metadata: dict, namespace: str):
+    """
+    Ingesta incremental: IDs determinísticos (namespace + source_id + hash del chunk) y
+    un manifest por fuente. Al re-subir solo se vectorizan chunks nuevos y se borran los
+    que desaparecieron; un documento sin cambios no hace llamadas de embedding ni escrituras.
+    """
+    if not text: return {"error": "Vacío"}
     try:
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = splitter.split_text(text)
-        docs = [Document(page_content=c, metadata=metadata) for c in chunks]
-        
-        print(f"📡 Vectorizando {len(chunks)} chunks...")
-        ids = get_vector_store().add_documents(docs, namespace=namespace)
-        return {"message": "Éxito (Google 004) 🚀", "chunks_count": len(ids)}
+        plan = _prepare_ingest(text, metadata, namespace)
+        _commit_ingest([plan], namespace)
+        return plan["report"]
     except Exception as e:
         print(f"❌ Error Ingest: {e}")
         raise e
 
+def ingest_texts(items: List[tuple], namespace: str) -> List[dict]:
+    """
+    Ingesta en lote [(text, metadata), ...] con un único upsert (import masivo).
+    El dedup también compara entre documentos del lote.
+    """
+    plans = []
+    accepted_by_scope = {}
+    for text, metadata in items:
+        if text:
+            batch_accepted = accepted_by_scope.setdefault(metadata.get("category"), [])
+            plans.append(_prepare_ingest(text, metadata, namespace, batch_accepted))
+    _commit_ingest(plans, namespace)
+    return [p["report"] for p in plans]
+
 def delete_document_by_source(filename: str, namespace: str):
     try:
-        get_pc_index().delete(filter={"source_id": filename}, namespace=namespace)
+        ensure_namespace(namespace)
+        vector_writer.barrier(namespace, filename)
+        ids, promoted = manifest_service.delete_chunks(namespace, source_id=filename)
+        if ids or promoted:
+            _delete_vector_ids(ids, namespace, filename, promoted)
+        else:
+            # Fuente legacy sin manifest
+            vector_writer.delete_filter(namespace, {"source_id": filename})
         return True
     except: return False
 
-def detect_category(text: str, user_id: str) -> str:
+def detect_category(text: str, user_id: str) -> Optional[str]:
+    """Categoría según el LLM, o None si la llamada falló (no es una etiqueta: el caller decide el fallback)."""
     try:
         llm = get_llm()
-        res = llm.invoke(f"Clasifica (CV, Case Study, Financial, Technical, General): {text[:1000]}")
+        res = _invoke_llm(f"Clasifica (CV, Case Study, Financial, Technical, General): {text[:1000]}", user_id, llm_dispatch.BATCH)
         _log_token_usage(user_id, llm.model, res)
-        cat = res.content.strip().replace(".", "")
-        return cat if cat in ["CV", "Case Study", "Financial", "Technical"] else "General"
-    except: return "General"
+    except Exception as e:
+        print(f"⚠️ detect_category: LLM falló ({e})")
+        return None
+    cat = res.content.strip().replace(".", "")
+    return cat if cat in ["CV", "Case Study", "Financial", "Technical"] else "General"
 
-def extract_key_data(text: str, user_id: str):
+KEY_DATA_FIELDS = ("industry", "budget", "technical_score", "deadline", "complexity")
+KEY_DATA_DEFAULTS = {"industry": "Other", "budget": 0, "technical_score": 50, "deadline": None, "complexity": "Medium"}
+
+def _parse_llm_json(content: str) -> dict:
+    return json.loads(content.replace("```json", "").replace("```", "").strip())
+
+def _extract_key_data_llm(text: str, user_id: str, fields=KEY_DATA_FIELDS) -> dict:
+    """Camino LLM: solo los campos pedidos, sobre el texto que se le pase."""
+    schema = {"industry": "str", "budget": "int", "technical_score": "int", "deadline": "\"YYYY-MM-DD\"", "complexity": "str"}
+    spec = ", ".join(f'"{f}": {schema[f]}' for f in fields)
+    llm = get_llm()
+    res = _invoke_llm(f"""Extract JSON: {{{spec}}}\nText: {text}""", user_id, llm_dispatch.BATCH)
+    _log_token_usage(user_id, llm.model, res)
+    data = _parse_llm_json(res.content)
+    return {f: data.get(f) for f in fields if f in data}
+
+# Los únicos campos que pueden ir al LLM. complexity queda en la heurística local (solo se muestra,
+# no es feature del modelo) y technical_score (match con la empresa) sale del historial del tenant
+KEY_DATA_LLM_FIELDS = ("industry", "budget", "deadline")
+
+def pending_key_data_fields(local: Dict[str, dict]) -> List[str]:
+    """Campos que el extractor local no resolvió con confianza suficiente."""
+    return [f for f in KEY_DATA_LLM_FIELDS
+            if local[f]["value"] is None or local[f]["confidence"] < settings.KEY_DATA_MIN_CONFIDENCE]
+
+def _tenant_technical_score(user_id: str, industry: Optional[str]) -> tuple:
+    """(score, fuente): mediana del technical_score de las licitaciones del tenant en la industria, o en general."""
+    db = SessionLocal()
     try:
-        llm = get_llm()
-        res = llm.invoke(f"""Extract JSON: {{"industry": str, "budget": int, "technical_score": int, "deadline": "YYYY-MM-DD", "complexity": str}}\nText: {text[:4000]}""")
-        _log_token_usage(user_id, llm.model, res)
-        return json.loads(res.content.replace("```json", "").replace("```", "").strip())
-    except: return {"industry": "Other", "budget": 0, "technical_score": 50, "deadline": None, "complexity": "Medium"}
+        for scope in ((industry,) if industry else ()) + (None,):
+            query = db.query(Bid.technical_score).filter(Bid.user_id == user_id, Bid.technical_score > 0)
+            if scope is not None:
+                query = query.filter(Bid.industry == scope)
+            scores = [score for (score,) in query.order_by(Bid.created_at.desc()).limit(200).all()]
+            if scores:
+                return float(np.median(scores)), "tenant_history"
+    finally:
+        db.close()
+    return KEY_DATA_DEFAULTS["technical_score"], "default"
+
+@instrumentation.timed("key_data.extract", tenant_arg="user_id")
+def extract_key_data(text: str, user_id: str):
+    """
+    1) Extractor local (regex + keywords) sobre TODO el texto: presupuesto, deadline, industria, complejidad.
+    2) LLM solo para los campos faltantes o con confianza < KEY_DATA_MIN_CONFIDENCE,
+       y solo sobre las ventanas relevantes (no los primeros 4000 chars a ciegas).
+    3) complexity y technical_score no van al LLM: heurística local e historial del tenant (o default).
+    """
+    with instrumentation.stage("key_data.local"):
+        local = key_data_extractor.extract_local(text)
+    pending = pending_key_data_fields(local)
+    result = {f: local[f]["value"] for f in KEY_DATA_LLM_FIELDS if f not in pending}
+    sources = {f: "local" for f in result}
+    result["complexity"] = local["complexity"]["value"] or KEY_DATA_DEFAULTS["complexity"]
+    sources["complexity"] = "local_heuristic"
+
+    if pending and not settings.KEY_DATA_LOCAL_ONLY:
+        try:
+            window = key_data_extractor.relevant_windows(text, pending, local)
+            for field, value in _extract_key_data_llm(window, user_id, pending).items():
+                if value is not None:
+                    result[field] = value
+                    sources[field] = "llm"
+        except Exception as e:
+            print(f"⚠️ extract_key_data: LLM falló, uso valores locales ({e})")
+
+    # Lo que siga faltando: candidato local de baja confianza o default
+    for field in KEY_DATA_LLM_FIELDS:
+        if field not in result:
+            value = local[field]["value"]
+            result[field] = value if value is not None else KEY_DATA_DEFAULTS[field]
+            sources[field] = "local_low_confidence" if value is not None else "default"
+
+    result["technical_score"], sources["technical_score"] = _tenant_technical_score(user_id, result["industry"])
+
+    if isinstance(result["budget"], float):
+        result["budget"] = int(result["budget"])
+    result["field_sources"] = sources
+    return result
+
+@instrumentation.timed("vector.search", tenant_arg="namespace")
+def _similarity_search(query: str, namespace: str, k: int, filter: dict):
+    # Incluye el embedding de la consulta ('embed' anidado). Read-after-write: primero lo encolado en el namespace
+    ensure_namespace(namespace)
+    vector_writer.barrier(namespace)
+    return serving_store(namespace).similarity_search(query, k=k, filter=filter, namespace=namespace)
 
 def ask_gemini_with_context(question: str, namespace: str):
     try:
-        docs = get_vector_store().similarity_search(question, k=5, filter={"category": "active_tender"}, namespace=namespace)
+        docs = _similarity_search(question, namespace, 5, {"category": "active_tender"})
         if not docs: return {"answer": "Sin datos.", "sources": []}
         llm = get_llm()
-        res = llm.invoke(f"Contexto: {' '.join([d.page_content for d in docs])}\nPregunta: {question}")
+        res = _invoke_llm(f"Contexto: {' '.join([d.page_content for d in docs])}\nPregunta: {question}", namespace)
         _log_token_usage(namespace, llm.model, res)
         return {"answer": res.content, "sources": ["match"]}
     except Exception as e: return {"answer": f"Error: {str(e)}", "error": str(e)}
 
-def stream_ask_gemini(question: str, namespace: str):
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def astream_ask_gemini(question: str, namespace: str, is_disconnected=None):
+    """
+    Chat en streaming (SSE) sobre la licitación activa.
+    Eventos: 'sources' (antes de generar), 'token', 'error', 'done' + heartbeats (': ping').
+    Si el cliente se desconecta se cancela el stream de Gemini para no quemar tokens.
+    """
+    # Primer byte inmediato: el cliente sabe que la conexión está viva mientras buscamos
+    yield ": connected\n\n"
+
     try:
-        docs = get_vector_store().similarity_search(question, k=5, filter={"category": "active_tender"}, namespace=namespace)
-        chain = PromptTemplate.from_template(f"Contexto: {' '.join([d.page_content for d in docs]) if docs else ''}\nPregunta: {question}") | get_llm() | StrOutputParser()
-        for chunk in chain.stream({}): yield chunk
-    except Exception as e: yield f"Error: {e}"
+        docs = await asyncio.to_thread(_similarity_search, question, namespace, 5, {"category": "active_tender"})
+    except Exception as e:
+        yield _sse("error", {"message": str(e)})
+        return
+
+    yield _sse("sources", {"sources": [
+        {"source_id": d.metadata.get("source_id"), "preview": d.page_content[:200]} for d in docs
+    ]})
+
+    llm = get_llm()
+    prompt = f"Contexto: {' '.join([d.page_content for d in docs]) if docs else ''}\nPregunta: {question}"
+
+    # Cola acotada: si el cliente lee lento, el productor se bloquea y deja de tirar del upstream
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+
+    limiter = _llm_limiter()
+
+    async def produce():
+        # Slot interactivo del dispatcher y luego del limiter (mismo bucket/AIMD que invoke),
+        # ocupados mientras dura el stream
+        async with llm_dispatch.aslot(namespace, llm_dispatch.INTERACTIVE):
+            start = time.perf_counter()
+            await asyncio.to_thread(limiter.bucket.acquire)
+            await llm_dispatch.acquire_in_thread(limiter.concurrency.acquire, lambda _: limiter.concurrency.release())
+            QUEUE_WAIT.observe(time.perf_counter() - start, limiter=limiter.name)
+            throttled = False
+            stream_start = time.perf_counter()
+            first_token = True
+            try:
+                async for chunk in llm.astream(prompt):
+                    if first_token:
+                        instrumentation.observe("llm.stream_first_token", time.perf_counter() - stream_start, namespace)
+                        first_token = False
+                    await queue.put(chunk)
+                await queue.put(None)
+                instrumentation.observe("llm.stream", time.perf_counter() - stream_start, namespace)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                if throttled:
+                    THROTTLE_EVENTS.inc(limiter=limiter.name)
+                await queue.put(e)
+            finally:
+                limiter.concurrency.release(throttled=throttled)
+
+    producer = asyncio.create_task(produce())
+    aggregate = None
+    finished = False
+    try:
+        while True:
+            if is_disconnected is not None and await is_disconnected():
+                print(f"🔌 Cliente desconectado ({namespace}): cancelando stream de Gemini")
+                break
+            try:
+                chunk = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+
+            if chunk is None:
+                finished = True
+                break
+            if isinstance(chunk, Exception):
+                yield _sse("error", {"message": str(chunk)})
+                break
+
+            aggregate = chunk if aggregate is None else aggregate + chunk
+            if chunk.content:
+                yield _sse("token", {"text": chunk.content})
+
+        if finished:
+            yield _sse("done", {"usage": getattr(aggregate, "usage_metadata", None)})
+    finally:
+        if not producer.done():
+            producer.cancel()
+        # Lo consumido hasta el corte también se registra
+        if aggregate is not None:
+            _log_token_usage(namespace, llm.model, aggregate)
 
 def generate_proposal_draft(namespace: str):
-    vstore = get_vector_store()
     llm = get_llm()
     try:
-        tender = " ".join([d.page_content for d in vstore.similarity_search("objetivos", k=6, filter={"category": "active_tender"}, namespace=namespace)])
-        q = llm.invoke(f"Search query based on: {tender[:500]}").content
-        company = " ".join([d.page_content for d in vstore.similarity_search(q, k=5, filter={"category": {"$ne": "active_tender"}}, namespace=namespace)])
+        tender = " ".join([d.page_content for d in _similarity_search("objetivos", namespace, 6, {"category": "active_tender"})])
+        q = _invoke_llm(f"Search query based on: {tender[:500]}", namespace, llm_dispatch.STANDARD).content
+        company = " ".join([d.page_content for d in _similarity_search(q, namespace, 5, {"category": {"$ne": "active_tender"}})])
         
         db = SessionLocal()
         st = db.query(AppSettings).filter(AppSettings.user_id == namespace).first()
         db.close()
         
-        res = llm.invoke(f"Role: Bid Manager at {st.company_name if st else 'Us'}. Tender: {tender}. Our Exp: {company}. Write proposal.")
+        res = _invoke_llm(f"Role: Bid Manager at {st.company_name if st else 'Us'}. Tender: {tender}. Our Exp: {company}. Write proposal.", namespace, llm_dispatch.STANDARD)
         _log_token_usage(namespace, llm.model, res)
         return res.content
     except Exception as e: return f"Error: {e}"
\ No newline at end of file
@@ -0,0 +1,453 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.core import instrumentation, metrics
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.db.models import VectorWriteFailure
+
+# Write-behind de escrituras al índice vectorial (upserts, deletes, updates de metadata).
+# Cada ingesta/borrado encola sus operaciones por namespace y vuelve; un thread decide qué tandas
+# salen (el namespace junta VECTOR_WRITE_MAX_BATCH operaciones o la más vieja cumple
+# VECTOR_WRITE_MAX_DELAY_MS) y las aplica un pool de VECTOR_WRITE_WORKERS threads, una tanda por
+# namespace a la vez: un tenant lento o con throttling no frena las escrituras de los demás.
+# Muchos uploads chicos = pocas llamadas grandes.
+# Orden: por vector_id gana la última operación encolada (un delete seguido de un re-upsert deja
+# el vector; al revés, lo borra), así que en cada tanda se aplican primero los deletes y después
+# los upserts. Un delete por filtro descarta los upserts pendientes que matchean.
+# El manifest de cada ingesta se escribe DESPUÉS de aplicar su tanda (on_flushed): nunca dice que
+# un chunk está en el índice si no está. Por eso antes de leer el manifest de una fuente con
+# escrituras pendientes hay que pasar por barrier(namespace, source_id).
+# Una tanda que agota VECTOR_WRITE_MAX_ATTEMPTS no se pierde: va a vector_write_failures (con sus
+# textos y su manifest) y se reaplica cada VECTOR_WRITE_RETRY_SECONDS, o antes de la próxima
+# escritura de cualquiera de sus fuentes (barrier con source_id), así el diff ve el manifest real.
+
+FLUSHES = metrics.counter("vector_write_flush_total", "Tandas aplicadas al índice por motivo (size, time, barrier, shutdown) y resultado")
+BATCH_OPS = metrics.histogram("vector_write_batch_ops", "Operaciones (upserts + deletes + updates) por tanda",
+                              buckets=(1, 5, 10, 50, 100, 250, 500, 1000, 5000))
+PENDING_OPS = metrics.gauge("vector_write_pending_ops", "Operaciones encoladas sin aplicar")
+
+
+class _Batch:
+    """Operaciones pendientes de un namespace."""
+
+    def __init__(self):
+        self.ops: "OrderedDict[str, tuple]" = OrderedDict() # vector_id -> ("upsert", texto, metadata) | ("delete",)
+        self.updates: Dict[str, dict] = {} # vector_id -> set_metadata (vectores que ya están en el índice)
+        self.filters: List[dict] = [] # Deletes por filtro (vectores legacy sin manifest)
+        self.callbacks: List[Callable] = []
+        self.manifests: List[dict] = [] # Manifest de las ingestas de la tanda (serializable: sobrevive al dead letter)
+        self.sources = set()
+        self.first_at = time.monotonic()
+        self.attempts = 0
+        self.not_before = 0.0 # Backoff tras una tanda fallida
+
+    def __len__(self):
+        return len(self.ops) + len(self.updates) + len(self.filters)
+
+    def absorb(self, newer: "_Batch"):
+        """Reencola una tanda fallida: las operaciones más nuevas pisan a las suyas."""
+        for flt in newer.filters:
+            for vid in [vid for vid, op in self.ops.items() if op[0] == "upsert" and _matches(op[2], flt)]:
+                del self.ops[vid]
+        for vid, op in newer.ops.items():
+            self.ops.pop(vid, None)
+            self.ops[vid] = op
+            if op[0] == "delete":
+                self.updates.pop(vid, None)
+        for vid, meta in newer.updates.items():
+            self.updates[vid] = {**self.updates.get(vid, {}), **meta}
+        self.filters += newer.filters
+        self.callbacks += newer.callbacks
+        self.manifests += newer.manifests
+        self.sources |= newer.sources
+
+
+_pending: Dict[str, _Batch] = {}
+_lock = threading.Lock()
+_namespace_locks: Dict[str, threading.Lock] = {}
+_wakeup = threading.Event()
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+_pool: Optional[ThreadPoolExecutor] = None
+_inflight = set() # Namespaces con una tanda en el pool (no se despacha otra hasta que termine)
+
+
+def _matches(metadata: dict, flt: dict) -> bool:
+    # Solo igualdad exacta (los filtros que usa rag_service: source_id, category)
+    return all(metadata.get(key) == value for key, value in flt.items())
+
+def _merge_filters(filters: List[dict]) -> List[dict]:
+    """Filtros de una sola clave por igualdad -> uno con $in por clave (N uploads nuevos = 1 delete)."""
+    merged: Dict[str, list] = {}
+    rest = []
+    for flt in filters:
+        if len(flt) == 1 and not isinstance(next(iter(flt.values())), dict):
+            key, value = next(iter(flt.items()))
+            if value not in merged.setdefault(key, []):
+                merged[key].append(value)
+        else:
+            rest.append(flt)
+    return [{key: values[0]} if len(values) == 1 else {key: {"$in": values}} for key, values in merged.items()] + rest
+
+def _enqueue(namespace: str, fill: Callable[[_Batch], None]):
+    with _lock:
+        batch = _pending.get(namespace)
+        if batch is None:
+            batch = _pending[namespace] = _Batch()
+        before = len(batch)
+        fill(batch)
+        PENDING_OPS.inc(len(batch) - before)
+        full = len(batch) >= settings.VECTOR_WRITE_MAX_BATCH
+    if not settings.VECTOR_WRITE_BEHIND:
+        flush(namespace, reason="sync")
+        return
+    _ensure_thread()
+    if full:
+        _wakeup.set()
+
+
+# ==========================================
+# API: ENCOLAR
+# ==========================================
+
+def upsert(namespace: str, texts: List[str], metadatas: List[dict], ids: List[str],
+           on_flushed: Optional[Callable] = None, manifest: Optional[List[dict]] = None):
+    """
+    Encola chunks a vectorizar (el embedding se hace al aplicar la tanda). Después de aplicarla se
+    escribe el manifest (rag_service.record_manifest) y corre on_flushed.
+    """
+    if not ids:
+        with _lock:
+            idle = namespace not in _pending
+        if idle:
+            # Nada encolado en el namespace: no hay escritura que esperar
+            if manifest:
+                _record_manifests(namespace, manifest)
+            if on_flushed is not None:
+                on_flushed()
+            return
+    def fill(batch: _Batch):
+        for vid, text, meta in zip(ids, texts, metadatas):
+            batch.ops.pop(vid, None)
+            batch.ops[vid] = ("upsert", text, dict(meta))
+            batch.updates.pop(vid, None)
+            batch.sources.add(meta.get("source_id"))
+        if on_flushed is not None:
+            batch.callbacks.append(on_flushed)
+        batch.manifests += manifest or []
+    _enqueue(namespace, fill)
+
+def delete(namespace: str, ids: List[str], source_id: Optional[str] = None):
+    def fill(batch: _Batch):
+        for vid in ids:
+            batch.ops.pop(vid, None)
+            batch.ops[vid] = ("delete",)
+            batch.updates.pop(vid, None)
+        batch.sources.add(source_id)
+    if ids:
+        _enqueue(namespace, fill)
+
+def delete_filter(namespace: str, flt: dict):
+    def fill(batch: _Batch):
+        # Los upserts pendientes que matchean se descartan acá: en la tanda el filtro corre antes que los upserts
+        for vid in [vid for vid, op in batch.ops.items() if op[0] == "upsert" and _matches(op[2], flt)]:
+            del batch.ops[vid]
+        batch.filters.append(dict(flt))
+        batch.sources.add(flt.get("source_id"))
+    _enqueue(namespace, fill)
+
+def update_metadata(namespace: str, ids: List[str], metadata: dict, source_id: Optional[str] = None):
+    def fill(batch: _Batch):
+        for vid in ids:
+            op = batch.ops.get(vid)
+            if op is None:
+                batch.updates[vid] = {**batch.updates.get(vid, {}), **metadata}
+            elif op[0] == "upsert":
+                # Todavía no llegó al índice: se corrige la metadata del upsert pendiente
+                batch.ops[vid] = ("upsert", op[1], {**op[2], **metadata})
+        batch.sources.add(source_id)
+    if ids:
+        _enqueue(namespace, fill)
+
+
+# ==========================================
+# APLICAR TANDAS
+# ==========================================
+
+def _apply(namespace: str, batch: _Batch):
+    from app.services import rag_service
+
+    # Durante un re-indexado de perfil: índice activo + el anterior (que sigue sirviendo las lecturas)
+    for index, store in rag_service.write_targets(namespace):
+        _apply_to(index, store, namespace, batch)
+
+def _apply_to(index, store, namespace: str, batch: _Batch):
+    from app.services import rag_service
+
+    for flt in _merge_filters(batch.filters):
+        # Best effort, como antes: los índices serverless no borran por metadata y no debe tirar la tanda
+        try:
+            index.delete(filter=flt, namespace=namespace)
+        except Exception as e:
+            print(f"⚠️ Delete por filtro {flt} en {namespace} falló: {e}")
+
+    deletes = [vid for vid, op in batch.ops.items() if op[0] == "delete"]
+    for i in range(0, len(deletes), rag_service.DELETE_BATCH_SIZE):
+        index.delete(ids=deletes[i:i + rag_service.DELETE_BATCH_SIZE], namespace=namespace)
+
+    upserts = [(vid, op[1], op[2]) for vid, op in batch.ops.items() if op[0] == "upsert"]
+    if upserts:
+        print(f"📡 Vectorizando {len(upserts)} chunks ({namespace}, tanda de {len(batch)} operaciones)...")
+        # Incluye 'embed' (medido adentro, en las embeddings): upsert de Pinecone = vector.upsert - embed
+        with instrumentation.stage("vector.upsert"):
+            store.add_texts(
+                [text for _, text, _ in upserts], metadatas=[meta for _, _, meta in upserts],
+                ids=[vid for vid, _, _ in upserts], namespace=namespace, batch_size=rag_service.UPSERT_BATCH_SIZE
+            )
+
+    if batch.updates:
+        with instrumentation.stage("vector.update_metadata"):
+            for vid, meta in batch.updates.items():
+                index.update(id=vid, set_metadata=meta, namespace=namespace)
+
+def _record_manifests(namespace: str, manifests: List[dict]):
+    from app.services import rag_service
+    rag_service.record_manifest(namespace, manifests)
+
+def _lock_for(namespace: str) -> threading.Lock:
+    with _lock:
+        return _namespace_locks.setdefault(namespace, threading.Lock())
+
+def flush(namespace: str, reason: str = "barrier"):
+    """
+    Aplica lo pendiente del namespace en el thread que llama. El lock por namespace serializa las
+    tandas (nunca corren dos del mismo namespace a la vez): al volver, todo lo encolado antes ya está
+    aplicado. Si falla, la tanda vuelve a la cola (hasta VECTOR_WRITE_MAX_ATTEMPTS) y se propaga el error.
+    """
+    with _lock_for(namespace):
+        with _lock:
+            batch = _pending.pop(namespace, None)
+        if batch is None:
+            return
+        size = len(batch)
+        PENDING_OPS.dec(size)
+        try:
+            with instrumentation.stage("vector.flush", tenant=namespace):
+                _apply(namespace, batch)
+        except Exception as e:
+            batch.attempts += 1
+            FLUSHES.inc(reason=reason, result="error")
+            if batch.attempts < settings.VECTOR_WRITE_MAX_ATTEMPTS:
+                with _lock:
+                    newer = _pending.pop(namespace, None)
+                    if newer is not None:
+                        batch.absorb(newer)
+                    _pending[namespace] = batch
+                    PENDING_OPS.inc(len(batch) - (len(newer) if newer is not None else 0))
+                batch.not_before = time.monotonic() + min(2 ** (batch.attempts - 1), 30)
+                print(f"⚠️ Tanda de {namespace} falló (intento {batch.attempts}): {e}")
+            else:
+                print(f"❌ Tanda de {namespace} descartada tras {batch.attempts} intentos ({size} operaciones): {e}")
+                _dead_letter(namespace, batch, e)
+            raise
+        BATCH_OPS.observe(size)
+        FLUSHES.inc(reason=reason, result="ok")
+        if batch.manifests:
+            try:
+                _record_manifests(namespace, batch.manifests)
+            except Exception as e:
+                print(f"⚠️ Manifest de {namespace} no se pudo escribir (el próximo upload re-vectoriza): {e}")
+        for callback in batch.callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ Post-flush de {namespace} falló: {e}")
+
+def barrier(namespace: str, source_id: Optional[str] = None):
+    """
+    Flush-and-wait para leer lo que se acaba de escribir (chat justo después de subir la licitación,
+    diff contra el manifest de una fuente con escrituras pendientes). Con source_id solo espera si
+    esa fuente tiene algo encolado. Propaga el error si la tanda no se pudo aplicar.
+    """
+    if source_id is not None:
+        replay_failed(namespace, source_id)
+    with _lock:
+        batch = _pending.get(namespace)
+        if batch is None or (source_id is not None and source_id not in batch.sources):
+            return
+    flush(namespace, reason="barrier")
+
+def pending(namespace: Optional[str] = None) -> int:
+    with _lock:
+        if namespace is not None:
+            return len(_pending.get(namespace) or ())
+        return sum(len(b) for b in _pending.values())
+
+
+# ==========================================
+# TANDAS DESCARTADAS (DEAD LETTER)
+# ==========================================
+
+def _dead_letter(namespace: str, batch: _Batch, error: Exception):
+    """Persiste la tanda: el manifest no la registró, así que sin esto el índice y el SQL quedan desfasados."""
+    operations = {
+        "ops": [[vid, *op] for vid, op in batch.ops.items()],
+        "updates": batch.updates,
+        "filters": batch.filters,
+        "manifests": batch.manifests,
+    }
+    if len(batch.callbacks) > len(batch.manifests):
+        print(f"⚠️ Tanda de {namespace}: los callbacks post-flush no se persisten")
+    db = SessionLocal()
+    try:
+        db.add(VectorWriteFailure(
+            namespace=namespace, sources=json.dumps(sorted(s for s in batch.sources if s)),
+            operations=json.dumps(operations, default=str), error=str(error)[:2000]
+        ))
+        db.commit()
+    except Exception as e:
+        print(f"❌ No se pudo guardar la tanda descartada de {namespace} ({len(batch)} operaciones): {e}")
+    finally:
+        db.close()
+
+def _restore(operations: dict) -> _Batch:
+    batch = _Batch()
+    for vid, kind, *rest in operations["ops"]:
+        batch.ops[vid] = (kind, *rest)
+        if kind == "upsert":
+            batch.sources.add(rest[1].get("source_id"))
+    batch.updates = operations["updates"]
+    batch.filters = operations["filters"]
+    batch.manifests = operations["manifests"]
+    return batch
+
+def replay_failed(namespace: Optional[str] = None, source_id: Optional[str] = None) -> int:
+    """
+    Reencola tandas descartadas (del namespace / que tocan source_id). Van por detrás de lo que ya
+    está encolado: las operaciones más nuevas pisan a las viejas, igual que al reencolar un fallo.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(VectorWriteFailure).order_by(VectorWriteFailure.id)
+        if namespace is not None:
+            query = query.filter(VectorWriteFailure.namespace == namespace)
+        if source_id is not None:
+            query = query.filter(VectorWriteFailure.sources.contains(json.dumps(source_id)))
+        replayed = 0
+        rows = [(row.id, row.namespace, json.loads(row.sources), row.operations) for row in query.all()]
+        for row_id, row_namespace, sources, operations in rows:
+            if source_id is not None and source_id not in sources:
+                continue
+            # Borrado condicional: otro proceso puede estar reaplicando la misma fila
+            if db.query(VectorWriteFailure).filter(VectorWriteFailure.id == row_id).delete(synchronize_session=False) != 1:
+                db.rollback()
+                continue
+            db.commit()
+            old = _restore(json.loads(operations))
+            old.sources |= set(sources)
+            with _lock:
+                newer = _pending.pop(row_namespace, None)
+                if newer is not None:
+                    old.absorb(newer)
+                _pending[row_namespace] = old
+                PENDING_OPS.inc(len(old) - (len(newer) if newer is not None else 0))
+            replayed += 1
+            print(f"🔁 Tanda descartada de {row_namespace} reencolada ({len(old)} operaciones)")
+        return replayed
+    finally:
+        db.close()
+
+
+# ==========================================
+# THREAD DE FLUSH + APAGADO
+# ==========================================
+
+def _due(now: float) -> List[tuple]:
+    max_delay = settings.VECTOR_WRITE_MAX_DELAY_MS / 1000
+    with _lock:
+        due = []
+        for namespace, batch in _pending.items():
+            if now < batch.not_before or namespace in _inflight:
+                continue
+            if len(batch) >= settings.VECTOR_WRITE_MAX_BATCH:
+                due.append((namespace, "size"))
+            elif now - batch.first_at >= max_delay:
+                due.append((namespace, "time"))
+        return due
+
+def _loop():
+    tick = max(settings.VECTOR_WRITE_MAX_DELAY_MS / 4000, 0.01)
+    next_replay = time.monotonic() + settings.VECTOR_WRITE_RETRY_SECONDS
+    while not _stop.is_set():
+        _wakeup.wait(tick)
+        _wakeup.clear()
+        if time.monotonic() >= next_replay:
+            next_replay = time.monotonic() + settings.VECTOR_WRITE_RETRY_SECONDS
+            try:
+                replay_failed()
+            except Exception as e:
+                print(f"⚠️ Reintento de tandas descartadas falló: {e}")
+        for namespace, reason in _due(time.monotonic()):
+            with _lock:
+                _inflight.add(namespace)
+            try:
+                _pool.submit(_flush_task, namespace, reason)
+            except RuntimeError: # Pool cerrado: apagando, stop() aplica lo pendiente
+                with _lock:
+                    _inflight.discard(namespace)
+
+def _flush_task(namespace: str, reason: str):
+    try:
+        flush(namespace, reason=reason)
+    except Exception:
+        pass # Ya logueado; la tanda quedó reencolada o descartada
+    finally:
+        with _lock:
+            _inflight.discard(namespace)
+        _wakeup.set() # Lo encolado mientras tanto puede estar vencido
+
+def _ensure_thread():
+    global _thread, _pool
+    if _thread is not None and _thread.is_alive():
+        return
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _stop.clear()
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=max(1, settings.VECTOR_WRITE_WORKERS), thread_name_prefix="vector-writer-flush")
+            _thread = threading.Thread(target=_loop, name="vector-writer", daemon=True)
+            _thread.start()
+
+def stop():
+    """Apagado: para el thread y aplica todo lo pendiente (lifecycle, antes de cerrar pools)."""
+    _stop.set()
+    _wakeup.set()
+    global _pool
+    if _thread is not None:
+        _thread.join(timeout=5)
+    if _pool is not None:
+        _pool.shutdown(wait=True) # Las tandas en curso terminan antes del flush final
+        _pool = None
+    with _lock:
+        namespaces = list(_pending)
+    for namespace in namespaces:
+        for _ in range(settings.VECTOR_WRITE_MAX_ATTEMPTS):
+            try:
+                flush(namespace, reason="shutdown")
+                break
+            except Exception:
+                continue
+    left = pending()
+    if left:
+        print(f"⚠️ Vector writer: {left} operaciones sin aplicar al apagar (quedan en vector_write_failures)")
+        with _lock:
+            batches = list(_pending.items())
+            _pending.clear()
+        PENDING_OPS.dec(left)
+        for namespace, batch in batches:
+            _dead_letter(namespace, batch, RuntimeError("apagado"))
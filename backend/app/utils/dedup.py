@@ -0,0 +1,87 @@
+import re
+import hashlib
+from typing import List, Tuple
+
+# Huella de 64 bits = 16 bits altos con el hash exacto de los números del chunk (montos, fechas,
+# cantidades, numerales) + 48 bits de SimHash sobre shingles de las palabras. Dos chunks son
+# casi-idénticos si tienen exactamente los mismos números y el texto difiere en <= 3 bits:
+# así un pliego que solo cambia el presupuesto o la fecha nunca queda enlazado a otro.
+# Los 48 bits de texto van en 4 bandas de 12: con <= 3 bits distintos, por palomar al menos
+# una banda coincide exacta (así buscamos candidatos sin escanear todo).
+SIMHASH_BITS = 64
+NUMBER_BITS = 16
+TEXT_BITS = SIMHASH_BITS - NUMBER_BITS
+NUM_BANDS = 4
+BAND_BITS = TEXT_BITS // NUM_BANDS
+SHINGLE_SIZE = 3
+
+_MASK_64 = (1 << SIMHASH_BITS) - 1
+_MASK_TEXT = (1 << TEXT_BITS) - 1
+
+
+def _tokenize(text: str) -> Tuple[List[str], List[str]]:
+    """(palabras, números) en minúsculas. Los números no se aplanan: van aparte, como tokens propios."""
+    words, numbers = [], []
+    for token in re.findall(r"\w+", text.lower()):
+        (numbers if any(c.isdigit() for c in token) else words).append(token)
+    return words, numbers
+
+
+def _hash64(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _numbers_key(numbers: List[str]) -> int:
+    if not numbers:
+        return 0
+    return int.from_bytes(hashlib.blake2b(" ".join(numbers).encode("utf-8"), digest_size=2).digest(), "big")
+
+
+def simhash(text: str) -> int:
+    """Huella (entero sin signo de 64 bits): hash de los números en los bits altos + SimHash del texto."""
+    words, numbers = _tokenize(text)
+    fingerprint = _numbers_key(numbers) << TEXT_BITS
+    if not words:
+        return fingerprint
+
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+    weights = [0] * TEXT_BITS
+    for shingle in shingles:
+        h = _hash64(shingle)
+        for bit in range(TEXT_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & _MASK_64).count("1")
+
+
+def is_near_duplicate(a: int, b: int, max_distance: int) -> bool:
+    """Mismos números (bits altos idénticos) y texto a <= max_distance bits."""
+    if (a ^ b) >> TEXT_BITS:
+        return False
+    return bin((a ^ b) & _MASK_TEXT).count("1") <= max_distance
+
+
+def bands(fingerprint: int) -> List[int]:
+    """Las 4 bandas de 12 bits de la parte de texto (claves de los buckets LSH)."""
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (i * BAND_BITS)) & mask for i in range(NUM_BANDS)]
+
+
+def to_signed(fingerprint: int) -> int:
+    """Postgres BIGINT es con signo: guardamos en complemento a dos."""
+    return fingerprint - (1 << SIMHASH_BITS) if fingerprint >= (1 << (SIMHASH_BITS - 1)) else fingerprint
+
+
+def to_unsigned(value: int) -> int:
+    return value & _MASK_64
@@ -0,0 +1,275 @@
+import re
+import unicodedata
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+# Extracción local (regex + keywords) de presupuesto, deadline, industria y complejidad.
+# Corre sobre TODO el texto en milisegundos; el LLM solo se usa para lo que quede
+# vacío o con baja confianza (ver rag_service.extract_key_data).
+
+# ==========================================
+# 1. NORMALIZACIÓN
+# ==========================================
+
+def _strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+def _near_keyword(position: int, keyword_positions: List[int], window: int) -> bool:
+    """True si hay un keyword en los `window` caracteres anteriores a la posición."""
+    return any(0 <= position - k <= window for k in keyword_positions)
+
+
+# ==========================================
+# 2. PRESUPUESTO
+# ==========================================
+
+_CURRENCY = r"(?:US\$|U\$S|USD|ARS|EUR|MXN|CLP|COP|PEN|BRL|R\$|\$|€|£)"
+_CURRENCY_WORDS = r"(?:pesos|dolares|dollars|euros|reales|soles)"
+_NUMBER = r"\d{1,3}(?:[.,\s]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d+)?"
+_MULTIPLIER = r"(?:\s*(?P<mult>mil\s+millones|millones|millon|millions?|mil|thousand|billions?|bn|MM|M|K|k)\b)?"
+
+_AMOUNT_PATTERNS = [
+    re.compile(rf"{_CURRENCY}\s?(?P<num>{_NUMBER}){_MULTIPLIER}"),
+    re.compile(rf"(?P<num>{_NUMBER}){_MULTIPLIER}\s?(?:{_CURRENCY}|{_CURRENCY_WORDS})", re.IGNORECASE),
+]
+
+_BUDGET_KEYWORDS = re.compile(
+    r"presupuesto|monto|importe|valor estimado|precio tope|budget|total amount|contract value|estimated value|ceiling price",
+    re.IGNORECASE
+)
+
+_MULTIPLIERS = {
+    "mil millones": 1e9, "millones": 1e6, "millon": 1e6, "million": 1e6, "millions": 1e6, "mm": 1e6, "m": 1e6,
+    "mil": 1e3, "thousand": 1e3, "k": 1e3, "billion": 1e9, "billions": 1e9, "bn": 1e9,
+}
+
+def parse_amount(number: str, multiplier: Optional[str] = None) -> Optional[float]:
+    """
+    Interpreta formatos ES y EN: "1.234.567,89", "1,234,567.89", "1 234 567", "2,5 millones", "1.5M".
+    El último separador seguido de 1-2 dígitos es el decimal; grupos de 3 son miles.
+    """
+    raw = re.sub(r"\s", "", number)
+    if "." in raw and "," in raw:
+        decimal = "." if raw.rfind(".") > raw.rfind(",") else ","
+        thousands = "," if decimal == "." else "."
+        raw = raw.replace(thousands, "").replace(decimal, ".")
+    elif "," in raw or "." in raw:
+        sep = "," if "," in raw else "."
+        if re.fullmatch(rf"\d{{1,3}}(?:\{sep}\d{{3}})+", raw):
+            raw = raw.replace(sep, "")
+        else:
+            raw = raw.replace(sep, ".")
+    try:
+        value = float(raw)
+    except ValueError:
+        return None
+    if multiplier:
+        value *= _MULTIPLIERS.get(re.sub(r"\s+", " ", multiplier.lower()), 1)
+    return value
+
+def extract_budget(text: str) -> Tuple[Optional[float], float, Optional[int]]:
+    """(monto, confianza, posición). Prioriza montos cerca de "presupuesto"/"budget"."""
+    keyword_positions = [m.end() for m in _BUDGET_KEYWORDS.finditer(text)]
+    candidates = []
+    for pattern in _AMOUNT_PATTERNS:
+        for m in pattern.finditer(text):
+            value = parse_amount(m.group("num"), m.group("mult"))
+            if value is None or value < 100:  # Descarta "$5" sueltos, porcentajes, etc.
+                continue
+            near = _near_keyword(m.start(), keyword_positions, 120)
+            candidates.append((near, value, m.start()))
+
+    if not candidates:
+        return None, 0.0, None
+
+    near_keyword = [c for c in candidates if c[0]]
+    if near_keyword:
+        # El primero cerca de un keyword suele ser el presupuesto oficial
+        _, value, pos = min(near_keyword, key=lambda c: c[2])
+        return value, 0.9, pos
+
+    # Sin contexto: el mayor monto con moneda (confianza baja)
+    _, value, pos = max(candidates, key=lambda c: c[1])
+    return value, 0.5 if len(candidates) == 1 else 0.4, pos
+
+
+# ==========================================
+# 3. DEADLINE
+# ==========================================
+
+_MONTHS = {
+    "ene": 1, "jan": 1, "feb": 2, "mar": 3, "abr": 4, "apr": 4, "may": 5, "jun": 6, "jul": 7,
+    "ago": 8, "aug": 8, "sep": 9, "set": 9, "oct": 10, "nov": 11, "dic": 12, "dec": 12,
+}
+_MONTH_NAME = r"(?P<month>enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre|" \
+              r"january|february|march|april|may|june|july|august|september|october|november|december|" \
+              r"ene|feb|mar|abr|apr|jun|jul|ago|aug|sep|set|oct|nov|dic|dec)\.?"
+
+_DATE_PATTERNS = [
+    re.compile(r"(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})"),
+    re.compile(r"(?P<day>\d{1,2})[/.-](?P<month>\d{1,2})[/.-](?P<year>\d{4}|\d{2})\b"),
+    re.compile(rf"(?P<day>\d{{1,2}})\s+(?:de\s+)?{_MONTH_NAME}\s+(?:de\s+|del\s+)?(?P<year>\d{{4}})", re.IGNORECASE),
+    re.compile(rf"{_MONTH_NAME}\s+(?P<day>\d{{1,2}})(?:st|nd|rd|th)?,?\s+(?P<year>\d{{4}})", re.IGNORECASE),
+]
+
+_DEADLINE_KEYWORDS = re.compile(
+    r"fecha l[ií]mite|fecha de (?:apertura|cierre|presentaci[oó]n|entrega)|plazo de (?:presentaci[oó]n|entrega)|"
+    r"vencimiento|cierre de (?:ofertas|la convocatoria)|recepci[oó]n de (?:ofertas|propuestas)|"
+    r"deadline|due date|closing date|submission date|submissions? (?:due|by)|no later than",
+    re.IGNORECASE
+)
+
+def _to_date(match: re.Match) -> Optional[date]:
+    month_raw = match.group("month")
+    month = int(month_raw) if month_raw.isdigit() else _MONTHS.get(_strip_accents(month_raw.lower())[:3])
+    day = int(match.group("day"))
+    year = int(match.group("year"))
+    if year < 100:
+        year += 2000
+    # Formato numérico ambiguo: asumimos dd/mm (ES) salvo que el "día" no pueda ser mes
+    if month_raw.isdigit() and month > 12 and day <= 12:
+        day, month = month, day
+    try:
+        return date(year, month, day)
+    except (TypeError, ValueError):
+        return None
+
+def extract_deadline(text: str) -> Tuple[Optional[str], float, Optional[int]]:
+    """(YYYY-MM-DD, confianza, posición). Sin un keyword cerca la fecha es solo una candidata débil."""
+    keyword_positions = [m.end() for m in _DEADLINE_KEYWORDS.finditer(text)]
+    candidates = []
+    for pattern in _DATE_PATTERNS:
+        for m in pattern.finditer(text):
+            parsed = _to_date(m)
+            if parsed:
+                candidates.append((_near_keyword(m.start(), keyword_positions, 150), parsed, m.start()))
+
+    if not candidates:
+        return None, 0.0, None
+
+    near_keyword = [c for c in candidates if c[0]]
+    if near_keyword:
+        _, parsed, pos = min(near_keyword, key=lambda c: c[2])
+        return parsed.isoformat(), 0.85, pos
+
+    # Sin contexto: la fecha más tardía del documento (los plazos suelen ser lo último)
+    _, parsed, pos = max(candidates, key=lambda c: c[1])
+    return parsed.isoformat(), 0.3, pos
+
+
+# ==========================================
+# 4. INDUSTRIA (KEYWORD SCORING)
+# ==========================================
+
+INDUSTRY_KEYWORDS: Dict[str, List[str]] = {
+    "Fintech": ["banco", "bancario", "financiero", "pagos", "fintech", "billetera", "tarjeta de credito", "prestamo",
+                "bank", "banking", "payments", "wallet", "credit card", "loan", "insurance", "seguros"],
+    "Health": ["salud", "hospital", "clinica", "medico", "paciente", "sanitario", "farmacia",
+               "health", "healthcare", "patient", "clinical", "medical", "pharmacy"],
+    "Government": ["ministerio", "municipalidad", "municipio", "gobierno", "secretaria de", "organismo publico",
+                   "government", "ministry", "public sector", "municipal", "public agency"],
+    "Construction": ["obra", "construccion", "edificio", "pavimento", "hormigon", "vialidad",
+                     "construction", "building", "civil works", "concrete"],
+    "Logistics": ["logistica", "transporte", "flota", "almacen", "deposito", "distribucion",
+                  "logistics", "transport", "fleet", "warehouse", "shipping", "supply chain"],
+    "E-commerce": ["e-commerce", "ecommerce", "comercio electronico", "tienda online", "marketplace", "carrito de compras",
+                   "online store", "checkout"],
+    "Energy": ["energia", "electrica", "petroleo", "renovable", "solar", "eolica",
+               "energy", "oil and gas", "power plant", "renewable"],
+    "Education": ["educacion", "escuela", "universidad", "alumnos", "docentes",
+                  "education", "school", "university", "students", "e-learning"],
+    "Technology": ["software", "plataforma", "desarrollo", "aplicacion", "cloud", "nube", "api", "base de datos",
+                   "technology", "platform", "application", "database", "devops"],
+}
+# "Technology" aparece en casi todo pliego de software: pesa menos
+INDUSTRY_WEIGHTS = {"Technology": 0.5}
+
+_INDUSTRY_PATTERNS = {
+    industry: re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")", re.IGNORECASE)
+    for industry, keywords in INDUSTRY_KEYWORDS.items()
+}
+
+def classify_industry(text: str) -> Tuple[Optional[str], float]:
+    normalized = _strip_accents(text)
+    scores = {
+        industry: len(pattern.findall(normalized)) * INDUSTRY_WEIGHTS.get(industry, 1.0)
+        for industry, pattern in _INDUSTRY_PATTERNS.items()
+    }
+    total = sum(scores.values())
+    if total == 0:
+        return None, 0.0
+    best = max(scores, key=scores.get)
+    share = scores[best] / total
+    # Pocas menciones = poca evidencia aunque el share sea alto
+    evidence = min(1.0, scores[best] / 5)
+    return best, round(share * evidence, 3)
+
+
+# ==========================================
+# 5. COMPLEJIDAD (HEURÍSTICA)
+# ==========================================
+
+_REQUIREMENT_MARKERS = re.compile(
+    r"\b(?:debera|deberan|se requiere|requisito|obligatorio|integracion|migracion|must|shall|required|requirement|integration|migration)\b",
+    re.IGNORECASE
+)
+
+def estimate_complexity(text: str) -> Tuple[str, float]:
+    """Low/Medium/High por cantidad de requisitos y largo. Confianza baja a propósito: es orientativa (no va al modelo)."""
+    markers = len(_REQUIREMENT_MARKERS.findall(_strip_accents(text)))
+    if markers >= 40 or len(text) > 60000:
+        return "High", 0.5
+    if markers <= 5 and len(text) < 8000:
+        return "Low", 0.5
+    return "Medium", 0.4
+
+
+# ==========================================
+# 6. API
+# ==========================================
+
+def extract_local(text: str) -> Dict[str, dict]:
+    """
+    {campo: {"value", "confidence", "position"}} para industry, budget, deadline y complexity.
+    technical_score no sale del pliego (depende del match con la empresa): lo completa rag_service.
+    """
+    budget, budget_conf, budget_pos = extract_budget(text)
+    deadline, deadline_conf, deadline_pos = extract_deadline(text)
+    industry, industry_conf = classify_industry(text)
+    complexity, complexity_conf = estimate_complexity(text)
+    return {
+        "budget": {"value": budget, "confidence": budget_conf, "position": budget_pos},
+        "deadline": {"value": deadline, "confidence": deadline_conf, "position": deadline_pos},
+        "industry": {"value": industry, "confidence": industry_conf, "position": None},
+        "complexity": {"value": complexity, "confidence": complexity_conf, "position": None},
+        "technical_score": {"value": None, "confidence": 0.0, "position": None},
+    }
+
+def relevant_windows(text: str, fields: List[str], local: Dict[str, dict], max_chars: int = 4000) -> str:
+    """Texto mínimo para que el LLM resuelva los campos pendientes (en vez de los primeros 4000 chars)."""
+    spans: List[Tuple[int, int]] = [(0, 1500)]  # Objeto/alcance: suele estar al principio
+    for field, keywords in (("budget", _BUDGET_KEYWORDS), ("deadline", _DEADLINE_KEYWORDS)):
+        if field not in fields:
+            continue
+        position = local[field]["position"]
+        positions = [position] if position is not None else [m.start() for m in keywords.finditer(text)][:3]
+        spans.extend((max(0, p - 300), p + 300) for p in positions)
+    if "technical_score" in fields or "complexity" in fields:
+        spans.extend((max(0, m.start() - 200), m.start() + 400) for m in list(_REQUIREMENT_MARKERS.finditer(text))[:3])
+
+    # Unimos ventanas solapadas y cortamos al presupuesto de caracteres
+    spans.sort()
+    merged: List[List[int]] = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    out, used = [], 0
+    for start, end in merged:
+        piece = text[start:min(end, start + max_chars - used)]
+        out.append(piece)
+        used += len(piece)
+        if used >= max_chars:
+            break
+    return "\n[...]\n".join(out)
@@ -1,38 +1,174 @@
-from pypdf import PdfReader
 from fastapi import UploadFile
-import io
+import mmap
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+from app.core import instrumentation, metrics
+from app.core.config import settings
 
 # 1. Importamos la función de limpieza que creaste en el paso anterior
 from app.utils.text_processing import clean_text_for_rag
 
-def extract_text_from_pdf(file: UploadFile) -> str:
+# Extracción de texto con backends intercambiables (PDF_BACKEND):
+#   pypdf       rápido, sin análisis de layout (default de la base de conocimiento)
+#   pdfplumber  el más lento (pdfminer + objetos por caracter); mejor en tablas/columnas
+#   pdfminer    pdfminer.six directo con laparams=None (sin análisis de layout): intermedio
+#   auto        pypdf primero; si la densidad de texto es pobre (pocos caracteres por página o
+#               mucho '(cid:'/U+FFFD) se reintenta con PDF_FALLBACK_BACKEND y gana el que extrajo más
+
+PDF_FALLBACKS = metrics.counter("pdf_backend_fallback_total", "PDFs re-extraídos con el backend pesado por densidad pobre (motivo, resultado)")
+
+
+@contextmanager
+def _mapped(source):
     """
-    Extrae y LIMPIA texto de un archivo PDF subido vía FastAPI.
+    Ruta -> mmap de solo lectura. PdfReader(ruta) hace fh.read() + BytesIO (el PDF entero en memoria);
+    con el mmap las páginas las carga el kernel a demanda y son page cache, no heap del worker.
     """
-    try:
-        # Aseguramos cursor al inicio
-        file.file.seek(0)
-        
-        content = file.file.read()
-        pdf_stream = io.BytesIO(content)
-        
-        reader = PdfReader(pdf_stream)
-        text = ""
-        
+    if not isinstance(source, str):
+        yield source
+        return
+    with open(source, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+def count_pages(path: str) -> int:
+    """Páginas del PDF sin extraer texto (solo xref + árbol de páginas)."""
+    from pypdf import PdfReader
+    with _mapped(path) as source:
+        return len(PdfReader(source).pages)
+
+
+# ==========================================
+# BACKENDS: fuente (ruta o stream) -> (texto crudo, páginas)
+# ==========================================
+
+@instrumentation.timed("pdf.parse.pypdf")
+def _raw_pypdf(source) -> Tuple[str, int]:
+    from pypdf import PdfReader
+    text = ""
+
+    with _mapped(source) as stream:
+        reader = PdfReader(stream)
         for page in reader.pages:
             extracted = page.extract_text()
             if extracted:
                 # Concatenamos todo el texto crudo primero
                 text += extracted + "\n"
-        
-        # 2. MAGIA AQUÍ: Pasamos el texto crudo por tu filtro de limpieza
-        # Esto arregla las tildes, une palabras cortadas y arregla saltos de línea.
-        clean_text = clean_text_for_rag(text)
-                
-        return clean_text
+        return text, len(reader.pages)
+
+@instrumentation.timed("pdf.parse.pdfplumber")
+def _raw_pdfplumber(source) -> Tuple[str, int]:
+    # Con ruta, pdfminer lee del archivo a demanda: conviene la ruta del upload spooleado y no un BytesIO
+    import pdfplumber
+
+    text_content = ""
+    with pdfplumber.open(source) as pdf:
+        for page in pdf.pages:
+            extracted = page.extract_text()
+            if extracted:
+                text_content += extracted + "\n"
+            # pdfplumber cachea chars/objetos de layout de cada página hasta cerrar el PDF:
+            # sin esto un PDF de 150 páginas sumaba ~1.7 GB de RSS
+            page.close()
+        return text_content, len(pdf.pages)
+
+@instrumentation.timed("pdf.parse.pdfminer")
+def _raw_pdfminer(source) -> Tuple[str, int]:
+    from pdfminer.high_level import extract_text
+    # laparams=None: sin agrupar líneas/bloques (el análisis de layout es lo caro de pdfminer).
+    # Cada página termina en form feed: así se cuentan sin abrir el PDF dos veces.
+    text = extract_text(source, laparams=None)
+    pages = text.count("\f")
+    return text.replace("\f", "\n"), pages
+
+BACKENDS = {
+    "pypdf": _raw_pypdf,
+    "pdfplumber": _raw_pdfplumber,
+    "pdfminer": _raw_pdfminer,
+}
+
+
+def _density(text: str, pages: int) -> Tuple[float, float]:
+    """(caracteres visibles por página, fracción de glifos sin mapear: '(cid:N)' o U+FFFD)."""
+    visible = sum(1 for c in text if not c.isspace())
+    garbled = text.count("(cid:") * 6 + text.count("�")
+    return visible / max(pages, 1), garbled / max(visible, 1)
+
+def _poor_reason(text: str, pages: int) -> Optional[str]:
+    per_page, garbled = _density(text, pages)
+    if per_page < settings.PDF_MIN_CHARS_PER_PAGE:
+        return "sparse"
+    if garbled > settings.PDF_MAX_GARBLED_RATIO:
+        return "garbled"
+    return None
+
+
+def extract(source, backend: Optional[str] = None) -> dict:
+    """
+    Extrae y LIMPIA el texto con el backend pedido (o PDF_BACKEND). Propaga el error si el PDF no se
+    puede leer. Devuelve {"text", "backend", "pages", "fallback"} (fallback = motivo o None).
+    """
+    backend = backend or settings.PDF_BACKEND
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend de PDF desconocido: {backend} (opciones: auto, {', '.join(BACKENDS)})")
+        raw, pages = BACKENDS[backend](source)
+        return {"text": clean_text_for_rag(raw), "backend": backend, "pages": pages, "fallback": None}
+
+    # Fast first: pypdf y solo si el resultado es pobre, el backend pesado
+    heavy = settings.PDF_FALLBACK_BACKEND
+    try:
+        raw, pages = _raw_pypdf(source)
+        reason = _poor_reason(raw, pages)
+    except Exception as e:
+        print(f"⚠️ pypdf no pudo leer el PDF ({e}); probando {heavy}")
+        raw, pages, reason = "", 0, "error"
+    used = "pypdf"
+    if reason:
+        if hasattr(source, "seek"):
+            source.seek(0)
+        try:
+            heavy_raw, heavy_pages = BACKENDS[heavy](source)
+        except Exception:
+            if reason == "error":
+                raise
+            heavy_raw, heavy_pages = "", 0
+        # Gana el que extrajo más texto visible (un escaneado sin OCR da poco con cualquiera)
+        better = _density(heavy_raw, 1)[0] > _density(raw, 1)[0]
+        PDF_FALLBACKS.inc(reason=reason, result="heavy" if better else "pypdf")
+        if better:
+            raw, pages, used = heavy_raw, heavy_pages or pages, heavy
+    return {"text": clean_text_for_rag(raw), "backend": used, "pages": pages, "fallback": reason}
+
+def extract_text(source, backend: Optional[str] = None) -> str:
+    """Texto limpio con el backend configurado; propaga el error (el caller responde "PDF ilegible")."""
+    return extract(source, backend)["text"]
+
+
+def extract_text_from_pdf(file: UploadFile) -> str:
+    """
+    Extrae y LIMPIA texto de un archivo PDF subido vía FastAPI.
+    """
+    try:
+        # Aseguramos cursor al inicio. Se lee directo del SpooledTemporaryFile (sin copiarlo a bytes)
+        file.file.seek(0)
+
+        return extract_text(file.file)
 
     except Exception as e:
         print(f"Error parseando PDF: {e}")
         return ""
     finally:
-        file.file.seek(0)
\ No newline at end of file
+        file.file.seek(0)
+
+def extract_text_from_path(path: str) -> str:
+    """Igual que extract_text_from_pdf pero desde un archivo en disco (jobs en background)."""
+    try:
+        return extract_text(path)
+    except Exception as e:
+        print(f"Error parseando PDF: {e}")
+        return ""
+
+def extract_text_with_pdfplumber(source) -> str:
+    """Extracción con pdfplumber forzado (propaga el error, como extract_text)."""
+    return extract_text(source, backend="pdfplumber")
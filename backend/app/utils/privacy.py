@@ -1,70 +1,237 @@
+import re
 import logging
-from presidio_analyzer import AnalyzerEngine
-from presidio_analyzer.nlp_engine import NlpEngineProvider # <--- IMPORTANTE
-from presidio_anonymizer import AnonymizerEngine
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+from app.core.config import settings
+from app.core import instrumentation
 
 # Configuramos logs
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("privacy_module")
 
-# --- CONFIGURACIÓN PARA RENDER (BAJO CONSUMO) ---
-# Forzamos el uso del modelo 'sm' (Small - 12MB) para no saturar la RAM
-try:
-    nlp_configuration = {
-        "nlp_engine_name": "spacy",
-        "models": [{"lang_code": "en", "model_name": "en_core_web_sm"}],
-    }
-    provider = NlpEngineProvider(nlp_configuration=nlp_configuration)
-    
-    # Iniciamos el motor con la configuración ligera
-    analyzer = AnalyzerEngine(nlp_engine=provider.create_engine())
-    anonymizer = AnonymizerEngine()
-    
-    logger.info("🛡️ Motor de Privacidad (Small Model) iniciado correctamente.")
-except Exception as e:
-    logger.error(f"❌ Error iniciando Presidio: {e}")
-    analyzer = None
-    anonymizer = None
+# Definimos explícitamente qué queremos buscar.
+# EXCLUIMOS: "PERSON", "LOCATION", "DATE_TIME" para evitar borrar skills.
+ALLOWED_ENTITIES = [
+    "EMAIL_ADDRESS",
+    "PHONE_NUMBER",
+    "CREDIT_CARD",
+    "CRYPTO",
+    "IBAN",
+    "IP_ADDRESS",
+    "US_PASSPORT",
+    "US_SSN"
+]
+SCORE_THRESHOLD = 0.4
+
+# Pre-filtro barato: todas las entidades de ALLOWED_ENTITIES necesitan alguno de estos patrones
+# (un @, una tira de >= 6 dígitos con separadores, una IP, una dirección crypto o un IBAN).
+# Las ventanas sin candidatos no pasan por spaCy/Presidio: cada patrón tiene que ser al menos tan
+# amplio como el recognizer que filtra, o esa PII pasa sin anonimizar.
+_CANDIDATES = re.compile(
+    r"@"
+    r"|\d(?:[\s().\-/]{0,3}\d){5,}"
+    r"|\b\d{1,3}(?:\.\d{1,3}){3}\b"
+    r"|\b[0-9a-fA-F]{0,4}(?::[0-9a-fA-F]{0,4}){2,7}\b"
+    r"|\b(?:bc1|[13])[a-zA-HJ-NP-Z0-9]{25,59}\b" # Mismo patrón que el CryptoRecognizer de Presidio (incluye bech32/taproot)
+    r"|\b[A-Z]{2}\d{2}[A-Z0-9 ]{10,}"
+)
+
+# --- MOTORES (LAZY) ---
+# Presidio + spaCy tardan varios segundos en cargar: no lo pagamos al importar el módulo.
+_analyzer = None
+_anonymizer = None
+_engines_lock = threading.Lock()
+_engines_failed = False
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_engines():
+    """Analyzer de Presidio con spaCy (lo pesado). Se carga una vez por proceso."""
+    global _analyzer, _engines_failed
+    if _analyzer is not None or _engines_failed:
+        return _analyzer
+    with _engines_lock:
+        if _analyzer is None and not _engines_failed:
+            # --- CONFIGURACIÓN PARA RENDER (BAJO CONSUMO) ---
+            # Forzamos el uso del modelo 'sm' (Small - 12MB) para no saturar la RAM
+            try:
+                from presidio_analyzer import AnalyzerEngine
+                from presidio_analyzer.nlp_engine import NlpEngineProvider
+
+                nlp_configuration = {
+                    "nlp_engine_name": "spacy",
+                    "models": [{"lang_code": "en", "model_name": "en_core_web_sm"}],
+                }
+                provider = NlpEngineProvider(nlp_configuration=nlp_configuration)
+
+                # Iniciamos el motor con la configuración ligera
+                _analyzer = AnalyzerEngine(nlp_engine=provider.create_engine())
+                logger.info("🛡️ Motor de Privacidad (Small Model) iniciado correctamente.")
+            except Exception as e:
+                logger.error(f"❌ Error iniciando Presidio: {e}")
+                _engines_failed = True
+    return _analyzer
+
+def _get_anonymizer():
+    """El anonymizer es liviano: si el análisis corre en el pool, el proceso web no carga spaCy."""
+    global _anonymizer
+    if _anonymizer is None:
+        try:
+            from presidio_anonymizer import AnonymizerEngine
+            _anonymizer = AnonymizerEngine()
+        except Exception as e:
+            logger.error(f"❌ Error iniciando Presidio: {e}")
+    return _anonymizer
+
+
+def warmup(parallel: bool = True):
+    """
+    Carga los motores antes del primer upload. Con PII_WORKERS > 0 spaCy se carga en los workers
+    del pool, no en el proceso web (si un texto chico se analiza en proceso, se carga ahí bajo demanda).
+    """
+    _get_anonymizer()
+    if settings.PII_WORKERS == 0:
+        _get_engines()
+    elif parallel:
+        pool = _get_pool()
+        # Un no-op por worker fuerza el initializer (carga de spaCy) en todos
+        list(pool.map(_analyze_window, [("", 0)] * settings.PII_WORKERS))
+
+
+# ==========================================
+# 1. VENTANAS + PRE-FILTRO
+# ==========================================
+
+def _windows(text: str, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Ventanas [start, end) de ~size chars que se solapan `overlap` chars, cortando en espacios.
+    Una entidad más corta que el solape queda entera en al menos una ventana.
+    """
+    spans = []
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(n, start + size)
+        if end < n:
+            cut = text.rfind(" ", start + size - overlap, end)
+            if cut > start:
+                end = cut
+        spans.append((start, end))
+        if end >= n:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+def _candidate_windows(text: str) -> List[Tuple[int, int]]:
+    return [
+        (start, end) for start, end in _windows(text, settings.PII_WINDOW_CHARS, settings.PII_WINDOW_OVERLAP)
+        if _CANDIDATES.search(text, start, end)
+    ]
+
+
+# ==========================================
+# 2. ANÁLISIS (EN PROCESO O EN EL POOL)
+# ==========================================
+
+def _analyze_window(job: Tuple[str, int]) -> List[Tuple[str, int, int, float]]:
+    """Analiza un fragmento y devuelve (tipo, start, end, score) con offsets globales."""
+    chunk, offset = job
+    analyzer = _get_engines()
+    if not chunk or analyzer is None:
+        return []
+    results = analyzer.analyze(
+        text=chunk,
+        language='en',
+        entities=ALLOWED_ENTITIES, # Mantenemos tu filtro de oro
+        score_threshold=SCORE_THRESHOLD
+    )
+    return [(r.entity_type, r.start + offset, r.end + offset, r.score) for r in results]
 
+def _init_worker():
+    _get_engines()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: no heredamos threads/conexiones del proceso web
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PII_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _merge(findings: List[Tuple[str, int, int, float]]) -> List[Tuple[str, int, int, float]]:
+    """
+    Une resultados de ventanas solapadas: la misma entidad aparece dos veces (idéntica)
+    o cortada en el borde de una ventana (se queda la más larga / de mayor score).
+    """
+    merged: List[Tuple[str, int, int, float]] = []
+    for finding in sorted(findings, key=lambda f: (f[1], -(f[2] - f[1]), -f[3])):
+        if merged and finding[1] < merged[-1][2]:
+            last = merged[-1]
+            if (finding[2] - finding[1], finding[3]) > (last[2] - last[1], last[3]):
+                merged[-1] = finding
+            continue
+        merged.append(finding)
+    return merged
+
+def find_pii(text: str) -> List[Tuple[str, int, int, float]]:
+    windows = _candidate_windows(text)
+    if not windows:
+        return []
+    jobs = [(text[start:end], start) for start, end in windows]
+    if settings.PII_WORKERS > 0 and len(jobs) >= settings.PII_PARALLEL_MIN_WINDOWS:
+        try:
+            findings = [f for batch in _get_pool().map(_analyze_window, jobs) for f in batch]
+            return _merge(findings)
+        except Exception as e:
+            logger.error(f"⚠️ Pool de privacidad falló, sigo en proceso: {e}")
+            shutdown_pool()
+    return _merge([f for job in jobs for f in _analyze_window(job)])
+
+
+@instrumentation.timed("pii.sanitize")
 def sanitize_text(text: str) -> str:
     """
     Detecta y anonimiza datos sensibles (PII).
     Versión ajustada para evitar falsos positivos en CVs técnicos.
     Solo censura: Emails, Teléfonos, Tarjetas, Crypto, IPs.
     """
-    if not text or not analyzer:
+    if not text:
+        return text
+    anonymizer = _get_anonymizer()
+    if not anonymizer:
         return text
 
     try:
-        # Definimos explícitamente qué queremos buscar.
-        # EXCLUIMOS: "PERSON", "LOCATION", "DATE_TIME" para evitar borrar skills.
-        allowed_entities = [
-            "EMAIL_ADDRESS", 
-            "PHONE_NUMBER", 
-            "CREDIT_CARD", 
-            "CRYPTO", 
-            "IBAN",
-            "IP_ADDRESS",
-            "US_PASSPORT",
-            "US_SSN"
-        ]
-
-        # 1. Análisis
-        results = analyzer.analyze(
-            text=text, 
-            language='en', 
-            entities=allowed_entities, # Mantenemos tu filtro de oro
-            score_threshold=0.4 
-        )
+        # 1. Análisis (solo ventanas con candidatos, en paralelo si son muchas)
+        findings = find_pii(text)
+        if not findings:
+            return text
 
-        # 2. Anonimización
+        # 2. Anonimización sobre el texto completo con los offsets globales
+        from presidio_anonymizer.entities import RecognizerResult
         anonymized_result = anonymizer.anonymize(
             text=text,
-            analyzer_results=results
+            analyzer_results=[RecognizerResult(entity_type=t, start=s, end=e, score=sc) for t, s, e, sc in findings]
         )
-        
+
         return anonymized_result.text
 
     except Exception as e:
         logger.error(f"⚠️ Error sanitizando texto: {e}")
-        return text
\ No newline at end of file
+        return text
@@ -0,0 +1,166 @@
+import os
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+
+# Manejo de uploads con memoria acotada:
+# - spool(): el UploadFile (que Starlette ya tiene en un SpooledTemporaryFile) se copia a disco
+#   en bloques de 1 MB cortando en UPLOAD_MAX_BYTES; nunca se arma el PDF entero en memoria.
+# - check_pages(): rechaza PDFs con más de UPLOAD_MAX_PAGES páginas leyendo solo el árbol de páginas.
+# - parse_guard(): los parseos grandes (>= UPLOAD_LARGE_BYTES) toman un cupo del semáforo del
+#   worker (UPLOAD_LARGE_PARSE_CONCURRENCY) y se mide el pico de RSS del proceso mientras dura.
+
+CHUNK_BYTES = 1024 * 1024
+
+UPLOAD_BYTES = metrics.histogram("upload_size_bytes", "Tamaño de los PDFs subidos",
+                                 buckets=(1e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8))
+UPLOAD_REJECTED = metrics.counter("upload_rejected_total", "Uploads rechazados por motivo (size, pages, busy, empty)")
+PARSE_RSS_DELTA = metrics.histogram("upload_parse_rss_delta_bytes", "Pico de RSS durante el parseo menos RSS al empezar",
+                                    buckets=(1e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9))
+
+
+class UploadRejectedError(Exception):
+    """Upload fuera de límites (tamaño, páginas) o sin cupo de parseo; status_code va directo al response."""
+
+    def __init__(self, status_code: int, detail: str, reason: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        UPLOAD_REJECTED.inc(reason=reason)
+
+
+def spool(file, path: Optional[str] = None, max_bytes: Optional[int] = None) -> Tuple[str, int]:
+    """Copia el upload a disco (por bloques, con tope de tamaño). Devuelve (ruta, bytes)."""
+    max_bytes = settings.UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    declared = getattr(file, "size", None)
+    if max_bytes and declared and declared > max_bytes:
+        raise UploadRejectedError(413, f"El archivo supera el máximo de {max_bytes // (1024 * 1024)} MB.", "size")
+
+    os.makedirs(settings.UPLOADS_DIR, exist_ok=True)
+    path = path or os.path.join(settings.UPLOADS_DIR, f"spool-{uuid.uuid4().hex}.pdf")
+    size = 0
+    file.file.seek(0)
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = file.file.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadRejectedError(413, f"El archivo supera el máximo de {max_bytes // (1024 * 1024)} MB.", "size")
+                out.write(chunk)
+        if size == 0:
+            raise UploadRejectedError(400, "El archivo está vacío.", "empty")
+    except Exception:
+        discard(path)
+        raise
+    UPLOAD_BYTES.observe(size)
+    return path, size
+
+
+def check_pages(path: str) -> Optional[int]:
+    """Cantidad de páginas (rechaza si pasa UPLOAD_MAX_PAGES). None si no se pudo leer: decide el parser."""
+    from app.utils import pdf_parser
+    try:
+        pages = pdf_parser.count_pages(path)
+    except Exception:
+        return None
+    if settings.UPLOAD_MAX_PAGES and pages > settings.UPLOAD_MAX_PAGES:
+        raise UploadRejectedError(413, f"El PDF tiene {pages} páginas (máximo {settings.UPLOAD_MAX_PAGES}).", "pages")
+    return pages
+
+
+def accept(file, path: Optional[str] = None) -> Tuple[str, dict]:
+    """spool + check_pages. Devuelve (ruta, info del upload para el response)."""
+    path, size = spool(file, path)
+    try:
+        pages = check_pages(path)
+    except UploadRejectedError:
+        discard(path)
+        raise
+    return path, {"size_mb": round(size / 1e6, 2), "pages": pages}
+
+
+def discard(path: Optional[str]):
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ==========================================
+# CUPO DE PARSEOS GRANDES + PICO DE RSS
+# ==========================================
+
+_parse_slots = threading.BoundedSemaphore(max(1, settings.UPLOAD_LARGE_PARSE_CONCURRENCY))
+
+
+def rss_bytes() -> int:
+    """RSS actual del proceso (Linux: /proc/self/statm). 0 si no se puede leer."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class _RSSSampler:
+    """Muestrea el RSS cada UPLOAD_RSS_SAMPLE_MS en un thread mientras dura el parseo."""
+
+    def __init__(self):
+        self.before = rss_bytes()
+        self.peak = self.before
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="rss-sampler", daemon=True)
+
+    def _loop(self):
+        interval = settings.UPLOAD_RSS_SAMPLE_MS / 1000
+        while not self._stop.wait(interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+@contextmanager
+def parse_guard(path: str, report: dict, wait: Optional[float] = None):
+    """
+    Envuelve el parseo de un upload. Si el archivo es grande espera un cupo del semáforo del worker
+    (wait=None espera indefinidamente, como los jobs; los requests inline usan UPLOAD_PARSE_WAIT_SECONDS
+    y responden 503 si no hay cupo). Completa report con el pico de RSS del proceso durante el parseo.
+    """
+    size = os.path.getsize(path)
+    large = size >= settings.UPLOAD_LARGE_BYTES
+    start = time.perf_counter()
+    if large and not _parse_slots.acquire(timeout=wait):
+        raise UploadRejectedError(503, "Demasiados PDFs grandes procesándose; reintentar en unos segundos.", "busy")
+    waited = time.perf_counter() - start
+    try:
+        with _RSSSampler() as sampler:
+            yield
+    finally:
+        if large:
+            _parse_slots.release()
+    report.update({
+        "large": large,
+        "waited_ms": round(waited * 1000, 1),
+        "rss_before_mb": round(sampler.before / 1e6, 1),
+        "rss_peak_mb": round(sampler.peak / 1e6, 1),
+        "rss_delta_mb": round((sampler.peak - sampler.before) / 1e6, 1),
+    })
+    PARSE_RSS_DELTA.observe(sampler.peak - sampler.before)
+    print(f"📄 Parseo de {os.path.basename(path)} ({size / 1e6:.1f} MB): pico RSS {report['rss_peak_mb']} MB "
+          f"(+{report['rss_delta_mb']} MB), espera {report['waited_ms']} ms")
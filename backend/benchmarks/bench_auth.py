@@ -0,0 +1,132 @@
+"""
+Benchmark del costo de autenticación por request (get_current_user).
+
+Genera un par RSA local, escribe un JWKS falso en un archivo temporal (CLERK_JWKS_URL apunta
+ahí) y firma tokens RS256 como los de Clerk. Mide microsegundos por request en cada modo:
+    claims        verificación apagada (solo se leen los claims, el modo actual)
+    verify        firma RSA en cada request (LRU desactivado)
+    cached        mismo token repetido: sale del LRU de tokens verificados
+    mixed         --tokens tokens distintos sorteados (hit rate según tokens vs tamaño del LRU)
+    kid_rotation  token con un kid nuevo: re-descarga del JWKS + verificación (una vez)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_auth
+    python -m benchmarks.bench_auth --requests 20000 --tokens 5000 --cache-size 1000 --out auth.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import tempfile
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwk, jwt
+
+from app.core import security
+from app.core.config import settings
+
+
+def _b64uint(value: int) -> str:
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def make_key(kid: str):
+    """(clave de firma, JWK público) como los que publica Clerk."""
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    numbers = private.public_key().public_numbers()
+    public_jwk = {"kty": "RSA", "kid": kid, "use": "sig", "alg": "RS256", "n": _b64uint(numbers.n), "e": _b64uint(numbers.e)}
+    # Construida una vez: jose re-parsea el PEM en cada encode si se le pasa el string
+    return jwk.construct(pem, "RS256"), public_jwk
+
+
+def write_jwks(path: str, keys: list):
+    with open(path, "w") as fh:
+        json.dump({"keys": keys}, fh)
+
+
+def sign(signing_key, kid: str, user_id: str, ttl: int = 3600) -> str:
+    now = int(time.time())
+    claims = {"sub": user_id, "iat": now, "nbf": now, "exp": now + ttl, "iss": "https://bench.clerk.local"}
+    return jwt.encode(claims, signing_key, algorithm="RS256", headers={"kid": kid})
+
+
+async def _run(tokens: list, requests: int) -> float:
+    credentials = [HTTPAuthorizationCredentials(scheme="Bearer", credentials=t) for t in tokens]
+    # Tokens sorteados (no round-robin, que con más tokens que el LRU nunca pega)
+    rng = random.Random(0)
+    order = [credentials[rng.randrange(len(credentials))] for _ in range(requests)]
+    start = time.perf_counter()
+    for cred in order:
+        await security.get_current_user(cred)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def measure(name: str, tokens: list, requests: int, verify: bool, cache_size: int) -> dict:
+    settings.AUTH_VERIFY_SIGNATURE = verify
+    security.token_cache = security.VerifiedTokenCache(cache_size)
+    hits_before = security.AUTH_CACHE.value(result="hit")
+    us = asyncio.run(_run(tokens, requests))
+    hits = security.AUTH_CACHE.value(result="hit") - hits_before
+    row = {"mode": name, "requests": requests, "distinct_tokens": len(tokens), "cache_size": cache_size,
+           "us_per_request": round(us, 2), "cache_hit_rate": round(hits / requests, 3) if verify else None}
+    print(f"🔐 {name:13s} {row['us_per_request']:>10.2f} µs/request" +
+          (f"  (hit rate {row['cache_hit_rate']:.1%})" if verify else ""))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--tokens", type=int, default=2000, help="Tokens distintos en el modo mixed")
+    parser.add_argument("--cache-size", type=int, default=settings.AUTH_TOKEN_CACHE_SIZE)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_auth_")
+    jwks_path = os.path.join(work_dir, "jwks.json")
+    pem, public_jwk = make_key("bench-key-1")
+    write_jwks(jwks_path, [public_jwk])
+
+    settings.CLERK_JWKS_URL = jwks_path
+    settings.CLERK_ISSUER = "https://bench.clerk.local"
+    settings.JWKS_MIN_REFETCH_SECONDS = 0
+    security._jwks = None
+
+    token = sign(pem, "bench-key-1", "user_bench")
+    many = [sign(pem, "bench-key-1", f"user_{i}") for i in range(args.tokens)]
+
+    results = [
+        measure("claims", [token], args.requests, verify=False, cache_size=0),
+        # La verificación sin cache es ~100x más cara: menos iteraciones alcanzan
+        measure("verify", [token], max(200, args.requests // 10), verify=True, cache_size=0),
+        measure("cached", [token], args.requests, verify=True, cache_size=args.cache_size),
+        measure("mixed", many, args.requests, verify=True, cache_size=args.cache_size),
+    ]
+
+    # Rotación: Clerk publica una clave nueva; el primer token con ese kid fuerza el re-fetch
+    new_pem, new_jwk = make_key("bench-key-2")
+    write_jwks(jwks_path, [public_jwk, new_jwk])
+    rotated = sign(new_pem, "bench-key-2", "user_rotated")
+    settings.AUTH_VERIFY_SIGNATURE = True
+    start = time.perf_counter()
+    asyncio.run(security.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=rotated)))
+    rotation_us = (time.perf_counter() - start) * 1e6
+    results.append({"mode": "kid_rotation", "requests": 1, "us_per_request": round(rotation_us, 2)})
+    print(f"🔐 {'kid_rotation':13s} {rotation_us:>10.2f} µs (primer request con el kid nuevo)")
+
+    security.get_jwks().stop()
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"results": results}, fh, indent=2)
+        print(f"💾 Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
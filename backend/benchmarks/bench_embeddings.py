@@ -0,0 +1,116 @@
+"""
+Benchmark de perfiles de embeddings: recall de la búsqueda vs. bytes por vector.
+
+Para cada combinación de dimensiones (--dims), reducción (api = primeras N dimensiones como
+outputDimensionality, pca = proyección ajustada sobre los documentos) y cuantización (none,
+float16, int8 con escala por vector) reduce documentos y consultas con app/services/embedding_profile.py
+y mide recall@k contra el top-k exacto de los vectores completos en float32.
+
+Sin --vectors usa vectores sintéticos con la varianza concentrada en las primeras dimensiones
+(como un modelo Matryoshka): sirve para comparar perfiles entre sí, no para elegir uno. Para eso,
+volcar vectores reales de gemini-embedding-001 (3072 dims) a un .npy y pasarlo con --vectors.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_embeddings
+    python -m benchmarks.bench_embeddings --vectors chunks.npy --queries 500 --dims 3072,1536,768,256 --out emb.json
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.services import embedding_profile
+from app.services.embedding_profile import FULL_DIM
+
+
+def synthetic_vectors(docs: int, queries: int, topics: int, rng: np.random.Generator):
+    """Documentos agrupados por tema + consultas = documento al azar con ruido (paráfrasis)."""
+    spread = 1.0 / np.sqrt(np.arange(1, FULL_DIM + 1))
+    centers = rng.standard_normal((topics, FULL_DIM)) * spread
+    corpus = centers[rng.integers(0, topics, docs)] + 0.6 * rng.standard_normal((docs, FULL_DIM)) * spread
+    targets = rng.integers(0, docs, queries)
+    probes = corpus[targets] + 0.4 * rng.standard_normal((queries, FULL_DIM)) * spread
+    return embedding_profile.normalize(corpus), embedding_profile.normalize(probes)
+
+
+def top_k(corpus: np.ndarray, probes: np.ndarray, k: int) -> np.ndarray:
+    scores = probes @ corpus.T
+    best = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1)
+    return np.take_along_axis(best, order, axis=1)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def run_profile(corpus, probes, truth, dim: int, reduction: str, quantization: str, k: int, projection) -> dict:
+    profile = embedding_profile.Profile(dim, reduction, quantization)
+    start = time.perf_counter()
+    if reduction == "pca" and profile.reduced:
+        docs, queries = embedding_profile.project(corpus, projection), embedding_profile.project(probes, projection)
+    else:
+        docs, queries = embedding_profile.truncate(corpus, dim), embedding_profile.truncate(probes, dim)
+    # Lo guardado se cuantiza; la consulta se calcula en el momento (float32)
+    stored = np.stack([embedding_profile.dequantize(*embedding_profile.quantize(v, quantization)) for v in docs])
+    found = top_k(stored, queries, k)
+    seconds = time.perf_counter() - start
+    row = {
+        "dim": dim, "reduction": profile.reduction, "quantization": quantization,
+        "bytes_per_vector": profile.bytes_per_vector(),
+        "compression": round(FULL_DIM * 4 / profile.bytes_per_vector(), 1),
+        f"recall@{k}": round(recall(found, truth), 4),
+        "seconds": round(seconds, 3),
+    }
+    print(f"🧮 {dim:>5} {profile.reduction:4s} {quantization:8s} {row['bytes_per_vector']:>7} B/vector  "
+          f"x{row['compression']:<6} recall@{k} {row[f'recall@{k}']:.3f}")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", help=".npy (n, 3072) con embeddings reales; sin esto, sintéticos")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--dims", default="3072,1536,768,256,128")
+    parser.add_argument("--quantizations", default="none,float16,int8")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.vectors:
+        vectors = embedding_profile.normalize(np.load(args.vectors))
+        if vectors.shape[1] != FULL_DIM:
+            raise SystemExit(f"Se esperaban vectores de {FULL_DIM} dimensiones (hay {vectors.shape[1]})")
+        # Las consultas salen del propio corpus con ruido: sin consultas reales es la aproximación más honesta
+        probes = vectors[rng.integers(0, len(vectors), args.queries)]
+        probes = embedding_profile.normalize(probes + 0.02 * rng.standard_normal(probes.shape))
+        corpus = vectors
+    else:
+        corpus, probes = synthetic_vectors(args.docs, args.queries, args.topics, rng)
+    truth = top_k(corpus, probes, args.k)
+    print(f"📚 {len(corpus)} documentos, {len(probes)} consultas ({args.vectors or 'sintéticos'})")
+
+    dims = [int(d) for d in args.dims.split(",") if d.strip()]
+    quantizations = [q.strip() for q in args.quantizations.split(",") if q.strip()]
+    results = []
+    for dim in dims:
+        reductions = ["api"] if dim >= FULL_DIM else ["api", "pca"]
+        for reduction in reductions:
+            projection = embedding_profile.fit_pca(corpus, dim) if reduction == "pca" else None
+            for quantization in quantizations:
+                results.append(run_profile(corpus, probes, truth, dim, reduction, quantization, args.k, projection))
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"vectors": args.vectors or "synthetic", "docs": len(corpus), "queries": len(probes),
+                       "k": args.k, "results": results}, fh, indent=2)
+        print(f"💾 Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
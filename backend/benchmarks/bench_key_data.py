@@ -0,0 +1,168 @@
+"""
+Benchmark de extract_key_data: extractor local vs LLM-only (primeros 4000 chars) vs híbrido.
+
+Corpus sintético etiquetado (pliegos ES/EN con presupuesto y deadline en posiciones y
+formatos variados, muchas veces después del char 4000, que es donde el LLM-only los pierde).
+
+El camino local también cuenta cuántos uploads seguirían necesitando una llamada al LLM
+(campos sin confianza suficiente; technical_score y complexity nunca van al LLM).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_key_data                # solo local
+    python -m benchmarks.bench_key_data --llm --n 30   # + LLM-only e híbrido (requiere GOOGLE_API_KEY)
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from app.utils import key_data_extractor
+
+MONTHS_ES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+MONTHS_EN = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+TOPICS = {
+    "Health": ("un sistema de turnos para el hospital y la gestión de pacientes", "a patient scheduling system for the hospital and clinical staff"),
+    "Fintech": ("una billetera digital con pagos y tarjeta de credito para el banco", "a digital wallet with payments for the bank's credit card customers"),
+    "Logistics": ("el seguimiento de flota y almacen para la distribucion", "fleet tracking and warehouse management for shipping"),
+    "Education": ("una plataforma para alumnos y docentes de la universidad", "a learning platform for university students and school teachers"),
+    "Energy": ("el monitoreo de la planta solar y energia renovable", "monitoring of the renewable energy power plant"),
+}
+
+FILLER_ES = "El oferente deberá cumplir con la normativa vigente y presentar la documentación respaldatoria. "
+FILLER_EN = "The bidder shall comply with applicable regulations and provide supporting documentation. "
+
+
+def _fmt_amount_es(value: int, rng: random.Random) -> str:
+    style = rng.choice(["dots", "millones", "ars"])
+    if style == "dots":
+        return "$ " + f"{value:,}".replace(",", ".") + ",00"
+    if style == "millones":
+        return f"$ {value / 1e6:g}".replace(".", ",") + " millones"
+    return f"ARS {value:,}".replace(",", ".")
+
+
+def _fmt_amount_en(value: int, rng: random.Random) -> str:
+    style = rng.choice(["commas", "million", "usd"])
+    if style == "commas":
+        return f"${value:,}.00"
+    if style == "million":
+        return f"USD {value / 1e6:g} million"
+    return f"{value:,} USD"
+
+
+def make_document(rng: random.Random) -> dict:
+    industry = rng.choice(list(TOPICS))
+    lang = rng.choice(["es", "en"])
+    budget = rng.choice([1, 2, 5, 10, 25, 40]) * rng.choice([100_000, 250_000, 1_000_000])
+    deadline = date(2025, 1, 1) + timedelta(days=rng.randint(0, 700))
+    other_date = deadline - timedelta(days=rng.randint(30, 200))
+    filler_reps = rng.randint(10, 120)  # 1k a 12k chars antes de los datos clave
+
+    if lang == "es":
+        deadline_txt = rng.choice([
+            f"{deadline.day} de {MONTHS_ES[deadline.month - 1]} de {deadline.year}",
+            deadline.strftime("%d/%m/%Y"),
+        ])
+        text = (
+            f"PLIEGO DE BASES Y CONDICIONES. Publicado el {other_date.strftime('%d/%m/%Y')}.\n"
+            f"Objeto: contratación del desarrollo de {TOPICS[industry][0]}.\n"
+            + FILLER_ES * filler_reps
+            + f"\nEl presupuesto oficial es de {_fmt_amount_es(budget, rng)}.\n"
+            + FILLER_ES * rng.randint(0, 20)
+            + f"\nFecha límite de presentación de ofertas: {deadline_txt}.\n"
+        )
+    else:
+        deadline_txt = rng.choice([
+            f"{MONTHS_EN[deadline.month - 1]} {deadline.day}, {deadline.year}",
+            deadline.isoformat(),
+        ])
+        text = (
+            f"REQUEST FOR PROPOSALS. Issued on {other_date.isoformat()}.\n"
+            f"Scope: development of {TOPICS[industry][1]}.\n"
+            + FILLER_EN * filler_reps
+            + f"\nThe estimated contract value is {_fmt_amount_en(budget, rng)}.\n"
+            + FILLER_EN * rng.randint(0, 20)
+            + f"\nSubmission deadline: {deadline_txt}.\n"
+        )
+    return {"text": text, "label": {"industry": industry, "budget": budget, "deadline": deadline.isoformat()}}
+
+
+def _score(pred: dict, label: dict) -> dict:
+    budget = pred.get("budget") or 0
+    return {
+        "industry": pred.get("industry") == label["industry"],
+        "budget": abs(float(budget) - label["budget"]) <= 0.01 * label["budget"],
+        "deadline": pred.get("deadline") == label["deadline"],
+    }
+
+
+def _run(name: str, fn, corpus: list) -> dict:
+    latencies, hits = [], {"industry": 0, "budget": 0, "deadline": 0}
+    for doc in corpus:
+        start = time.perf_counter()
+        try:
+            pred = fn(doc["text"])
+        except Exception as e:
+            print(f"⚠️ {name}: {e}")
+            pred = {}
+        latencies.append(time.perf_counter() - start)
+        for field, ok in _score(pred, doc["label"]).items():
+            hits[field] += ok
+    latencies.sort()
+    result = {
+        "path": name,
+        "docs": len(corpus),
+        "accuracy": {f: round(h / len(corpus), 3) for f, h in hits.items()},
+        "latency_ms": {
+            "p50": round(statistics.median(latencies) * 1000, 3),
+            "p95": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 3),
+            "total": round(sum(latencies) * 1000, 1),
+        },
+    }
+    print(f"📊 {name}: {result['accuracy']} | p50 {result['latency_ms']['p50']}ms p95 {result['latency_ms']['p95']}ms")
+    return result
+
+
+def _local(text: str) -> dict:
+    return {f: v["value"] for f, v in key_data_extractor.extract_local(text).items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=500, help="Documentos del corpus")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--llm", action="store_true", help="Incluir caminos con Gemini (cuesta tokens)")
+    parser.add_argument("--out", help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [make_document(rng) for _ in range(args.n)]
+    results = [_run("local", _local, corpus)]
+
+    # Uploads que igual necesitan una llamada al LLM (algún campo del pliego sin confianza suficiente)
+    from app.services import rag_service
+    pending = [rag_service.pending_key_data_fields(key_data_extractor.extract_local(doc["text"])) for doc in corpus]
+    needs_llm = sum(1 for fields in pending if fields)
+    results[0]["llm_calls"] = needs_llm
+    print(f"🤖 Necesitan LLM: {needs_llm}/{len(corpus)} uploads "
+          f"({', '.join(sorted({f for fields in pending for f in fields})) or 'ningún campo'})")
+
+    if args.llm:
+        from app.core.config import settings
+        from app.services import rag_service
+        if not settings.GOOGLE_API_KEY:
+            raise SystemExit("❌ --llm requiere GOOGLE_API_KEY")
+        results.append(_run("llm_only_4000", lambda t: rag_service._extract_key_data_llm(t[:4000], "benchmark"), corpus))
+        results.append(_run("hybrid", lambda t: rag_service.extract_key_data(t, "benchmark"), corpus))
+
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"seed": args.seed, "results": results}, fh, indent=2)
+        print(f"💾 Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark de backends de extracción de PDF sobre un corpus (app/utils/pdf_parser.py).
+
+Para cada backend (auto, pypdf, pdfminer, pdfplumber) extrae todos los PDFs del corpus y reporta
+páginas/seg, caracteres extraídos (texto limpio), errores y, para auto, cuántos PDFs cayeron al
+backend pesado. Sin --corpus se genera uno sintético (benchmarks/synthetic.py) con PDFs de distintos
+tamaños y uno "pobre" (pocas líneas por página) para ejercitar el fallback de auto.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_pdf
+    python -m benchmarks.bench_pdf --corpus ~/pliegos --backends auto,pypdf,pdfplumber --out pdf.json
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from app.utils import pdf_parser
+from benchmarks.synthetic import make_pdf
+
+
+def synthetic_corpus(directory: str, rng: random.Random) -> list:
+    specs = [("small", 2, 45), ("medium", 20, 45), ("large", 120, 45), ("sparse", 10, 1)]
+    paths = []
+    for name, pages, lines in specs:
+        path = os.path.join(directory, f"{name}_{pages}p.pdf")
+        with open(path, "wb") as fh:
+            fh.write(make_pdf(pages, rng, lines_per_page=lines))
+        paths.append(path)
+    return paths
+
+
+def find_pdfs(directory: str) -> list:
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory)
+                  for name in names if name.lower().endswith(".pdf"))
+
+
+def run_backend(backend: str, paths: list, repeat: int) -> dict:
+    files, pages, chars, errors, fallbacks, seconds = [], 0, 0, 0, 0, 0.0
+    for path in paths:
+        best, result, error = None, None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                result = pdf_parser.extract(path, backend=backend)
+            except Exception as e:
+                error = str(e)
+                break
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if error:
+            errors += 1
+            files.append({"file": os.path.basename(path), "error": error})
+            continue
+        seconds += best
+        pages += result["pages"]
+        chars += len(result["text"])
+        fallbacks += 1 if result["backend"] != "pypdf" and backend == "auto" else 0
+        files.append({"file": os.path.basename(path), "pages": result["pages"], "chars": len(result["text"]),
+                      "seconds": round(best, 4), "used": result["backend"], "fallback": result["fallback"]})
+    row = {
+        "backend": backend, "files": len(paths), "pages": pages, "chars": chars, "seconds": round(seconds, 3),
+        "pages_per_sec": round(pages / seconds, 1) if seconds else None, "errors": errors, "per_file": files,
+    }
+    if backend == "auto":
+        row["fallbacks"] = fallbacks
+    print(f"📄 {backend:10s} {row['pages_per_sec'] or 0:>9.1f} pág/s  {pages:>6} págs  {chars:>10} chars  "
+          f"{seconds:>7.2f} s  errores {errors}" + (f"  fallback {fallbacks}" if backend == "auto" else ""))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="Directorio con PDFs (recursivo). Sin esto, corpus sintético")
+    parser.add_argument("--backends", default="auto," + ",".join(pdf_parser.BACKENDS))
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por archivo (se toma la mejor)")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    paths = find_pdfs(args.corpus) if args.corpus else synthetic_corpus(tempfile.mkdtemp(prefix="bench_pdf_"), random.Random(7))
+    if not paths:
+        raise SystemExit("No hay PDFs en el corpus")
+    print(f"📚 Corpus: {len(paths)} PDFs ({sum(os.path.getsize(p) for p in paths) / 1e6:.1f} MB)")
+
+    results = [run_backend(b.strip(), paths, args.repeat) for b in args.backends.split(",") if b.strip()]
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"corpus": args.corpus or "synthetic", "results": results}, fh, indent=2)
+        print(f"💾 Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark de la predicción de una licitación: pipeline de sklearn vs predictor compilado.
+
+Entrena el modelo de un tenant sintético por cada tamaño y mide µs por predicción de:
+    pipeline      DataFrame de 1 fila + pipeline.predict_proba (el camino anterior)
+    fast          FastPredictor.predict_one (arrays de numpy, sin pandas)
+    predict_bid   ml_service.predict_bid completo con ML_FAST_PREDICT on/off (sin SHAP si no está instalado)
+y el error máximo contra predict_proba sobre --check entradas al azar (incluye industrias desconocidas).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_predict
+    python -m benchmarks.bench_predict --rows 500,5000 --requests 2000 --out predict.json
+"""
+import os
+import tempfile
+
+_DB_DIR = tempfile.mkdtemp(prefix="bench_predict_")
+os.environ.setdefault("SQL_DATABASE_URL", f"sqlite:///{_DB_DIR}/bench.db")
+os.environ.setdefault("JOB_WORKERS", "0")
+os.environ.setdefault("MODEL_STORE_DIR", os.path.join(_DB_DIR, "models"))
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app.core import data_factory
+from app.core.config import settings
+from app.db.session import Base, SessionLocal, engine
+from app.services import ml_service
+
+
+def _us_per_call(fn, requests: int) -> float:
+    for _ in range(min(50, requests)):
+        fn()
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def random_inputs(n: int, rng: random.Random) -> pd.DataFrame:
+    industries = data_factory.INDUSTRIES + ["Desconocida"]
+    return pd.DataFrame([{
+        "industry": rng.choice(industries),
+        "budget": rng.uniform(1_000, 600_000),
+        "technical_score": rng.uniform(0, 100),
+        "days_deadline": rng.randint(0, 120),
+    } for _ in range(n)])
+
+
+def run_size(rows: int, requests: int, check: int, rng: random.Random) -> dict:
+    user_id = f"bench-fast-{rows}"
+    db = SessionLocal()
+    data_factory.generate_historical_data(db, n=rows, user_id=user_id, rng=rng)
+    ml_service.train_model_from_db(db, user_id)
+    db.close()
+
+    artifact = ml_service._load_model(user_id)
+    pipeline, predictor = artifact["pipeline"], artifact["predictor"]
+
+    # Exactitud contra sklearn
+    df = random_inputs(check, rng)
+    expected = pipeline.predict_proba(df)[:, 1]
+    batch = predictor.predict_many(df["industry"].tolist(), df[["budget", "technical_score", "days_deadline"]].to_numpy())
+    single = np.array([predictor.predict_one(*r) for r in df.itertuples(index=False)])
+    error = float(max(np.abs(batch - expected).max(), np.abs(single - expected).max()))
+
+    row = {"industry": "Fintech", "budget": 120_000.0, "technical_score": 75.0, "days_deadline": 20}
+    deadline = (datetime.now() + timedelta(days=20)).strftime("%Y-%m-%d")
+    result = {
+        "rows": rows,
+        "trees": len(predictor.tree_roots),
+        "nodes": int(len(predictor.tree_feature)),
+        "max_depth": predictor.max_depth,
+        "max_abs_error": error,
+        "pipeline_us": _us_per_call(lambda: pipeline.predict_proba(pd.DataFrame([row])), max(20, requests // 20)),
+        "fast_us": _us_per_call(lambda: predictor.predict_one(*row.values()), requests),
+    }
+    for fast in (False, True):
+        settings.ML_FAST_PREDICT = fast
+        ml_service._model_cache.clear()
+        n = requests if fast else max(20, requests // 20)
+        result[f"predict_bid_{'fast' if fast else 'pipeline'}_us"] = _us_per_call(
+            lambda: ml_service.predict_bid("Fintech", 120_000, 75, deadline, user_id), n)
+    ml_service.delete_model(user_id)
+
+    result = {k: round(v, 2) if isinstance(v, float) and k != "max_abs_error" else v for k, v in result.items()}
+    print(f"🌲 {rows:>6} filas ({result['trees']} árboles, {result['nodes']} nodos, prof. {result['max_depth']}): "
+          f"pipeline {result['pipeline_us']:.0f} µs | fast {result['fast_us']:.1f} µs "
+          f"(x{result['pipeline_us'] / result['fast_us']:.0f}) | error máx {error:.1e}")
+    print(f"   predict_bid: pipeline {result['predict_bid_pipeline_us']:.0f} µs | fast {result['predict_bid_fast_us']:.0f} µs")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="100,1000,5000", help="Licitaciones de entrenamiento (separadas por coma)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--check", type=int, default=2000, help="Entradas al azar para comparar contra predict_proba")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    results = [run_size(int(r), args.requests, args.check, rng) for r in args.rows.split(",")]
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump({"results": results}, fh, indent=2)
+        print(f"💾 Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Benchmark de modos de servidor: requests/seg y memoria por worker.
+
+Compara el setup anterior (uvicorn --reload, un proceso + file watcher) con gunicorn.conf.py
+(N workers uvicorn con preload). Levanta el server como subproceso sobre SQLite, le pega con
+K clientes concurrentes durante D segundos y mide RSS y PSS de cada proceso del árbol.
+PSS reparte las páginas compartidas entre los procesos que las usan: es la métrica que
+muestra el ahorro del copy-on-write (RSS las cuenta completas en cada worker).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_server --mode uvicorn-reload
+    python -m benchmarks.bench_server --mode gunicorn --workers 4
+    python -m benchmarks.bench_server --mode gunicorn --workers 4 --no-preload --out gunicorn_nopreload.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _command(mode: str, port: int) -> list:
+    if mode == "uvicorn-reload":
+        return [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--reload"]
+    if mode == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)]
+    return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "app.main:app"]
+
+
+def _children(pid: int) -> list:
+    """PIDs descendientes (Linux: /proc/<pid>/task/*/children)."""
+    found = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as fh:
+                for child in fh.read().split():
+                    found.append(int(child))
+                    found.extend(_children(int(child)))
+    except FileNotFoundError:
+        pass
+    return found
+
+
+def _memory(pid: int) -> dict:
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Shared_Clean", "Private_Dirty"):
+                    values[key.lower()] = int(rest.split()[0]) / 1024  # MB
+        with open(f"/proc/{pid}/cmdline") as fh:
+            values["cmd"] = fh.read().replace("\0", " ").strip()[:80]
+    except FileNotFoundError:
+        return {}
+    values["pid"] = pid
+    return values
+
+
+def _wait_ready(url: str, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"❌ El server no respondió en {timeout}s")
+
+
+def _load(base_url: str, path: str, concurrency: int, duration: float) -> dict:
+    counts = {"ok": 0, "errors": 0}
+    latencies = []
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def worker():
+        local_ok, local_err, local_lat = 0, 0, []
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            while time.time() < stop_at:
+                start = time.perf_counter()
+                try:
+                    ok = client.get(path).status_code < 500
+                except httpx.HTTPError:
+                    ok = False
+                local_lat.append(time.perf_counter() - start)
+                if ok:
+                    local_ok += 1
+                else:
+                    local_err += 1
+        with lock:
+            counts["ok"] += local_ok
+            counts["errors"] += local_err
+            latencies.extend(local_lat)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    latencies.sort()
+    pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2) if latencies else None
+    return {
+        "requests": counts["ok"] + counts["errors"],
+        "errors": counts["errors"],
+        "rps": round((counts["ok"] + counts["errors"]) / elapsed, 1),
+        "latency_ms": {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["uvicorn-reload", "uvicorn", "gunicorn"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--no-preload", action="store_true", help="gunicorn sin WEB_PRELOAD_ARTIFACTS")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default="/health/live", help="Endpoint a cargar")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="bench_server_")
+    env = dict(
+        os.environ,
+        SQL_DATABASE_URL=f"sqlite:///{db_dir}/bench.db",
+        JOB_WORKERS="0",
+        WEB_WORKERS=str(args.workers),
+        WEB_PRELOAD_ARTIFACTS="false" if args.no_preload else "true",
+    )
+    proc = subprocess.Popen(_command(args.mode, args.port), cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        _wait_ready(base_url + "/health/live", timeout=120)
+        time.sleep(2)  # Que terminen de levantar todos los workers
+        load = _load(base_url, args.path, args.concurrency, args.duration)
+        processes = [m for m in (_memory(pid) for pid in [proc.pid] + _children(proc.pid)) if m]
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    result = {
+        "mode": args.mode,
+        "workers": args.workers if args.mode == "gunicorn" else 1,
+        "preload": args.mode == "gunicorn" and not args.no_preload,
+        "path": args.path,
+        "concurrency": args.concurrency,
+        "load": load,
+        "memory_mb": {
+            "total_rss": round(sum(p.get("rss", 0) for p in processes), 1),
+            "total_pss": round(sum(p.get("pss", 0) for p in processes), 1),
+            "processes": processes
+        }
+    }
+    print(json.dumps({k: v for k, v in result.items() if k != "memory_mb"}, indent=2))
+    print(f"🧠 RSS total {result['memory_mb']['total_rss']} MB | PSS total {result['memory_mb']['total_pss']} MB "
+          f"({len(processes)} procesos)")
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Suite de micro-benchmarks offline (sin red): Gemini y Pinecone reemplazados por los fakes
+de benchmarks/fakes.py, DB en SQLite temporal.
+
+Mide cada función con tamaños de entrada crecientes y escribe un JSON comparable entre
+commits (ver benchmarks/compare.py):
+    clean_text_for_rag     chars de texto
+    ingest_text            chars de texto (split + manifest + dedup + embed/upsert fake)
+    extract_text_from_pdf  páginas de un PDF generado
+    sanitize_text          chars de texto con PII sembrada
+    train_model_from_db    licitaciones cerradas del tenant
+    predict_bid            licitaciones con las que se entrenó el modelo (predicción en caliente)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_suite --out bench_$(git rev-parse --short HEAD).json
+    python -m benchmarks.bench_suite --only ingest_text,predict_bid --repeat 10
+    python -m benchmarks.bench_suite --embed-ms 40 --vector-ms 15   # con latencia de red simulada
+    python -m benchmarks.bench_suite --scale 0.1                     # corrida rápida
+"""
+import os
+import sys
+import tempfile
+
+# La DB y los workers se configuran antes de importar la app
+_DB_DIR = tempfile.mkdtemp(prefix="bench_suite_")
+os.environ.setdefault("SQL_DATABASE_URL", f"sqlite:///{_DB_DIR}/bench.db")
+os.environ.setdefault("JOB_WORKERS", "0")
+
+import argparse
+import io
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks import fakes
+from benchmarks.synthetic import WALLETS, make_pdf, make_text
+
+SIZES = {
+    "clean_text_for_rag": ("chars", [1_000, 10_000, 100_000, 1_000_000]),
+    "ingest_text": ("chars", [2_000, 20_000, 100_000]),
+    "extract_text_from_pdf": ("pages", [1, 10, 50]),
+    "sanitize_text": ("chars", [1_000, 10_000, 100_000]),
+    "train_model_from_db": ("rows", [50, 500, 2_000]),
+    "predict_bid": ("rows", [50, 500, 2_000]),
+}
+
+
+def seed_bids(db, user_id: str, rows: int, rng: random.Random):
+    from app.core import data_factory
+    data_factory.generate_historical_data(db, n=rows, user_id=user_id, rng=rng)
+
+
+def _timeit(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# ==========================================
+# CASOS: (tamaño, rng) -> (fn a medir, cleanup)
+# ==========================================
+
+def case_clean_text_for_rag(size, rng):
+    from app.utils.text_processing import clean_text_for_rag
+    text = make_text(size, rng)
+    return lambda: clean_text_for_rag(text), None
+
+
+def case_ingest_text(size, rng):
+    from app.services import rag_service, vector_writer
+    text = make_text(size, rng)
+    run = {"i": 0}
+
+    def fn():
+        # Namespace nuevo por corrida: mide la ingesta completa, no el camino "sin cambios" del manifest
+        run["i"] += 1
+        namespace = f"bench-ingest-{size}-{run['i']}-{rng.random()}"
+        rag_service.ingest_text(text, {"category": "Technical", "source_id": "bench.pdf"}, namespace=namespace)
+        # Incluye el flush del write-behind (embed + upsert), como antes
+        vector_writer.barrier(namespace)
+    return fn, None
+
+
+def case_extract_text_from_pdf(size, rng):
+    from fastapi import UploadFile
+    from app.utils import pdf_parser
+    upload = UploadFile(file=io.BytesIO(make_pdf(size, rng)), filename="bench.pdf")
+    return lambda: pdf_parser.extract_text_from_pdf(upload), None
+
+
+def case_sanitize_text(size, rng):
+    from app.utils import privacy
+    # Chequeo de cobertura: una wallet sola en la ventana tiene que llegar al analizador
+    missed = [w for w in WALLETS if not privacy._candidate_windows(f"Pagos a la wallet {w}.")]
+    if missed:
+        raise AssertionError(f"El pre-filtro de PII no detecta: {missed}")
+    text = make_text(size, rng, pii=True)
+    return lambda: privacy.sanitize_text(text), None
+
+
+def _model_cleanup(user_id):
+    from app.services import ml_service
+
+    def cleanup():
+        ml_service.delete_model(user_id)
+    return cleanup
+
+
+def case_train_model_from_db(size, rng):
+    from app.db.session import SessionLocal
+    from app.services import ml_service
+    user_id = f"bench-train-{size}"
+    db = SessionLocal()
+    seed_bids(db, user_id, size, rng)
+    cleanup = _model_cleanup(user_id)
+
+    def fn():
+        ml_service.train_model_from_db(db, user_id)
+
+    def close():
+        db.close()
+        cleanup()
+    return fn, close
+
+
+def case_predict_bid(size, rng):
+    from app.db.session import SessionLocal
+    from app.services import ml_service
+    user_id = f"bench-predict-{size}"
+    db = SessionLocal()
+    seed_bids(db, user_id, size, rng)
+    ml_service.train_model_from_db(db, user_id)
+    db.close()
+    deadline = (datetime.now() + timedelta(days=20)).strftime("%Y-%m-%d")
+    return lambda: ml_service.predict_bid("Fintech", 120_000, 75, deadline, user_id), _model_cleanup(user_id)
+
+
+CASES = {
+    "clean_text_for_rag": case_clean_text_for_rag,
+    "ingest_text": case_ingest_text,
+    "extract_text_from_pdf": case_extract_text_from_pdf,
+    "sanitize_text": case_sanitize_text,
+    "train_model_from_db": case_train_model_from_db,
+    "predict_bid": case_predict_bid,
+}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _availability() -> dict:
+    """Dependencias opcionales: sin ellas la función mide el camino de fallback (se marca en el JSON)."""
+    found = {}
+    for module in ("presidio_analyzer", "shap", "langchain"):
+        try:
+            __import__(module)
+            found[module] = True
+        except ImportError:
+            found[module] = False
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", help="Casos separados por coma (default: todos)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplica los tamaños (0.1 = corrida rápida)")
+    parser.add_argument("--embed-ms", type=float, default=0.0, help="Latencia simulada por embedding")
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="Latencia simulada por llamada al LLM")
+    parser.add_argument("--vector-ms", type=float, default=0.0, help="Latencia simulada por operación de Pinecone")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    from app.db.session import Base, engine
+    from app.db import models  # noqa: F401 (registra las tablas)
+    Base.metadata.create_all(bind=engine)
+    stack = fakes.install(embed_ms=args.embed_ms, llm_ms=args.llm_ms, vector_ms=args.vector_ms)
+
+    selected = args.only.split(",") if args.only else list(CASES)
+    unknown = [c for c in selected if c not in CASES]
+    if unknown:
+        raise SystemExit(f"❌ Casos desconocidos: {unknown}. Disponibles: {list(CASES)}")
+
+    results = []
+    for case in selected:
+        unit, sizes = SIZES[case]
+        done = set()
+        for base_size in sizes:
+            size = max(1, int(base_size * args.scale))
+            if size in done:
+                continue
+            done.add(size)
+            rng = random.Random(f"{args.seed}-{case}-{size}")
+            fn, cleanup = CASES[case](size, rng)
+            try:
+                fn()  # Warmup (imports, caches, modelo en memoria)
+                samples = _timeit(fn, args.repeat)
+            finally:
+                if cleanup:
+                    cleanup()
+            ordered = sorted(samples)
+            median = statistics.median(samples)
+            row = {
+                "case": case, "size": size, "unit": unit, "repeat": args.repeat,
+                "median_ms": round(median * 1000, 3),
+                "mean_ms": round(statistics.mean(samples) * 1000, 3),
+                "min_ms": round(ordered[0] * 1000, 3),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 3),
+                "per_sec": round(size / median, 1) if median else None,
+            }
+            results.append(row)
+            print(f"⏱️  {case:24s} {size:>9} {unit:5s}  mediana {row['median_ms']:>10.3f} ms  p95 {row['p95_ms']:>10.3f} ms")
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "fakes": {"embed_ms": args.embed_ms, "llm_ms": args.llm_ms, "vector_ms": args.vector_ms, "splitter": stack.splitter},
+            "optional_deps": _availability(),
+            "scale": args.scale,
+            "seed": args.seed,
+        },
+        "results": results,
+        "counters": {"embedding_calls": stack.embeddings.calls, "llm_calls": stack.llm.calls, "index_ops": stack.index.ops},
+    }
+    stack.uninstall()
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"💾 Resultados en {args.out}")
+    else:
+        print(json.dumps(report["meta"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compara dos JSON de benchmarks/bench_suite.py (ej: main vs la rama) por caso y tamaño.
+
+Uso (desde backend/):
+    python -m benchmarks.compare bench_base.json bench_new.json
+    python -m benchmarks.compare bench_base.json bench_new.json --threshold 0.15 --metric min_ms
+
+Sale con código 1 si algún caso empeora más que --threshold (útil en CI).
+"""
+import argparse
+import json
+
+
+def _load(path: str) -> dict:
+    with open(path) as fh:
+        data = json.load(fh)
+    return data["meta"], {(r["case"], r["size"]): r for r in data["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--metric", default="median_ms", choices=["median_ms", "mean_ms", "min_ms", "p95_ms"])
+    parser.add_argument("--threshold", type=float, default=0.10, help="Empeoramiento relativo tolerado (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    base_meta, base = _load(args.base)
+    new_meta, new = _load(args.new)
+    print(f"📊 {base_meta.get('commit')} → {new_meta.get('commit')} ({args.metric}, umbral {args.threshold:.0%})")
+    if base_meta.get("fakes") != new_meta.get("fakes") or base_meta.get("optional_deps") != new_meta.get("optional_deps"):
+        print("⚠️ Las corridas usan fakes o dependencias opcionales distintas: la comparación no es directa")
+
+    regressions = 0
+    print(f"{'caso':24s} {'tamaño':>9}  {'base':>11} {'nuevo':>11}  {'cambio':>8}")
+    for key in sorted(set(base) | set(new)):
+        case, size = key
+        if key not in base or key not in new:
+            print(f"{case:24s} {size:>9}  {'(solo en ' + ('base' if key in base else 'nuevo') + ')':>32}")
+            continue
+        old_value, new_value = base[key][args.metric], new[key][args.metric]
+        change = (new_value - old_value) / old_value if old_value else 0.0
+        mark = ""
+        if change > args.threshold:
+            mark = " ❌"
+            regressions += 1
+        elif change < -args.threshold:
+            mark = " ✅"
+        print(f"{case:24s} {size:>9}  {old_value:>9.3f}ms {new_value:>9.3f}ms  {change:>+7.1%}{mark}")
+
+    if regressions:
+        print(f"❌ {regressions} caso(s) empeoraron más de {args.threshold:.0%}")
+        raise SystemExit(1)
+    print("✅ Sin regresiones por encima del umbral")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Stand-ins locales de Gemini (embeddings + LLM) y Pinecone para correr benchmarks sin red.
+
+install() los enchufa en los globals de rag_service (_embeddings, _llm, _pc_index, _vector_store),
+así get_embeddings()/get_llm()/get_pc_index()/get_vector_store() devuelven los fakes y el resto
+del código corre sin cambios. La latencia de red se simula con time.sleep configurable.
+
+Si langchain no está instalado, también se enchufa un splitter por caracteres equivalente
+(chunk_size/overlap iguales); los resultados lo marcan como "splitter": "fallback".
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+EMBEDDING_DIM = 768
+
+
+def _sleep_ms(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+# ==========================================
+# EMBEDDINGS
+# ==========================================
+
+class FakeEmbeddings:
+    """Vectores determinísticos (bolsa de palabras hasheada): textos parecidos quedan cerca."""
+
+    def __init__(self, latency_ms: float = 0.0, dim: int = EMBEDDING_DIM):
+        self.latency_ms = latency_ms
+        self.dim = dim
+        self.model_name = "fake-embedding"
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=4).digest(), "little")
+            vec[h % self.dim] += 1.0 if h & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Una llamada HTTP por texto, igual que GoogleRawRESTEmbeddings
+        out = []
+        for t in texts:
+            _sleep_ms(self.latency_ms)
+            self.calls += 1
+            out.append(self._vector(t))
+        return out
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# ==========================================
+# LLM
+# ==========================================
+
+@dataclass
+class FakeMessage:
+    content: str
+    usage_metadata: dict = field(default_factory=dict)
+    response_metadata: dict = field(default_factory=dict)
+
+    def __add__(self, other: "FakeMessage") -> "FakeMessage":
+        # Como AIMessageChunk: el stream acumula los chunks con '+'
+        return FakeMessage(
+            content=self.content + other.content,
+            usage_metadata=other.usage_metadata or self.usage_metadata,
+            response_metadata={**self.response_metadata, **other.response_metadata}
+        )
+
+
+def default_responder(prompt: str) -> str:
+    """Respuestas plausibles según el tipo de prompt que arma rag_service."""
+    if "JSON" in prompt or "json" in prompt:
+        return json.dumps({
+            "industry": "Technology", "budget": 150000, "technical_score": 70,
+            "deadline": "2026-12-31", "complexity": "Medium"
+        })
+    if prompt.startswith("Clasifica"):
+        return "Technical"
+    return "Respuesta simulada del LLM. " * 20
+
+
+class FakeLLM:
+    """invoke()/astream() con la forma de ChatGoogleGenerativeAI (content + usage_metadata)."""
+
+    def __init__(self, latency_ms: float = 0.0, token_ms: float = 0.0,
+                 responder: Callable[[str], str] = default_responder):
+        self.latency_ms = latency_ms
+        self.token_ms = token_ms
+        self.responder = responder
+        self.model = "fake-llm"
+        self.calls = 0
+
+    def _usage(self, prompt: str, content: str) -> dict:
+        input_tokens, output_tokens = len(prompt) // 4, len(content) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def invoke(self, prompt: str) -> FakeMessage:
+        self.calls += 1
+        _sleep_ms(self.latency_ms)
+        content = self.responder(prompt)
+        return FakeMessage(content=content, usage_metadata=self._usage(prompt, content))
+
+    async def astream(self, prompt: str):
+        self.calls += 1
+        await asyncio.sleep(self.latency_ms / 1000)
+        content = self.responder(prompt)
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            if self.token_ms:
+                await asyncio.sleep(self.token_ms / 1000)
+            last = i == len(words) - 1
+            yield FakeMessage(
+                content=word + ("" if last else " "),
+                usage_metadata=self._usage(prompt, content) if last else {}
+            )
+
+
+# ==========================================
+# PINECONE
+# ==========================================
+
+@dataclass
+class FakeDocument:
+    page_content: str
+    metadata: dict
+
+
+def _matches(metadata: dict, flt: Optional[dict]) -> bool:
+    for key, cond in (flt or {}).items():
+        value = metadata.get(key)
+        if isinstance(cond, dict):
+            if "$ne" in cond and value == cond["$ne"]:
+                return False
+            if "$eq" in cond and value != cond["$eq"]:
+                return False
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class FakeIndex:
+    """Subconjunto de pinecone.Index que usa el repo: delete (ids/filtro/todo), update, upsert, query, fetch."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.namespaces: Dict[str, Dict[str, tuple]] = {}
+        self.ops = {"delete": 0, "update": 0, "upsert": 0, "query": 0, "fetch": 0}
+        self._lock = threading.Lock()
+
+    def _ns(self, namespace: str) -> dict:
+        return self.namespaces.setdefault(namespace or "", {})
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None, namespace: str = "",
+               delete_all: bool = False, **_):
+        _sleep_ms(self.latency_ms)
+        with self._lock:
+            self.ops["delete"] += 1
+            ns = self._ns(namespace)
+            if delete_all:
+                ns.clear()
+            elif ids is not None:
+                for vid in ids:
+                    ns.pop(vid, None)
+            elif filter is not None:
+                for vid in [v for v, (_, meta) in ns.items() if _matches(meta, filter)]:
+                    del ns[vid]
+
+    def update(self, id: str, set_metadata: Optional[dict] = None, namespace: str = "", **_):
+        _sleep_ms(self.latency_ms)
+        with self._lock:
+            self.ops["update"] += 1
+            ns = self._ns(namespace)
+            if id in ns and set_metadata:
+                values, meta = ns[id]
+                ns[id] = (values, {**meta, **set_metadata})
+
+    def upsert(self, vectors: List[tuple], namespace: str = "", **_):
+        _sleep_ms(self.latency_ms)
+        with self._lock:
+            self.ops["upsert"] += 1
+            ns = self._ns(namespace)
+            for vid, values, meta in vectors:
+                ns[vid] = (np.asarray(values, dtype=np.float32), meta)
+
+    def query(self, vector: List[float], top_k: int = 5, filter: Optional[dict] = None, namespace: str = "", **_):
+        _sleep_ms(self.latency_ms)
+        with self._lock:
+            self.ops["query"] += 1
+            items = [(vid, v, m) for vid, (v, m) in self._ns(namespace).items() if _matches(m, filter)]
+        if not items:
+            return []
+        matrix = np.stack([v for _, v, _ in items])
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        best = np.argsort(-scores)[:top_k]
+        return [(items[i][0], float(scores[i]), items[i][2]) for i in best]
+
+    def fetch(self, ids: List[str], namespace: str = "", **_) -> dict:
+        _sleep_ms(self.latency_ms)
+        with self._lock:
+            self.ops["fetch"] += 1
+            ns = self._ns(namespace)
+            return {"vectors": {vid: {"id": vid, "values": ns[vid][0].tolist(), "metadata": ns[vid][1]}
+                                for vid in ids if vid in ns}}
+
+    def count(self, namespace: str = "") -> int:
+        return len(self._ns(namespace))
+
+
+class FakeVectorStore:
+    """add_texts/similarity_search de PineconeVectorStore sobre FakeIndex (el texto va en metadata, como langchain)."""
+
+    def __init__(self, index: FakeIndex, embeddings: FakeEmbeddings):
+        self.index = index
+        self.embeddings = embeddings
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None,
+                  namespace: str = "", batch_size: int = 100, **_):
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [hashlib.sha1(t.encode()).hexdigest() for t in texts]
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i:i + batch_size]
+            vectors = self.embeddings.embed_documents(batch)
+            self.index.upsert(
+                [(ids[i + j], vectors[j], {**metadatas[i + j], "text": batch[j]}) for j in range(len(batch))],
+                namespace=namespace
+            )
+        return ids
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, namespace: str = "", **_):
+        matches = self.index.query(self.embeddings.embed_query(query), top_k=k, filter=filter, namespace=namespace)
+        return [FakeDocument(page_content=meta.get("text", ""), metadata={k_: v for k_, v in meta.items() if k_ != "text"})
+                for _, _, meta in matches]
+
+
+class FallbackSplitter:
+    """Split por caracteres con solapamiento, cortando en espacios (solo si langchain no está instalado)."""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_text(self, text: str) -> List[str]:
+        chunks, start, n = [], 0, len(text)
+        while start < n:
+            end = min(n, start + self.chunk_size)
+            if end < n:
+                cut = text.rfind(" ", start + self.chunk_size // 2, end)
+                end = cut if cut > start else end
+            chunk = text[start:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            if end >= n:
+                break
+            start = max(start + 1, end - self.chunk_overlap)
+        return chunks
+
+
+# ==========================================
+# INSTALACIÓN
+# ==========================================
+
+@dataclass
+class FakeStack:
+    embeddings: FakeEmbeddings
+    llm: FakeLLM
+    index: FakeIndex
+    vector_store: FakeVectorStore
+    splitter: str
+    _restore: dict
+
+    def uninstall(self):
+        from app.services import rag_service
+        for name, value in self._restore.items():
+            setattr(rag_service, name, value)
+
+
+def install(embed_ms: float = 0.0, llm_ms: float = 0.0, token_ms: float = 0.0, vector_ms: float = 0.0) -> FakeStack:
+    """Reemplaza los clientes de rag_service por los fakes. Devuelve el stack (con uninstall())."""
+    from app.services import rag_service
+
+    names = ("_embeddings", "_llm", "_pc_index", "_vector_store", "_splitter")
+    restore = {name: getattr(rag_service, name) for name in names}
+
+    embeddings = FakeEmbeddings(latency_ms=embed_ms)
+    llm = FakeLLM(latency_ms=llm_ms, token_ms=token_ms)
+    index = FakeIndex(latency_ms=vector_ms)
+    store = FakeVectorStore(index, embeddings)
+
+    rag_service._embeddings = embeddings
+    rag_service._llm = llm
+    rag_service._pc_index = index
+    rag_service._vector_store = store
+
+    splitter = "langchain"
+    try:
+        rag_service._get_splitter()
+    except ImportError:
+        rag_service._splitter = FallbackSplitter(chunk_size=1000, chunk_overlap=200)
+        splitter = "fallback"
+
+    return FakeStack(embeddings, llm, index, store, splitter, restore)
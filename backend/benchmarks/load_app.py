@@ -0,0 +1,20 @@
+"""
+La app real con Gemini y Pinecone reemplazados por los fakes (benchmarks/fakes.py).
+La levanta benchmarks/load_test.py como cualquier ASGI:
+    uvicorn benchmarks.load_app:app
+    gunicorn -c gunicorn.conf.py benchmarks.load_app:app
+
+Latencias simuladas por env (ms): LOAD_EMBED_MS, LOAD_LLM_MS, LOAD_TOKEN_MS, LOAD_VECTOR_MS.
+"""
+import os
+
+from app.main import app  # noqa: F401
+from benchmarks import fakes
+
+stack = fakes.install(
+    embed_ms=float(os.getenv("LOAD_EMBED_MS", "0")),
+    llm_ms=float(os.getenv("LOAD_LLM_MS", "0")),
+    token_ms=float(os.getenv("LOAD_TOKEN_MS", "0")),
+    vector_ms=float(os.getenv("LOAD_VECTOR_MS", "0")),
+)
+print(f"🧪 Fakes instalados (splitter: {stack.splitter})")
@@ -0,0 +1,71 @@
+"""
+Datos sintéticos compartidos por los benchmarks: texto de pliegos (con PII opcional) y
+PDFs mínimos válidos, generados sin dependencias y reproducibles con un random.Random.
+"""
+import io
+import random
+
+WORDS = (
+    "licitación oferta pliego servicio sistema plataforma integración desarrollo mantenimiento "
+    "soporte seguridad datos migración nube infraestructura requerimiento técnico presupuesto "
+    "plazo entrega garantía cumplimiento normativa proveedor contrato evaluación propuesta "
+    "equipo experiencia certificación calidad auditoría disponibilidad escalabilidad usuarios"
+).split()
+
+
+# Direcciones crypto reales de cada formato (legacy, P2SH, bech32, taproot): el pre-filtro de
+# privacy tiene que dejarlas pasar al analizador
+WALLETS = (
+    "1BoatSLRHtKNngkdXEeobR76b53LETtpyT",
+    "3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy",
+    "bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq",
+    "bc1p5d7rjq7g6rdk2yhzks9smlaqtedr4dekq08ge8ztwac72sfr9rusxg3297",
+)
+
+
+def make_text(chars: int, rng: random.Random, pii: bool = False) -> str:
+    """Párrafos pseudo-aleatorios (sin chunks repetidos: el dedup no los descarta)."""
+    parts, total = [], 0
+    while total < chars:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + ". "
+        if pii and rng.random() < 0.05:
+            sentence += f"Contacto: user{rng.randint(1, 9999)}@empresa.com, tel +54 11 {rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}. "
+            if rng.random() < 0.5:
+                sentence += f"Pagos a la wallet {rng.choice(WALLETS)}. "
+        if rng.random() < 0.1:
+            sentence += "\n\n"
+        parts.append(sentence)
+        total += len(sentence)
+    return "".join(parts)[:chars]
+
+
+def make_pdf(pages: int, rng: random.Random, lines_per_page: int = 45) -> bytes:
+    """PDF mínimo válido (Helvetica, texto ASCII) sin dependencias."""
+    def esc(s: str) -> str:
+        return s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    ascii_words = [w.encode("ascii", "ignore").decode() for w in WORDS]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(ascii_words) for _ in range(12)) for _ in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 50 790 Td 14 TL " + " ".join(f"({esc(l)}) '" for l in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        kids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {pages} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for off in offsets:
+        out.write(f"{off:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
@@ -0,0 +1,36 @@
+# Modo producción: gunicorn como process manager + workers uvicorn (ASGI).
+#   gunicorn -c gunicorn.conf.py app.main:app
+# Con preload_app el master importa la app (y con WEB_PRELOAD_ARTIFACTS las librerías pesadas
+# y los modelos ML) antes de forkear: los workers comparten esas páginas por copy-on-write.
+# En desarrollo seguimos con `uvicorn --reload` (ver docker-compose.yml).
+import multiprocessing
+
+from app.core.config import settings
+
+bind = f"0.0.0.0:{settings.WEB_PORT}"
+workers = settings.WEB_WORKERS or multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+timeout = settings.WEB_TIMEOUT
+graceful_timeout = settings.WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+max_requests = settings.WEB_MAX_REQUESTS
+max_requests_jitter = settings.WEB_MAX_REQUESTS // 10
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    # Corre en el master, con la app ya importada y antes de crear los workers
+    if settings.WEB_PRELOAD_ARTIFACTS:
+        from app.core import lifecycle
+        lifecycle.preload()
+    server.log.info(f"Master listo: {workers} workers ({worker_class})")
+
+
+def post_fork(server, worker):
+    # El engine se creó en el master: cada worker arranca con su propio pool de conexiones
+    from app.db.session import engine
+    engine.dispose(close=False)
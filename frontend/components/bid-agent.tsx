@@ -163,14 +163,31 @@ export function BidAgent() {
       const decoder = new TextDecoder()
       let done = false
       let accumulatedText = ""
+      let buffer = ""
 
       while (!done) {
         const { value, done: doneReading } = await reader.read()
         done = doneReading
-        
+
         if (value) {
-          const chunkValue = decoder.decode(value)
-          accumulatedText += chunkValue
+          buffer += decoder.decode(value, { stream: true })
+
+          // SSE: eventos separados por línea en blanco; ignoramos heartbeats (": ping")
+          const events = buffer.split("\n\n")
+          buffer = events.pop() ?? ""
+          for (const rawEvent of events) {
+            let eventName = "message"
+            let data = ""
+            for (const line of rawEvent.split("\n")) {
+              if (line.startsWith("event:")) eventName = line.slice(6).trim()
+              else if (line.startsWith("data:")) data += line.slice(5).trim()
+            }
+            if (!data) continue
+            const payload = JSON.parse(data)
+            if (eventName === "token") accumulatedText += payload.text
+            else if (eventName === "error") accumulatedText += `Error: ${payload.message}`
+          }
+
           setMessages(prev => {
             const newHistory = [...prev]
             if (newHistory[newHistory.length - 1].role === "bot") {
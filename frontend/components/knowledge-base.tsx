@@ -8,6 +8,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@
 import { Checkbox } from "@/components/ui/checkbox"
 import { Upload, Trash2, FileText, Loader2, Sparkles, AlertTriangle, Save, X, Calendar, Tag } from "lucide-react"
 import { useToast } from "@/components/ui/use-toast"
+import { waitForJob } from "@/lib/jobs"
 import {
   AlertDialog,
   AlertDialogAction,
@@ -170,7 +171,7 @@ export function KnowledgeBase() {
           body: formData 
       })
       if (!response.ok) throw new Error("Error")
-      const data = await response.json()
+      const data = await waitForJob(response, token)
       fetchDocuments()
       toast({ title: "✅ Processed", description: `Category detected: ${data.detected_category}`, className: "bg-green-600 text-white border-none" })
     } catch (error) {
@@ -9,6 +9,7 @@ import { Input } from "@/components/ui/input"
 import { Label } from "@/components/ui/label"
 import { Upload, Loader2, FileText, Trophy, XCircle, Clock } from "lucide-react"
 import { useToast } from "@/components/ui/use-toast"
+import { waitForJob } from "@/lib/jobs"
 
 interface UploadHistoryDialogProps {
   open: boolean
@@ -50,6 +51,7 @@ export function UploadHistoryDialog({ open, onOpenChange, onUploadComplete }: Up
       })
 
       if (!res.ok) throw new Error("Upload failed")
+      await waitForJob(res, token)
 
       toast({
         title: "✅ History Saved",
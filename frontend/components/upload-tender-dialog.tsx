@@ -8,6 +8,7 @@ import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } f
 import { Input } from "@/components/ui/input"
 import { Upload, Loader2, CheckCircle, AlertCircle, TrendingUp, DollarSign, Briefcase, MessageSquare, FileText, X } from "lucide-react"
 import { Badge } from "@/components/ui/badge"
+import { waitForJob } from "@/lib/jobs"
 
 interface UploadTenderDialogProps {
   open: boolean
@@ -69,7 +70,7 @@ export function UploadTenderDialog({ open, onOpenChange, onNavigateToEditor }: U
 
       if (!response.ok) throw new Error("Upload error")
 
-      const data = await response.json()
+      const data = await waitForJob(response, token)
       
       const resultData: AnalysisResult = {
         detected_industry: data.analysis?.detected_industry || "General",
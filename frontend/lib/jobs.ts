@@ -0,0 +1,17 @@
+// Las subidas responden 202 + job_id: se consulta /jobs/{job_id} hasta que el job termina
+// y se devuelve su resultado (mismo formato que la respuesta síncrona con ?background=false)
+export async function waitForJob(response: Response, token: string | null, intervalMs = 1500): Promise<any> {
+  const data = await response.json()
+  if (response.status !== 202) return data
+
+  while (true) {
+    await new Promise((resolve) => setTimeout(resolve, intervalMs))
+    const res = await fetch(`${process.env.NEXT_PUBLIC_API_URL}${data.status_url}`, {
+      headers: { "Authorization": `Bearer ${token}` }
+    })
+    if (!res.ok) throw new Error("Job status error")
+    const job = await res.json()
+    if (job.status === "SUCCEEDED") return job.result
+    if (job.status === "FAILED") throw new Error(job.error || "Job failed")
+  }
+}